@@ -4,7 +4,13 @@ from .errors import PushbulletError, InvalidKeyError, HttpError
 
 from .pushbullet import Pushbullet
 from .async_pushbullet import AsyncPushbullet
-from .async_listeners import LiveStreamListener
+from .async_listeners import LiveStreamListener, StreamHub
+from .push_filter import PushFilter
+from .multi_account import MultiAccountStreamManager
+from .sync_listener import SyncLiveStreamListener
+from .sync_pushbullet import SyncPushbullet
+from .upload import UploadCache
+from .upload_router import UploadRouter
 from .log_handler import PushbulletLogHandler, AsyncPushbulletLogHandler
 
 from .device import Device
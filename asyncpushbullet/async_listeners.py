@@ -9,17 +9,20 @@ import json
 import logging
 import sys
 import time
-from typing import AsyncIterator, Set, Iterable, Callable, Dict
+from typing import AsyncIterator, Set, Iterable, Callable, Dict, Union, List, Container
 
 import aiohttp  # pip install aiohttp
 
 from .async_pushbullet import AsyncPushbullet
 from .errors import PushbulletError
-from .websocket_client import WebsocketClient
+from .push_filter import PushFilter
+from .websocket_client import WebsocketClient, WebsocketByteCounter
 
 __author__ = 'Robert Harder'
 __email__ = "rob@iharder.net"
 
+DEFAULT_HANDLER_QUEUE_SIZE = 1000
+
 
 class LiveStreamListener:
     PUSHBULLET_WEBSOCKET_URL = 'wss://stream.pushbullet.com/websocket/'
@@ -29,7 +32,14 @@ class LiveStreamListener:
                  ignore_dismissed: bool = True,
                  only_this_device_nickname: str = None,
                  types: Iterable[str] = None,
-                 post_process: Callable = None):
+                 post_process: Callable = None,
+                 direct_dispatch: bool = False,
+                 push_filter: Union[PushFilter, Dict, Callable] = None,
+                 hub: "StreamHub" = None,
+                 max_queue_size: int = 0,
+                 ignore_idens: Container[str] = None,
+                 websocket_compress: int = 0,
+                 fetch_on_connect: bool = True):
         """Listens for events on the pushbullet live stream websocket.
 
         The types parameter can be used to limit which kinds of pushes
@@ -41,11 +51,46 @@ class LiveStreamListener:
         For instance to listen only for the universal copy/paste
         pushes, you could pass in the tuple ("ephemeral:clip",).
 
+        The push_filter parameter is evaluated before anything is queued,
+        so pushes that fail it are never queued or post-processed.  It may
+        be a PushFilter, a dict spec for one, or any callable taking the
+        push and returning a bool.  For ephemerals the filter is given the
+        inner "push" payload.
+
+        If a StreamHub is given, such as account.stream_hub, the listener
+        does not open a websocket of its own but subscribes to the hub's
+        shared websocket instead.
+
+        Instead of (or as well as) an async for loop, handlers can be
+        registered with the on() decorator:
+
+            @listener.on("ephemeral:clip", concurrency=2)
+            async def on_clip(msg):
+                ...
+
+            await listener.wait_closed()
+
+        While handlers are registered, nothing is queued for async for or
+        next_push() until one of those has been used.
+
         :param account: the AsyncPushbullet object that represents the account
         :param active_only: ignore inactive pushes, defaults to true
         :param ignore_dismissed:  ignore dismissed pushes, defaults to true
         :param only_this_device_nickname: only show pushes from this device
         :param types: the types of pushes to show
+        :param direct_dispatch: read and decode websocket frames in a single task and
+            deliver them straight to this listener's queue, skipping the intermediate
+            queue inside WebsocketClient
+        :param push_filter: only queue pushes for which this predicate is true
+        :param hub: optional StreamHub whose websocket should be shared
+        :param max_queue_size: bound on queued items; when full the oldest item is dropped (default 0, unbounded)
+        :param ignore_idens: container of push idens to skip, such as a BoundedExpiringSet
+            of pushes this program sent itself
+        :param websocket_compress: offer permessage-deflate on the websocket with this
+            window size in bits (9 to 15); ignored when a hub is given
+        :param fetch_on_connect: retrieve pushes that arrived since the account connected
+            before opening the websocket (default True); when False, those pushes are
+            picked up with the first push tickle instead
         """
         self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
 
@@ -58,6 +103,19 @@ class LiveStreamListener:
         self._loop: asyncio.BaseEventLoop = None
         self._queue: asyncio.Queue = None
         self._post_process: Callable = post_process
+        self._direct_dispatch: bool = direct_dispatch
+        if isinstance(push_filter, dict):
+            push_filter = PushFilter.from_dict(push_filter)
+        self._push_filter: Callable[[Dict], bool] = push_filter
+        self._hub: StreamHub = hub
+        self._max_queue_size: int = max_queue_size
+        self._unsubscribed: bool = False
+        self._ignore_idens: Container[str] = ignore_idens
+        self._websocket_compress: int = websocket_compress
+        self._fetch_on_connect: bool = fetch_on_connect
+        self._handlers: List[LiveStreamListener._Handler] = []
+        self._consuming: bool = False  # Set once async for or next_push() is used
+        self._stopped: asyncio.Event = None
 
         # Push types are what should be allowed through.
         # Ephemerals can be sub-typed like so: ephemeral:clip
@@ -76,15 +134,116 @@ class LiveStreamListener:
 
     @property
     def closed(self):
+        if self._hub is not None:
+            return self._unsubscribed or self._hub.closed
         if self._ws_client is None:
             raise PushbulletError("No underlying websocket to close -- has this websocket connected yet?")
         return self._ws_client.closed
 
+    @property
+    def websocket_bytes(self) -> WebsocketByteCounter:
+        """Payload and wire byte counts for the websocket, which may be shared through a hub."""
+        ws_client = self._hub._ws_client if self._hub is not None else self._ws_client
+        return None if ws_client is None else ws_client.bytes
+
+    @property
+    def wants_pushes(self) -> bool:
+        """True if this listener should receive pushes retrieved after a push tickle."""
+        return "push" in self.push_types or not self.push_types
+
     async def close(self):
-        await self._ws_client.close()
+        if self._hub is not None:
+            if not self._unsubscribed:
+                self._unsubscribed = True
+                await self._hub.unsubscribe(self)
+                await self._enqueue(StopAsyncIteration("Unsubscribed from stream hub"))
+        else:
+            await self._ws_client.close()
+
+    def on(self, event: str = "*", concurrency: int = 1, queue_size: int = DEFAULT_HANDLER_QUEUE_SIZE):
+        """Decorator that registers a handler for an event.
+
+        Events are "*" (everything), "push", "push:note" (any push type),
+        "ephemeral", "ephemeral:clip" (any ephemeral sub-type), "tickle" and
+        "tickle:device" (any tickle sub-type).  The handler is called with
+        the post-processed item and may be a coroutine function or a plain
+        function.  At most concurrency calls to it run at the same time, and
+        exceptions it raises are logged without affecting other handlers.
+        Up to queue_size items wait for a slow handler; beyond that the
+        oldest is dropped, so one slow handler cannot hold up the others.
+        """
+
+        def _decorator(func: Callable):
+            self.add_handler(event, func, concurrency=concurrency, queue_size=queue_size)
+            return func
+
+        return _decorator
+
+    def add_handler(self, event: str, func: Callable, concurrency: int = 1,
+                    queue_size: int = DEFAULT_HANDLER_QUEUE_SIZE):
+        """Registers func to be called for each item matching event.  See on()."""
+        self._handlers.append(LiveStreamListener._Handler(self, event, func, concurrency, queue_size))
+
+    def handler_stats(self) -> List[Dict]:
+        """Returns the event, calls, errors and dropped items of each registered handler."""
+        return [{"event": h.event, "handler": getattr(h.func, "__name__", repr(h.func)),
+                 "calls": h.calls, "errors": h.errors, "dropped": h.dropped} for h in self._handlers]
+
+    def remove_handler(self, func: Callable):
+        """Unregisters every registration of func."""
+        for handler in [h for h in self._handlers if h.func == func]:
+            handler.stop()
+            self._handlers.remove(handler)
+
+    @staticmethod
+    def _event_keys(item: dict) -> Set[str]:
+        """Returns the handler events that an item satisfies."""
+        keys = {"*"}
+        item_type = item.get("type")
+        if item_type == "tickle":
+            keys.update(("tickle", "tickle:{}".format(item.get("subtype"))))
+        elif "push" in item and item_type is not None:  # Ephemeral
+            keys.add("ephemeral")
+            sub_push = item.get("push")
+            if type(sub_push) is dict and "type" in sub_push:
+                keys.add("ephemeral:{}".format(sub_push.get("type")))
+        elif "iden" in item:  # Actual push
+            keys.update(("push", "push:{}".format(item_type)))
+        elif item_type is not None:
+            keys.add(item_type)
+        return keys
+
+    async def wait_closed(self):
+        """Waits until the stream has ended and all handlers have finished what they were given."""
+        if self._stopped is None:
+            raise PushbulletError("No stream to wait for -- has this listener connected yet?")
+        await self._stopped.wait()
+        for handler in list(self._handlers):
+            if handler.queue is not None:
+                await handler.queue.join()
+
+    async def _enqueue(self, item):
+        """Routes an item to matching handlers and puts it on the queue,
+        dropping the oldest item if the queue is full."""
+        if isinstance(item, StopAsyncIteration):
+            self._stopped.set()
+        elif self._handlers:
+            keys = LiveStreamListener._event_keys(item)
+            for handler in self._handlers:
+                if handler.event in keys:
+                    handler.submit(item)
+            if not self._consuming:
+                return  # Handlers only -- nothing to queue
+
+        if self._queue.full():
+            dropped = self._queue.get_nowait()
+            self.log.warning("Queue full (maxsize={}), dropped oldest item: {}"
+                             .format(self._max_queue_size, type(dropped).__name__))
+        self._queue.put_nowait(item)
 
     async def __aenter__(self):
-        self._queue = asyncio.Queue()
+        self._queue = asyncio.Queue(maxsize=self._max_queue_size)
+        self._stopped = asyncio.Event()
 
         # Are we filtering on device?
         if self._only_this_device_nickname is not None:
@@ -95,7 +254,14 @@ class LiveStreamListener:
             del device
 
         # Load pushes that arrived since parent AsyncPushbullet was connected
-        await self._process_pushbullet_message_tickle_push()
+        if self.wants_pushes and self._fetch_on_connect:
+            await self._process_pushbullet_message_tickle_push()
+
+        # Share a websocket?
+        if self._hub is not None:
+            self._unsubscribed = False
+            await self._hub.subscribe(self)
+            return self
 
         async def _listen_for_websocket_messages(_wc: WebsocketClient):
             try:
@@ -107,22 +273,54 @@ class LiveStreamListener:
             except Exception as e:
                 # raise e
                 sai = StopAsyncIteration(e).with_traceback(sys.exc_info()[2])
-                await self._queue.put(sai)
+                await self._enqueue(sai)
             else:
                 msg = "Websocket closed" if _wc.closed else None
                 sai = StopAsyncIteration(msg)
-                await self._queue.put(sai)
+                await self._enqueue(sai)
 
-        _ = await self.pb.aio_session()
+        session = await self.pb.aio_session()
         wc = WebsocketClient(url=self.PUSHBULLET_WEBSOCKET_URL + self.pb.api_key,
                              proxy=self.pb.proxy,
-                             verify_ssl=self.pb.verify_ssl)
+                             verify_ssl=self.pb.verify_ssl,
+                             session=session,
+                             queue_incoming=not self._direct_dispatch,
+                             compress=self._websocket_compress)
         self._ws_client = await wc.__aenter__()
-        asyncio.get_event_loop().create_task(_listen_for_websocket_messages(wc))
+        if self._direct_dispatch:
+            asyncio.get_event_loop().create_task(self._read_frames_direct(wc))
+        else:
+            asyncio.get_event_loop().create_task(_listen_for_websocket_messages(wc))
         await asyncio.sleep(0)
 
         return self
 
+    async def _read_frames_direct(self, ws_client: WebsocketClient):
+        """Reads frames straight off the socket, decodes them, and dispatches them.
+
+        Used when direct_dispatch=True.  No WSMessage is queued or kept around
+        after its payload has been decoded.
+        """
+        text_type = aiohttp.WSMsgType.TEXT
+        try:
+            while True:
+                msg = await ws_client.receive()
+                if msg.type == text_type:
+                    self._last_update = time.time()
+                    data = json.loads(msg.data)
+                    del msg
+                    await self._process_pushbullet_message(data)
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    await self._process_websocket_message(msg)
+                    break
+                elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED):
+                    await self._enqueue(StopAsyncIteration("Websocket closed"))
+                    break
+
+        except Exception as e:
+            sai = StopAsyncIteration(e).with_traceback(sys.exc_info()[2])
+            await self._enqueue(sai)
+
     async def _process_websocket_message(self, msg: aiohttp.WSMessage):
 
         # Process websocket message
@@ -131,50 +329,64 @@ class LiveStreamListener:
         if msg.type == aiohttp.WSMsgType.CLOSED:
             err_msg = "Websocket closed: {}".format(msg)
             self.log.warning(err_msg)
-            await self._queue.put(StopAsyncIteration(err_msg))
+            await self._enqueue(StopAsyncIteration(err_msg))
 
         elif msg.type == aiohttp.WSMsgType.ERROR:
             err_msg = "Websocket error: {}".format(msg)
             self.log.debug(err_msg)
-            await self._queue.put(StopAsyncIteration(err_msg))
+            await self._enqueue(StopAsyncIteration(err_msg))
 
         else:
-            self.log.debug("WebSocket message: {}".format(msg.data))
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug("WebSocket message: {}".format(msg.data))
             await self._process_pushbullet_message(json.loads(msg.data))
 
-    async def _process_pushbullet_message(self, msg: dict):
+    async def _process_pushbullet_message(self, msg: dict, fetch_pushes: bool = True):
+        """Sorts a message from the websocket into the queue.
+
+        A StreamHub passes fetch_pushes=False since it retrieves pushes
+        once on behalf of all its subscribers.
+        """
+
+        # Ephemerals are filtered on their inner push
+        ephemeral = "type" in msg and "push" in msg
+        sub_push = msg.get("push") if ephemeral else None
+        filtered_out = ephemeral and self._push_filter is not None and \
+            not (type(sub_push) is dict and self._push_filter(sub_push))
 
         # If everything is requested, then immediately post the message.
         # It might still require some follow-up processing though.
-        if not self.push_types:
-            await self._queue.put(msg)
+        if not self.push_types and not filtered_out:
+            await self._enqueue(msg)
 
         # Look for ephemeral messages
         # Takes special processing to sort through ephemerals.
         # Example values in self.push_types: ephemeral, ephemeral:clip
-        if "type" in msg and "push" in msg:  # Ephemeral
+        if ephemeral:
+
+            if filtered_out:
+                pass  # Filtered out
 
             # If we're looking for ALL ephemerals, that's easy
-            if "ephemeral" in self.push_types:
-                await self._queue.put(msg)
+            elif "ephemeral" in self.push_types:
+                await self._enqueue(msg)
 
             elif self.ephemeral_types:  # If items in the list
 
                 # See if there is a sub-type in the ephemeral
-                sub_push = msg.get("push")
                 if type(sub_push) is dict:
                     sub_type = sub_push.get("type")
                     if sub_type is not None and sub_type in self.ephemeral_types:
-                        await self._queue.put(msg)
+                        await self._enqueue(msg)
 
         # Tickles requested or all messages requested?
         if msg.get("type") == "tickle":
 
             if "tickle" in self.push_types:  # All tickles have been requested
-                await self._queue.put(msg)
+                await self._enqueue(msg)
 
             # If we got a push tickle, retrieve pushes
-            if msg.get("subtype") == "push" and ("push" in self.push_types or not self.push_types):
+            if msg.get("subtype") == "push" and fetch_pushes and self.wants_pushes:
                 await self._process_pushbullet_message_tickle_push()
 
             elif msg.get("subtype") == "device":
@@ -188,7 +400,7 @@ class LiveStreamListener:
 
         elif "type" in msg and msg["type"] in self.push_types:
             # Not sure what "type" this would be, but let's put it there
-            await self._queue.put(msg)
+            await self._enqueue(msg)
 
         else:
             pass
@@ -200,18 +412,40 @@ class LiveStreamListener:
         await self.pb.async_verify_key()
         pushes = await self.pb.async_get_pushes(modified_after=self.pb.most_recent_timestamp,
                                                 active_only=self._active_only)
-        self.log.debug("After a push tickle, retrieved {} pushes".format(len(pushes)))
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("After a push tickle, retrieved {} pushes".format(len(pushes)))
 
         # Update timestamp for most recent push so we only get "new" pushes
         # if len(pushes) > 0 and pushes[0].get('modified', 0) > self.pb.most_recent_timestamp:
         #     self.pb.most_recent_timestamp = pushes[0]['modified']
 
-        # Process each push
+        await self._accept_pushes(pushes)
+
+    async def _accept_pushes(self, pushes: List[dict]):
+        """Runs retrieved pushes through this listener's filters and queues those that pass."""
+        debug = self.log.isEnabledFor(logging.DEBUG)  # Avoid formatting whole pushes for nothing
         for push in pushes:
 
+            # Filter inactive pushes (only possible when retrieved on our behalf by a StreamHub)
+            if self._active_only and not push.get("active", True):
+                continue  # skip this push
+
+            # Filter echoes of pushes we sent
+            if self._ignore_idens is not None and push.get("iden") in self._ignore_idens:
+                if debug:
+                    self.log.debug("Skipped push because its iden is being ignored: {}".format(push.get("iden")))
+                continue  # skip this push
+
             # Filter dismissed pushes if requested
             if self._ignore_dismissed is not None and bool(push.get("dismissed")):
-                self.log.debug("Skipped push because it was dismissed: {}".format(push))
+                if debug:
+                    self.log.debug("Skipped push because it was dismissed: {}".format(push))
+                continue  # skip this push
+
+            # Filter on caller-provided predicate
+            if self._push_filter is not None and not self._push_filter(push):
+                if debug:
+                    self.log.debug("Skipped push because it did not pass the push filter: {}".format(push))
                 continue  # skip this push
 
             # Filter on device if requested
@@ -220,7 +454,8 @@ class LiveStreamListener:
                 # Does push have no target at all?
                 target_iden = push.get("target_device_iden")
                 if target_iden is None:
-                    self.log.info("Skipped push because it had no target device: {}".format(push))
+                    if self.log.isEnabledFor(logging.INFO):
+                        self.log.info("Skipped push because it had no target device: {}".format(push))
                     continue  # skip push
 
                 # Does target device not exist?
@@ -235,20 +470,28 @@ class LiveStreamListener:
 
                 # Does target device have the wrong name?
                 if target_dev.nickname != self._only_this_device_nickname:
-                    self.log.debug("Skipped push that was not to target device {}: {}".format(
-                        self._only_this_device_nickname, push
-                    ))
+                    if debug:
+                        self.log.debug("Skipped push that was not to target device {}: {}".format(
+                            self._only_this_device_nickname, push
+                        ))
                     continue  # skip push - wrong device
 
             # Passed all filters - accept push
-            self.log.debug("Adding to push queue: {}".format(push))
-            await self._queue.put(push)
+            if debug:
+                self.log.debug("Adding to push queue: {}".format(push))
+            await self._enqueue(push)
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        for handler in self._handlers:
+            handler.stop()
+        if self._hub is not None:
+            await self.close()
+            return
         await self._ws_client.__aexit__(exc_type, exc_val, exc_tb)
         await self._ws_client.close()
 
     def __aiter__(self) -> AsyncIterator[dict]:
+        self._consuming = True
         return LiveStreamListener._Iterator(self)
 
     def timeout(self, timeout=None) -> AsyncIterator[dict]:
@@ -257,9 +500,11 @@ class LiveStreamListener:
         async for push in listener.timeout(1):
             ...
         """
+        self._consuming = True
         return LiveStreamListener._Iterator(self, timeout=timeout)
 
     async def next_push(self, timeout: float = None) -> Dict:
+        self._consuming = True
         if timeout is None:
             if self._queue is None:  # __aenter__ never called -- call it now
                 await self.__aenter__()
@@ -269,6 +514,9 @@ class LiveStreamListener:
         else:
             push = await asyncio.wait_for(self.next_push(), timeout=timeout)
 
+        return await self._apply_post_process(push)
+
+    async def _apply_post_process(self, push: Dict) -> Dict:
         if asyncio.iscoroutinefunction(self._post_process):
             return await self._post_process(push)
         elif callable(self._post_process):
@@ -285,7 +533,8 @@ class LiveStreamListener:
             return self
 
         async def __anext__(self) -> dict:
-            if self.parent.closed:
+            # Hand out what already arrived before reporting the close
+            if self.parent.closed and (self.parent._queue is None or self.parent._queue.empty()):
                 raise StopAsyncIteration("The websocket has closed.")
 
             try:
@@ -298,3 +547,193 @@ class LiveStreamListener:
                 raise push
 
             return push
+
+    class _Handler:
+        """A registered handler with its own queue and pool of worker tasks."""
+
+        def __init__(self, listener, event: str, func: Callable, concurrency: int = 1,
+                     queue_size: int = DEFAULT_HANDLER_QUEUE_SIZE):
+            self.listener: LiveStreamListener = listener
+            self.event: str = event
+            self.func: Callable = func
+            self.concurrency: int = max(1, concurrency)
+            self.queue_size: int = queue_size
+            self.queue: asyncio.Queue = None
+            self.workers: List[asyncio.Task] = []
+            self.calls: int = 0
+            self.errors: int = 0
+            self.dropped: int = 0
+
+        def submit(self, item):
+            """Queues the item, dropping the oldest item if the queue is full."""
+            if self.queue is None:  # Start on first use so we're on the right loop
+                self.queue = asyncio.Queue(maxsize=self.queue_size)
+                loop = asyncio.get_event_loop()
+                self.workers = [loop.create_task(self._work()) for _ in range(self.concurrency)]
+            if self.queue.full():
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.dropped += 1
+                self.listener.log.warning("Queue for handler {} is full (maxsize={}), dropped oldest item"
+                                          .format(getattr(self.func, "__name__", self.func), self.queue_size))
+            self.queue.put_nowait(item)
+
+        def stop(self):
+            for worker in self.workers:
+                worker.cancel()
+            self.workers = []
+
+        async def _work(self):
+            log = self.listener.log
+            while True:
+                item = await self.queue.get()
+                try:
+                    self.calls += 1
+                    item = await self.listener._apply_post_process(item)
+                    if asyncio.iscoroutinefunction(self.func):
+                        await self.func(item)
+                    else:
+                        self.func(item)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as ex:
+                    self.errors += 1
+                    log.warning("Handler {} for {} raised {}: {}".format(
+                        getattr(self.func, "__name__", self.func), self.event, ex.__class__.__name__, ex))
+                    if log.isEnabledFor(logging.DEBUG):
+                        log.debug("Handler traceback", exc_info=True)
+                finally:
+                    self.queue.task_done()
+
+
+class StreamHub:
+    """Owns a single websocket to the pushbullet live stream and shares it
+    among any number of subscribing LiveStreamListeners (and so EphemeralComms).
+
+    Pushes are retrieved once per push tickle and offered to every subscriber,
+    each of which applies its own types, filters and bounded queue.
+
+    The websocket is opened when the first listener subscribes and closed
+    when the last one leaves.  Most code gets a hub from AsyncPushbullet:
+
+        async with LiveStreamListener(pb, hub=pb.stream_hub) as lsl:
+            ...
+        async with EphemeralComm(pb, Msg, hub=pb.stream_hub) as ec:
+            ...
+    """
+
+    def __init__(self, account: AsyncPushbullet, websocket_compress: int = 0):
+        """
+        :param account: the AsyncPushbullet object that represents the account
+        :param websocket_compress: offer permessage-deflate on the websocket with this
+            window size in bits (9 to 15)
+        """
+        self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        self.pb: AsyncPushbullet = account
+        self.websocket_compress: int = websocket_compress
+        self._subscribers: List[LiveStreamListener] = []
+        self._ws_client: WebsocketClient = None
+        self._reader: asyncio.Task = None
+        self._connect_lock: asyncio.Lock = None
+        self._last_update: float = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._ws_client is None or self._ws_client.closed
+
+    @property
+    def subscribers(self) -> List[LiveStreamListener]:
+        return list(self._subscribers)
+
+    async def subscribe(self, listener: LiveStreamListener):
+        """Adds a listener, connecting the shared websocket if necessary."""
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.closed:
+                await self._connect()
+            if listener not in self._subscribers:
+                self._subscribers.append(listener)
+        self.log.debug("Subscribed {} ({} subscribers)".format(id(listener), len(self._subscribers)))
+
+    async def unsubscribe(self, listener: LiveStreamListener):
+        """Removes a listener and closes the shared websocket once no subscribers remain."""
+        if listener in self._subscribers:
+            self._subscribers.remove(listener)
+        self.log.debug("Unsubscribed {} ({} subscribers)".format(id(listener), len(self._subscribers)))
+        if not self._subscribers:
+            await self.close()
+
+    async def close(self):
+        """Closes the shared websocket and waits for its reader, which may be
+        partway through retrieving pushes, to stop."""
+        if self._ws_client is not None:
+            await self._ws_client.close()
+        reader, self._reader = self._reader, None
+        if reader is not None and not reader.done() and reader is not asyncio.current_task():
+            reader.cancel()
+            try:
+                await reader
+            except asyncio.CancelledError:
+                pass
+
+    async def _connect(self):
+        session = await self.pb.aio_session()
+        wc = WebsocketClient(url=LiveStreamListener.PUSHBULLET_WEBSOCKET_URL + self.pb.api_key,
+                             proxy=self.pb.proxy,
+                             verify_ssl=self.pb.verify_ssl,
+                             session=session,
+                             queue_incoming=False,
+                             compress=self.websocket_compress)
+        self._ws_client = await wc.__aenter__()
+        self._reader = asyncio.get_event_loop().create_task(self._read_frames(wc))
+        self.log.info("Stream hub connected")
+
+    async def _read_frames(self, ws_client: WebsocketClient):
+        text_type = aiohttp.WSMsgType.TEXT
+        reason = None
+        try:
+            while True:
+                msg = await ws_client.receive()
+                if msg.type == text_type:
+                    self._last_update = time.time()
+                    data = json.loads(msg.data)
+                    del msg
+                    await self._dispatch(data)
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    reason = "Websocket error: {}".format(msg)
+                    break
+                elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED):
+                    reason = "Websocket closed"
+                    break
+
+        except asyncio.CancelledError:
+            reason = "Stream hub closed"
+            raise
+
+        except Exception as e:
+            reason = e
+            self.log.debug("Stream hub reader stopped: {}".format(e))
+
+        finally:
+            # The stream has ended for every subscriber, so let them go.  Anyone
+            # subscribing from now on gets a new websocket.
+            subscribers, self._subscribers = self._subscribers, []
+            for sub in subscribers:
+                sub._unsubscribed = True
+                await sub._enqueue(StopAsyncIteration(reason))
+
+    async def _dispatch(self, msg: dict):
+        subscribers = list(self._subscribers)
+        for sub in subscribers:
+            await sub._process_pushbullet_message(msg, fetch_pushes=False)
+
+        # One retrieval of pushes serves every subscriber that wants them
+        if msg.get("type") == "tickle" and msg.get("subtype") == "push":
+            wanting = [sub for sub in subscribers if sub.wants_pushes]
+            if wanting:
+                self.log.debug("Received a push tickle.  Looking for new pushes...")
+                pushes = await self.pb.async_get_pushes(modified_after=self.pb.most_recent_timestamp,
+                                                        active_only=all(sub._active_only for sub in wanting))
+                for sub in wanting:
+                    await sub._accept_pushes(pushes)
@@ -3,24 +3,30 @@
 
 import asyncio
 import datetime
+import functools
 import logging
 import os
 import sys
+import time
 import traceback
 from asyncio import Lock
 from pprint import pprint
-from typing import List, AsyncIterator, Optional, Callable, Generic, TypeVar, Dict
+from typing import List, AsyncIterable, AsyncIterator, BinaryIO, Optional, Callable, Generic, TypeVar, Dict, \
+    Union
 
 import aiohttp  # pip install aiohttp
 
 from .channel import Channel
 from .chat import Chat
+from .compression import async_compressed_chunks, async_compressed_spool, async_compression_plan
 from .device import Device
+from .download import destination_path, download_slots, file_url_and_name
 from .errors import HttpError, PushbulletError, InvalidKeyError
-from .filetype import get_file_type
+from .filetype import async_get_file_type, get_file_type_from_name
 from .pushbullet import Pushbullet
 from .subscription import Subscription
-from .tqio import tqio
+from .tqio import TqdmProgress
+from .upload import DEFAULT_CHUNK_SIZE, DEFAULT_RANGE_SIZE, UploadCache, UploadState, async_file_form_data, async_put_range, async_query_range, data_form_data
 
 __author__ = "Robert Harder"
 __email__ = "rob@iharder.net"
@@ -193,7 +199,8 @@ class PushbulletAsyncIterator(AsyncIterator, Generic[T]):
 
                 else:
                     items_this_round = msg.get(self._item_name, [])
-                    self.log.debug("Retrieved {} objects ({}).".format(len(items_this_round), self._item_name))
+                    if self.log.isEnabledFor(logging.DEBUG):
+                        self.log.debug("Retrieved {} objects ({}).".format(len(items_this_round), self._item_name))
                     self._objects += items_this_round
 
                     if items_this_round:
@@ -233,7 +240,8 @@ class PushbulletAsyncIterator(AsyncIterator, Generic[T]):
                 return item
 
         except StopAsyncIteration as sai:
-            self.log.debug("Reason for iterator stopping: {}".format(sai))
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug("Reason for iterator stopping: {}".format(sai))
             self._stop = sai
             raise sai
 
@@ -244,12 +252,37 @@ class AsyncPushbullet(Pushbullet):
     # This is weird.  See the note in PushbulletAsyncIterator.
     # _iterator_locks: List[asyncio.Lock] = []
 
-    def __init__(self, api_key: str = None, verify_ssl: bool = None, *kargs, **kwargs):
+    def __init__(self, api_key: str = None, verify_ssl: bool = None, *kargs,
+                 connector: aiohttp.BaseConnector = None,
+                 verify_on_connect: bool = True,
+                 retries: int = 0,
+                 retry_backoff: float = 0.5,
+                 **kwargs):
+        """
+        :param api_key: the pushbullet.com API key
+        :param verify_ssl: set to False to disable SSL/TLS verification
+        :param connector: optional aiohttp connector to share among several accounts;
+            it is not closed when this account closes
+        :param verify_on_connect: when True (default) the key is verified and the most
+            recent push timestamp retrieved as soon as a session is created; when False
+            that round trip is skipped, the timestamp starts at the current time, and
+            an invalid key surfaces on the first real request
+        :param retries: how many times to retry a GET request (including each page of an
+            iterator) that fails with a 429 or 5xx response or a network error; other
+            requests are never retried since they might not be idempotent
+        :param retry_backoff: seconds to wait before the first retry, doubling each time
+        """
         Pushbullet.__init__(self, api_key, *kargs, **kwargs)
 
         self.loop: Optional[asyncio.AbstractEventLoop] = None
         self._aio_session: Optional[aiohttp.ClientSession] = None
+        self._file_session: Optional[aiohttp.ClientSession] = None  # For file URLs, without the API key
         self.verify_ssl: bool = verify_ssl
+        self._connector: Optional[aiohttp.BaseConnector] = connector
+        self.verify_on_connect: bool = verify_on_connect
+        self.retries: int = retries
+        self.retry_backoff: float = retry_backoff
+        self._stream_hub = None  # type: StreamHub
 
     async def __aenter__(self):
         await self.async_verify_key()
@@ -288,14 +321,22 @@ class AsyncPushbullet(Pushbullet):
             headers = {"Access-Token": self.api_key}
 
             aio_connector = None  # type: aiohttp.TCPConnector
-            if self.verify_ssl is not None and self.verify_ssl is False:
+            if self._connector is not None:
+                aio_connector = self._connector  # Shared, so verify_ssl is up to whoever made it
+            elif self.verify_ssl is not None and self.verify_ssl is False:
                 self.log.info("SSL/TLS verification disabled")
                 aio_connector = aiohttp.TCPConnector(verify_ssl=False)
 
-            session = aiohttp.ClientSession(headers=headers, connector=aio_connector)
+            session = aiohttp.ClientSession(headers=headers, connector=aio_connector,
+                                            connector_owner=self._connector is None)
             self.log.debug("Created new session: {}".format(session))
             self._aio_session = session
 
+            if not self.verify_on_connect:
+                if not self.most_recent_timestamp:
+                    self.most_recent_timestamp = time.time()
+                return session
+
             try:
                 # This will recursively call aio_session() but that's OK
                 # because self._aio_session caches it until we determine
@@ -317,14 +358,45 @@ class AsyncPushbullet(Pushbullet):
 
         return session
 
+    @property
+    def stream_hub(self):
+        """A StreamHub that shares one websocket among listeners and EphemeralComms on this account.
+
+        The hub is created on first access and connects when its first listener subscribes.
+        """
+        if self._stream_hub is None:
+            from .async_listeners import StreamHub  # Avoid circular import
+            self._stream_hub = StreamHub(self)
+        return self._stream_hub
+
     async def async_close(self):
         """Closes only the session on the current event loop and the synchronous session in the super class"""
         super().close()  # synchronous version in superclass
+        if self._stream_hub is not None:
+            await self._stream_hub.close()
+        if self._file_session:
+            await self._file_session.close()
+            self._file_session = None
         if self._aio_session:
             await self._aio_session.close()
             self._aio_session = None
             self.loop = None
 
+    async def _file_host_session(self) -> aiohttp.ClientSession:
+        """Returns a session for fetching file URLs.
+
+        File URLs need no API key and may point anywhere, so this session sends
+        none of aio_session()'s default headers, though it shares its connection pool.
+        """
+        session = await self.aio_session()
+        file_session = self._file_session
+        if file_session is None or file_session.closed or file_session.connector is not session.connector:
+            if file_session is not None:
+                await file_session.close()  # Its connector belongs to an old session
+            file_session = aiohttp.ClientSession(connector=session.connector, connector_owner=False)
+            self._file_session = file_session
+        return file_session
+
     def close_all_threadsafe(self):
         """Closes all sessions, which may be on different event loops.
         This method is NOT awaited--because there may be different loops involved."""
@@ -363,8 +435,25 @@ class AsyncPushbullet(Pushbullet):
 
     async def _async_get_data(self, url: str, **kwargs) -> dict:
         session = await self.aio_session()
-        msg = await self._async_http(session.get, url, **kwargs)
-        return msg
+        attempt = 0
+        while True:
+            try:
+                msg = await self._async_http(session.get, url, **kwargs)
+                return msg
+            except (HttpError, aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                if attempt >= self.retries or not AsyncPushbullet._retryable(ex):
+                    raise ex
+                delay = self.retry_backoff * 2 ** attempt
+                attempt += 1
+                self.log.warning("Retrying request in {:0.1f} seconds (attempt {} of {}) after error: {}"
+                                 .format(delay, attempt, self.retries, ex))
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retryable(ex: Exception) -> bool:
+        if isinstance(ex, HttpError):
+            return ex.code == 429 or ex.code // 100 == 5
+        return True  # Network trouble
 
     def _objects_asynciter(self, url, item_name,
                            limit: int = None,
@@ -918,61 +1007,368 @@ class AsyncPushbullet(Pushbullet):
     #
 
     async def async_upload_file_to_transfer_sh(self, file_path: str, file_type: str = None,
-                                               show_progress: bool = True) -> dict:
+                                               show_progress: bool = True,
+                                               progress: Callable[[int, int], None] = None,
+                                               upload_cache: UploadCache = None,
+                                               compress: str = None) -> dict:
         """Uploads a file to the https://transfer.sh service.
 
         This returns the same dictionary data as the async_upload_file function, which
         uploads to the pushbullet service.
+
+        :param str file_path: path to the file to upload
+        :param str file_type: optional mime type of file to upload
+        :param bool show_progress: show a progress bar on the terminal (ignored if progress is given)
+        :param progress: optional callback taking (bytes_sent, total_bytes)
+        :param UploadCache upload_cache: optional cache of earlier uploads to reuse
+        :param str compress: optionally "gzip" or "zstd" (see async_upload_file)
         """
-        file_name = os.path.basename(file_path)
+        file_name, file_type, compress = await async_compression_plan(file_path, file_type, compress)
+        cache_backend = "transfer.sh+" + compress if compress else "transfer.sh"
+        if upload_cache is not None:
+            cached = await upload_cache.async_get(file_path, backend=cache_backend)
+            if cached is not None:
+                cached["file_name"] = file_name
+                self.log.info("File already uploaded: {}".format(cached))
+                return cached
+
         if not file_type:
-            file_type = get_file_type(file_path)
+            file_type = await async_get_file_type(file_path)
 
-        if show_progress:
-            with tqio(file_path) as f:
-                upload_resp = await self._async_post_data(self.TRANSFER_SH_URL, data={"file": f})
-        else:
-            with open(file_path, "rb") as f:
-                upload_resp = await self._async_post_data(self.TRANSFER_SH_URL, data={"file": f})
+        with TqdmProgress() if show_progress and progress is None else _NoProgress() as bar:
+            if compress:
+                chunks = async_compressed_chunks(file_path, compress, progress=progress or bar)
+                upload_resp = await self.async_upload_data_to_url(self.TRANSFER_SH_URL, chunks, file_name, file_type)
+            else:
+                form = await async_file_form_data(file_path, file_name=file_name, file_type=file_type,
+                                                  progress=progress or bar)
+                upload_resp = await self._async_post_data(self.TRANSFER_SH_URL, data=form)
 
         file_url = upload_resp.get("raw", b'').decode("ascii")
         msg = {"file_name": file_name,
                "file_type": file_type,
                "file_url": file_url}
 
+        if upload_cache is not None:
+            await upload_cache.async_put(file_path, msg, backend=cache_backend)
         return msg
 
     async def async_upload_file(self, file_path: str, file_type: str = None,
-                                show_progress: bool = True) -> dict:
+                                show_progress: bool = True,
+                                progress: Callable[[int, int], None] = None,
+                                upload_cache: UploadCache = None,
+                                compress: str = None) -> dict:
         """
         Uploads a file to pushbullet storage and returns a dict with information
         about how the uploaded file:
 
         {"file_type": file_type, "file_url": file_url, "file_name": file_name}
 
+        The file is read in an executor, so the event loop is not blocked
+        by disk reads however large the file is.
+
+        If an upload_cache is given and it remembers uploading the same content,
+        its file_url is returned without uploading anything.
+
+        If compress is "gzip" or "zstd", the file is compressed (see the
+        compression module) and uploaded as, say, report.json.gz of type
+        application/gzip, unless its type is one that is already compressed.
+        The compressed copy goes to a temporary file first, since the upload
+        needs its size, and progress follows the upload of that copy.
+
         :param str file_path: path to the file to upload
         :param str file_type: optional mime type of file to upload
-        :param bool show_progress: show a progress bar on the terminal
+        :param bool show_progress: show a progress bar on the terminal (ignored if progress is given)
+        :param progress: optional callback taking (bytes_sent, total_bytes)
+        :param UploadCache upload_cache: optional cache of earlier uploads to reuse
+        :param str compress: optionally "gzip" or "zstd"
         :return: data about what got uploaded
         :rtype: dict
         """
-        gen = self._upload_file_generator(file_path, file_type=file_type)
+        file_name, file_type, compress = await async_compression_plan(file_path, file_type, compress)
+        cache_backend = "pushbullet+" + compress if compress else "pushbullet"
+        if upload_cache is not None:
+            cached = await upload_cache.async_get(file_path, backend=cache_backend)
+            if cached is not None:
+                cached["file_name"] = file_name
+                self.log.info("File already uploaded: {}".format(cached))
+                return cached
 
-        xfer = next(gen)  # Prep request params
+        if not file_type:
+            file_type = await async_get_file_type(file_path)
 
-        data = xfer["data"]
-        xfer["msg"] = await self._async_post_data(self.UPLOAD_REQUEST_URL, data=data)
-        next(gen)  # Prep upload params
+        upload = await self.async_upload_request(file_name, file_type)
+        with TqdmProgress() if show_progress and progress is None else _NoProgress() as bar:
+            if compress:
+                # Pushbullet's upload URLs want a Content-Length, so compress before sending
+                spool, size = await async_compressed_spool(file_path, compress)
+                try:
+                    await self.async_upload_data_to_url(upload["upload_url"], spool, file_name, upload["file_type"],
+                                                        size=size, progress=progress or bar)
+                finally:
+                    await asyncio.get_event_loop().run_in_executor(None, spool.close)
+            else:
+                await self.async_upload_to_url(upload["upload_url"], file_path,
+                                               file_name=file_name,
+                                               file_type=upload["file_type"],
+                                               progress=progress or bar)
+
+        return_msg = {"file_type": upload["file_type"], "file_url": upload["file_url"], "file_name": file_name}
+        self.log.info("File uploaded: {}".format(return_msg))
+        if upload_cache is not None:
+            await upload_cache.async_put(file_path, return_msg, backend=cache_backend)
+        return return_msg
+
+    async def async_upload_file_resumable(self, file_path: str, file_type: str = None,
+                                          state_file: str = None,
+                                          backend: str = "pushbullet",
+                                          ranged: bool = False,
+                                          range_size: int = DEFAULT_RANGE_SIZE,
+                                          retries: int = 5,
+                                          keep_state: bool = False,
+                                          show_progress: bool = True,
+                                          progress: Callable[[int, int], None] = None,
+                                          upload_cache: UploadCache = None) -> dict:
+        """Uploads a file like async_upload_file (or async_upload_file_to_transfer_sh), but
+        survives failures along the way.
+
+        Each stage is retried with exponential backoff (starting at retry_backoff
+        seconds) on 429 and 5xx responses and network errors, and a retry repeats
+        only the stage that failed: an upload that fails does not ask
+        pushbullet.com for a new upload URL.  If the upload URL is refused with
+        403, 404 or 410, presumably because it expired, both stages start over.
+
+        With ranged=True the upload URL is sent the file range_size bytes at a
+        time (see upload.async_put_range), and after a failure the server is asked
+        how much it has so that only the rest is sent.  Otherwise, as with
+        pushbullet.com's own upload URLs, the file is sent again in full.
+
+        If state_file is given, progress is saved there as an UploadState after each
+        step, and an upload of the same, unchanged file that finds the state file
+        picks up where that one stopped, even in a new process.  The state file is
+        removed on success unless keep_state is True.
 
-        if show_progress:
-            with tqio(file_path) as f:
-                xfer["msg"] = await self._async_post_data(xfer["upload_url"], data={"file": f})
-        else:
-            with open(file_path, "rb") as f:
-                xfer["msg"] = await self._async_post_data(xfer["upload_url"], data={"file": f})
+        :param str file_path: path to the file to upload
+        :param str file_type: optional mime type of file to upload
+        :param str state_file: optional JSON file for saving and resuming progress
+        :param str backend: "pushbullet" or "transfer.sh"
+        :param bool ranged: the upload URL accepts the file in ranges
+        :param int range_size: bytes per request when ranged
+        :param int retries: how many times to retry after failures
+        :param bool keep_state: leave the state file after success (say, until the file is pushed)
+        :param bool show_progress: show a progress bar on the terminal (ignored if progress is given)
+        :param progress: optional callback taking (bytes_sent, total_bytes)
+        :param UploadCache upload_cache: optional cache of earlier uploads to reuse
+        :return: data about what got uploaded
+        :rtype: dict
+        """
+        if upload_cache is not None:
+            cached = await upload_cache.async_get(file_path, backend=backend)
+            if cached is not None:
+                self.log.info("File already uploaded: {}".format(cached))
+                return cached
+
+        loop = asyncio.get_event_loop()
+        state = None  # type: UploadState
+        if state_file is not None:
+            state = await loop.run_in_executor(None, UploadState.load, state_file)
+            if state is not None and not await loop.run_in_executor(None, state.matches, file_path, backend):
+                self.log.info("Discarding out of date upload state: {}".format(state))
+                state = None
+        if state is None:
+            state = await loop.run_in_executor(None, functools.partial(
+                UploadState.for_file, file_path, file_type=file_type, backend=backend, ranged=ranged))
+        elif self.log.isEnabledFor(logging.INFO):
+            self.log.info("Resuming upload: {}".format(state))
+
+        async def _save():
+            if state_file is not None:
+                await loop.run_in_executor(None, state.save, state_file)
+
+        attempt = 0
+        with TqdmProgress() if show_progress and progress is None else _NoProgress() as bar:
+            progress = progress or bar
+            while not state.uploaded:
+                try:
+                    await self._async_upload_stages(state, range_size, progress, _save)
+
+                except (HttpError, aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                    expired = isinstance(ex, HttpError) and ex.code in (403, 404, 410) and state.upload_url
+                    if attempt >= retries or not (expired or AsyncPushbullet._retryable(ex)):
+                        raise ex
+                    delay = self.retry_backoff * 2 ** attempt
+                    attempt += 1
+                    self.log.warning("Retrying upload in {:0.1f} seconds (attempt {} of {}) after error: {}"
+                                     .format(delay, attempt, retries, ex))
+                    await asyncio.sleep(delay)
+                    if expired and state.backend == "pushbullet":
+                        state.reset()
+                        await _save()
+
+        if state_file is not None and not keep_state:
+            await loop.run_in_executor(None, _remove_file, state_file)
+
+        return_msg = {"file_type": state.file_type, "file_url": state.file_url, "file_name": state.file_name}
+        self.log.info("File uploaded: {}".format(return_msg))
+        if upload_cache is not None:
+            await upload_cache.async_put(file_path, return_msg, backend=backend)
+        return return_msg
+
+    async def _async_upload_stages(self, state: UploadState, range_size: int,
+                                   progress: Callable[[int, int], None], save: Callable):
+        """Runs whichever upload stages state has not finished yet."""
+        if state.backend == "transfer.sh":
+            info = await self.async_upload_file_to_transfer_sh(state.file_path, file_type=state.file_type,
+                                                               progress=progress)
+            state.file_type = info["file_type"]
+            state.file_url = info["file_url"]
+            state.offset = state.size
+            state.uploaded = True
+            await save()
+            return
+
+        if state.upload_url is None:
+            if not state.file_type:
+                state.file_type = await async_get_file_type(state.file_path)
+            upload = await self.async_upload_request(state.file_name, state.file_type)
+            state.upload_url = upload["upload_url"]
+            state.file_url = upload["file_url"]
+            state.file_type = upload["file_type"]
+            await save()
+
+        if not state.ranged:
+            await self.async_upload_to_url(state.upload_url, state.file_path,
+                                           file_name=state.file_name,
+                                           file_type=state.file_type,
+                                           progress=progress)
+            state.offset = state.size
+            state.uploaded = True
+            await save()
+            return
 
-        resp = next(gen)
-        return resp
+        session = await self.aio_session()
+        if state.offset > 0:  # Resuming, so ask how much actually arrived
+            state.offset = await async_query_range(session, state.upload_url, state.size, proxy=self.proxy)
+        if state.size == 0:
+            await async_put_range(session, state.upload_url, state.file_path, 0, 0, proxy=self.proxy)
+        while state.offset < state.size:
+            if progress is not None:
+                progress(state.offset, state.size)
+            offset = await async_put_range(session, state.upload_url, state.file_path,
+                                           state.offset, state.size, range_size=range_size,
+                                           proxy=self.proxy)
+            if offset <= state.offset:
+                raise HttpError(308, "Upload made no progress at byte {}.".format(offset), None)
+            state.offset = offset
+            await save()
+        if progress is not None:
+            progress(state.size, state.size)
+        state.uploaded = True
+        await save()
+
+    async def async_upload_request(self, file_name: str, file_type: str) -> dict:
+        """First stage of an upload: asks pushbullet.com where to upload a file.
+
+        Returns a dict with the upload_url to send the file to and the file_url
+        and file_type that the uploaded file will have.
+
+        :param str file_name: name of the file as it should appear in the push
+        :param str file_type: mime type of the file
+        :rtype: dict
+        """
+        msg = await self._async_post_data(self.UPLOAD_REQUEST_URL,
+                                          data={"file_name": file_name, "file_type": file_type})
+        return {"file_name": file_name,
+                "file_type": str(msg.get("file_type")),  # What PB thinks is the filetype
+                "file_url": str(msg.get("file_url")),  # Final destination for downloading
+                "upload_url": str(msg.get("upload_url"))}  # Upload location
+
+    async def async_upload_to_url(self, upload_url: str, file_path: str,
+                                  file_name: str = None,
+                                  file_type: str = None,
+                                  progress: Callable[[int, int], None] = None) -> dict:
+        """Second stage of an upload: streams the file to the upload_url from async_upload_request.
+
+        :param str upload_url: where to send the file
+        :param str file_path: path to the file to upload
+        :param str file_name: name to give the file (default: the file's own name)
+        :param str file_type: mime type of the file
+        :param progress: optional callback taking (bytes_sent, total_bytes)
+        :return: the upload server's response
+        :rtype: dict
+        """
+        form = await async_file_form_data(file_path, file_name=file_name, file_type=file_type, progress=progress)
+        return await self._async_post_data(upload_url, data=form)
+
+    async def async_upload_data(self, data: Union[bytes, bytearray, memoryview, BinaryIO, AsyncIterable[bytes]],
+                                file_name: str, file_type: str = None,
+                                size: int = None,
+                                show_progress: bool = True,
+                                progress: Callable[[int, int], None] = None) -> dict:
+        """Uploads data that is not in a file to pushbullet storage, such as an image made in memory.
+
+        The data may be bytes, a bytearray or memoryview (streamed into the request
+        without being copied), a file-like object opened for binary reading (read in
+        an executor) or an async iterator of bytes.  A stream's data is sent with
+        chunked transfer encoding unless its size is given or can be found by seeking.
+
+        Returns the same dictionary as async_upload_file.
+
+        :param data: the bytes or stream to upload
+        :param str file_name: name for the file
+        :param str file_type: mime type of the data (default: guessed from file_name's extension)
+        :param int size: bytes a stream will produce, if known
+        :param bool show_progress: show a progress bar on the terminal (ignored if progress is given)
+        :param progress: optional callback taking (bytes_sent, total_bytes or None)
+        :return: data about what got uploaded
+        :rtype: dict
+        """
+        if not file_type:
+            file_type = get_file_type_from_name(file_name)
+
+        upload = await self.async_upload_request(file_name, file_type)
+        with TqdmProgress() if show_progress and progress is None else _NoProgress() as bar:
+            await self.async_upload_data_to_url(upload["upload_url"], data, file_name, upload["file_type"],
+                                                size=size, progress=progress or bar)
+
+        return_msg = {"file_type": upload["file_type"], "file_url": upload["file_url"], "file_name": file_name}
+        self.log.info("File uploaded: {}".format(return_msg))
+        return return_msg
+
+    async def async_upload_data_to_transfer_sh(self,
+                                               data: Union[bytes, bytearray, memoryview, BinaryIO,
+                                                           AsyncIterable[bytes]],
+                                               file_name: str, file_type: str = None,
+                                               size: int = None,
+                                               show_progress: bool = True,
+                                               progress: Callable[[int, int], None] = None) -> dict:
+        """Uploads data that is not in a file to the https://transfer.sh service.
+
+        See async_upload_data for the kinds of data accepted and what is returned.
+        """
+        if not file_type:
+            file_type = get_file_type_from_name(file_name)
+
+        with TqdmProgress() if show_progress and progress is None else _NoProgress() as bar:
+            upload_resp = await self.async_upload_data_to_url(self.TRANSFER_SH_URL, data, file_name, file_type,
+                                                              size=size, progress=progress or bar)
+
+        return {"file_name": file_name,
+                "file_type": file_type,
+                "file_url": upload_resp.get("raw", b'').decode("ascii")}
+
+    async def async_upload_data_to_url(self, upload_url: str,
+                                       data: Union[bytes, bytearray, memoryview, BinaryIO, AsyncIterable[bytes]],
+                                       file_name: str, file_type: str,
+                                       size: int = None,
+                                       progress: Callable[[int, int], None] = None) -> dict:
+        """Like async_upload_to_url, but sends data (see async_upload_data) rather than a file.
+
+        :return: the upload server's response
+        :rtype: dict
+        """
+        form = data_form_data(data, file_name, file_type, size=size, progress=progress)
+        return await self._async_post_data(upload_url, data=form)
 
     async def async_push_file(self, file_name: str, file_url: str, file_type: str,
                               body: str = None, title: str = None,
@@ -986,3 +1382,98 @@ class AsyncPushbullet(Pushbullet):
         data = xfer.get("data")
         xfer["msg"] = await self._async_push(data)
         return next(gen)
+
+    async def async_download_file(self, push_or_url: Union[Dict, str], dest: str = None,
+                                  chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                  show_progress: bool = False,
+                                  progress: Callable[[int, int], None] = None) -> str:
+        """Downloads the file from a file push (or any URL) and returns the path it was saved to.
+
+        The file is streamed to disk in chunks, with the writes done in an
+        executor, and saved under a temporary name until complete, so a failed
+        download never leaves a partial file at dest.  If the server gave a
+        Content-Length, the size is checked and an IOError raised if it differs.
+        The download counts against the limit on concurrent downloads (see
+        the download module).
+
+        :param push_or_url: a file push (with file_url and file_name) or a URL
+        :param str dest: file to save to, or folder to save the file_name in (default: current folder)
+        :param int chunk_size: bytes read from the network at a time
+        :param bool show_progress: show a progress bar on the terminal (ignored if progress is given)
+        :param progress: optional callback taking (bytes_received, total_bytes or None)
+        :return: path of the downloaded file
+        :rtype: str
+        """
+        file_url, file_name = file_url_and_name(push_or_url)
+        path = destination_path(dest, file_name)
+        part_path = path + ".part"
+        loop = asyncio.get_event_loop()
+
+        with TqdmProgress(file_name) if show_progress and progress is None else _NoProgress() as bar:
+            f = await loop.run_in_executor(None, open, part_path, "wb")
+            try:
+                async for chunk in self.download_file_asynciter(file_url, chunk_size=chunk_size,
+                                                                progress=progress or bar):
+                    await loop.run_in_executor(None, f.write, chunk)
+                await loop.run_in_executor(None, f.close)
+                await loop.run_in_executor(None, os.replace, part_path, path)
+            except BaseException:
+                await loop.run_in_executor(None, f.close)
+                await loop.run_in_executor(None, _remove_file, part_path)
+                raise
+
+        self.log.info("File downloaded: {}".format(path))
+        return path
+
+    async def download_file_asynciter(self, push_or_url: Union[Dict, str],
+                                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                      progress: Callable[[int, int], None] = None) -> AsyncIterator[bytes]:
+        """Returns an async iterator over the bytes of the file from a file push (or any URL),
+        for processing a file without saving it.
+
+        async for chunk in pb.download_file_asynciter(push):
+            digest.update(chunk)
+
+        The size is checked as in async_download_file, and the download holds
+        one of the concurrent download slots until the iteration ends or the
+        iterator is closed.
+
+        :param push_or_url: a file push (with file_url and file_name) or a URL
+        :param int chunk_size: most bytes in each chunk
+        :param progress: optional callback taking (bytes_received, total_bytes or None)
+        """
+        file_url, _ = file_url_and_name(push_or_url)
+        session = await self._file_host_session()
+        async with download_slots():
+            async with session.get(file_url, proxy=self.proxy) as resp:
+                if resp.status != 200:
+                    self._interpret_response(resp.status, resp.headers, await resp.read())
+                    raise HttpError(resp.status, "Download failed.", None)
+                total = resp.content_length
+                if resp.headers.get("Content-Encoding"):
+                    total = None  # Length on the wire, not of the decompressed file
+                received = 0
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    received += len(chunk)
+                    if progress is not None:
+                        progress(received, total)
+                    yield chunk
+                if total is not None and received != total:
+                    raise IOError("Downloaded {} bytes but expected {}: {}".format(received, total, file_url))
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class _NoProgress:
+    """Stands in for TqdmProgress when no progress bar is wanted."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
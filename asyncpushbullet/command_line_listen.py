@@ -5,10 +5,24 @@ A command line script for listening for pushes.
 
 usage: command_line_listen.py [-h] [-k KEY] [--key-file KEY_FILE] [-e]
                               [-x EXEC [EXEC ...]]
+                              [--exec-workers EXEC_WORKERS]
                               [-s EXEC_SIMPLE [EXEC_SIMPLE ...]]
-                              [-p EXEC_PYTHON [EXEC_PYTHON ...]] [-t TIMEOUT]
+                              [--exec-batch-size EXEC_BATCH_SIZE]
+                              [--exec-batch-ms EXEC_BATCH_MS]
+                              [--exec-batch-format {json,jsonl}]
+                              [-p EXEC_PYTHON [EXEC_PYTHON ...]]
+                              [--exec-python-pool {thread,process}]
+                              [--exec-python-workers EXEC_PYTHON_WORKERS]
+                              [-t TIMEOUT]
                               [--throttle-count THROTTLE_COUNT]
                               [--throttle-seconds THROTTLE_SECONDS]
+                              [--throttle-source COUNT SECONDS]
+                              [--throttle-sender COUNT SECONDS]
+                              [--throttle-action COUNT SECONDS]
+                              [--throttle-queue-size THROTTLE_QUEUE_SIZE]
+                              [--action-workers ACTION_WORKERS]
+                              [--action-queue-size ACTION_QUEUE_SIZE]
+                              [--action-overflow {block,drop_oldest,drop_newest}]
                               [-d DEVICE] [--list-devices] [--proxy PROXY]
                               [--debug] [-v] [-q] [--oauth2] [--clear-oauth2]
                               [--version]
@@ -26,6 +40,12 @@ optional arguments:
                         fish. " }, { "title" : "Second push", "body" : "Second
                         body" } ] Or simpler form for a single push: { "title"
                         : "title here", "body" : "body here"}
+  --exec-workers EXEC_WORKERS
+                        Keep this many processes of each --exec script running
+                        and send them pushes as lines of JSON, {"id": 1,
+                        "push": {...}}, to be answered with lines like {"id":
+                        1, "response": {...}}, instead of starting a process
+                        for every push (default 0)
   -s EXEC_SIMPLE [EXEC_SIMPLE ...], --exec-simple EXEC_SIMPLE [EXEC_SIMPLE ...]
                         ACTION: Execute a script to receive push in simplified
                         form via stdin. The first line of stdin will be the
@@ -33,12 +53,28 @@ optional arguments:
                         script can write lines back to stdout to send a single
                         push back. The first line of stdout will be the title,
                         and subsequent lines will be the body.
+  --exec-batch-size EXEC_BATCH_SIZE
+                        Send up to this many pushes at once to each --exec or
+                        --exec-simple process (default 1)
+  --exec-batch-ms EXEC_BATCH_MS
+                        Longest a push waits for others to join its batch, in
+                        milliseconds (default 100)
+  --exec-batch-format {json,jsonl}
+                        How --exec scripts receive batches: a JSON array, or
+                        one JSON push per line (default json)
   -p EXEC_PYTHON [EXEC_PYTHON ...], --exec-python EXEC_PYTHON [EXEC_PYTHON ...]
                         ACTION: Load the given python file and execute it by
                         calling its on_push(p, pb) function with 2 arguments:
                         the push that was received and a live/connected
                         AsyncPushbullet object with which responses may be
                         sent.
+  --exec-python-pool {thread,process}
+                        Where --exec-python files whose on_push(p) is a plain
+                        function, not a coroutine, run it: in threads or in
+                        supervised processes (default thread)
+  --exec-python-workers EXEC_PYTHON_WORKERS
+                        Threads or processes for each --exec-python file
+                        (default 4)
   -t TIMEOUT, --timeout TIMEOUT
                         Timeout in seconds to use for actions being called
                         (default 30).
@@ -48,6 +84,27 @@ optional arguments:
   --throttle-seconds THROTTLE_SECONDS
                         Pushes will be throttled to a certain number of pushes
                         (default 10) in this many seconds (default 10)
+  --throttle-source COUNT SECONDS
+                        Also throttle pushes from each source device to COUNT
+                        in SECONDS
+  --throttle-sender COUNT SECONDS
+                        Also throttle pushes from each sender to COUNT in
+                        SECONDS
+  --throttle-action COUNT SECONDS
+                        Also throttle the pushes given to each action to COUNT
+                        in SECONDS
+  --throttle-queue-size THROTTLE_QUEUE_SIZE
+                        Throttled pushes that may wait their turn before
+                        pblisten stops reading more (default 1000)
+  --action-workers ACTION_WORKERS
+                        Pushes each action may handle at once (default 4)
+  --action-queue-size ACTION_QUEUE_SIZE
+                        Pushes that may wait for each action's workers
+                        (default 100)
+  --action-overflow {block,drop_oldest,drop_newest}
+                        What to do with a push when an action's queue is full:
+                        block (stop reading pushes until there is room),
+                        drop_oldest or drop_newest (default block)
   -d DEVICE, --device DEVICE
                         Only listen for pushes targeted at given device name
   --list-devices        List registered device names
@@ -62,26 +119,32 @@ optional arguments:
 """
 import argparse
 import asyncio
+import concurrent.futures
 import importlib.util
 import json
 import logging
 import math
+import multiprocessing
 import os
 import pprint
+import signal
 import sys
 import textwrap
 import threading
 import time
 import traceback
 import types
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from functools import partial
-from typing import List
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
 from asyncpushbullet import AsyncPushbullet, __version__
 from asyncpushbullet import InvalidKeyError, PushbulletError
 from asyncpushbullet import LiveStreamListener
 from asyncpushbullet import errors
 from asyncpushbullet import oauth2
+from asyncpushbullet.helpers import BoundedExpiringSet
+from asyncpushbullet.throttle import DEFAULT_MAX_PENDING, Throttle
 
 __author__ = "Robert Harder"
 __email__ = "rob@iHarder.net"
@@ -89,6 +152,20 @@ __email__ = "rob@iHarder.net"
 DEFAULT_THROTTLE_COUNT = 10
 DEFAULT_THROTTLE_SECONDS = 10
 DEFAULT_COMMAND_TIMEOUT = 30
+DEFAULT_BATCH_MILLISECONDS = 100  # Longest a push waits for others to share its process
+DEFAULT_RESPONSE_LINE_LIMIT = 16 * 1024 * 1024  # Longest line a persistent worker may answer with, in bytes
+PROCESS_STOP_SECONDS = 5  # How long a terminated child process has to exit before it is killed
+BATCH_FORMATS = ("json", "jsonl")
+PYTHON_POOLS = ("thread", "process")
+DEFAULT_PYTHON_WORKERS = 4
+DEFAULT_RELOAD_SECONDS = 1.0
+DEFAULT_HEALTH_CHECK_SECONDS = 30  # How often idle worker processes are pinged ...
+DEFAULT_HEALTH_CHECK_TIMEOUT = 5  # ... and how long they have to answer
+DEFAULT_ACTION_WORKERS = 4  # Pushes each action handles at once ...
+DEFAULT_ACTION_QUEUE_SIZE = 100  # ... and how many more may wait their turn
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+SENT_PUSH_MEMORY_COUNT = 1000  # How many pushes we sent to remember ...
+SENT_PUSH_MEMORY_SECONDS = 3600  # ... and for how long, so as to ignore their echoes
 ENCODING = "utf-8"
 LOG = logging.getLogger(__name__)
 
@@ -191,6 +268,8 @@ async def _run(args):
     # Throttle
     throttle_count = args.throttle_count
     throttle_seconds = args.throttle_seconds
+    per_source, per_sender, per_action = [(int(budget[0]), budget[1]) if budget else None for budget in
+                                          (args.throttle_source, args.throttle_sender, args.throttle_action)]
 
     # Device
     device = args.device
@@ -205,8 +284,15 @@ async def _run(args):
                            proxy=proxy,
                            throttle_count=throttle_count,
                            throttle_seconds=throttle_seconds,
+                           throttle_per_source=per_source,
+                           throttle_per_sender=per_sender,
+                           throttle_per_action=per_action,
+                           throttle_queue_size=args.throttle_queue_size,
                            device=device,
-                           timeout=timeout)
+                           timeout=timeout,
+                           action_workers=args.action_workers,
+                           action_queue_size=args.action_queue_size,
+                           action_overflow=args.action_overflow)
 
     # Windows needs special event loop in order to launch processes on it
     proc_loop: asyncio.BaseEventLoop
@@ -222,28 +308,40 @@ async def _run(args):
 
     threading.Thread(target=partial(_thread_run, proc_loop), name="Thread-proc", daemon=True).start()
 
+    # Batches of pushes for each process?
+    batch_options = {"batch_size": max(1, args.exec_batch_size),
+                     "batch_seconds": args.exec_batch_ms / 1000,
+                     "batch_format": args.exec_batch_format}
+    batch_workers = None  # type: int
+    if args.exec_batch_size > 1:  # Let enough pushes wait to fill each worker's batch
+        batch_workers = args.action_workers * args.exec_batch_size
+
     # Add actions from command line arguments
     if args.exec:
         for cmd_opts in args.exec:
             cmd_path = cmd_opts[0]
             cmd_args = cmd_opts[1:]
-            action = ExecutableAction(cmd_path, cmd_args, loop=proc_loop, timeout=timeout)
-            listen_app.add_action(action)
+            action = ExecutableAction(cmd_path, cmd_args, loop=proc_loop, timeout=timeout,
+                                      persistent_workers=args.exec_workers, **batch_options)
+            listen_app.add_action(action, workers=args.exec_workers or batch_workers)
 
     # Add actions from command line arguments
     if args.exec_simple:
         for cmd_opts in args.exec_simple:
             cmd_path = cmd_opts[0]
             cmd_args = cmd_opts[1:]
-            action = ExecutableActionSimplified(cmd_path, cmd_args, loop=proc_loop, timeout=timeout)
-            listen_app.add_action(action)
+            action = ExecutableActionSimplified(cmd_path, cmd_args, loop=proc_loop, timeout=timeout, **batch_options)
+            listen_app.add_action(action, workers=batch_workers)
 
     # Add actions from command line arguments
     if args.exec_python:
         for cmd_opts in args.exec_python:
             cmd_path = cmd_opts[0]
-            action = ExecutableActionPython(cmd_path)
-            listen_app.add_action(action)
+            if args.exec_python_pool == "process":
+                action = ProcessPoolAction(cmd_path, workers=args.exec_python_workers, timeout=timeout)
+            else:
+                action = ExecutableActionPython(cmd_path, workers=args.exec_python_workers)
+            listen_app.add_action(action, workers=args.exec_python_workers)
 
     # Echo
     if args.echo:
@@ -314,6 +412,12 @@ def parse_args():
 
         { "title" : "title here", "body" : "body here"}
                         """))
+    parser.add_argument("--exec-workers", type=int, default=0,
+                        help=textwrap.dedent("""
+                        Keep this many processes of each --exec script running and
+                        send them pushes as lines of JSON, {"id": 1, "push": {...}},
+                        to be answered with lines like {"id": 1, "response": {...}},
+                        instead of starting a process for every push (default 0)"""))
     parser.add_argument("-s", "--exec-simple", nargs="+", action="append",
                         help=textwrap.dedent("""
                         ACTION: Execute a script to receive push in simplified form
@@ -323,6 +427,18 @@ def parse_args():
                         push back.  The first line of stdout will be the title, and
                         subsequent lines will be the body.
                         """))
+    parser.add_argument("--exec-batch-size", type=int, default=1,
+                        help=textwrap.dedent("""
+                        Send up to this many pushes at once to each --exec or
+                        --exec-simple process (default 1)"""))
+    parser.add_argument("--exec-batch-ms", type=float, default=DEFAULT_BATCH_MILLISECONDS,
+                        help=textwrap.dedent("""
+                        Longest a push waits for others to join its batch, in
+                        milliseconds (default {})""".format(DEFAULT_BATCH_MILLISECONDS)))
+    parser.add_argument("--exec-batch-format", choices=BATCH_FORMATS, default="json",
+                        help=textwrap.dedent("""
+                        How --exec scripts receive batches: a JSON array, or one
+                        JSON push per line (default json)"""))
     parser.add_argument("-p", "--exec-python", nargs="+", action="append",
                         help=textwrap.dedent("""
                         ACTION: Load the given python file and execute it by calling
@@ -330,6 +446,13 @@ def parse_args():
                         received and a live/connected AsyncPushbullet object with which
                         responses may be sent.
                         """))
+    parser.add_argument("--exec-python-pool", choices=PYTHON_POOLS, default="thread",
+                        help=textwrap.dedent("""
+                        Where --exec-python files whose on_push(p) is a plain function,
+                        not a coroutine, run it: in threads or in supervised processes (default thread)"""))
+    parser.add_argument("--exec-python-workers", type=int, default=DEFAULT_PYTHON_WORKERS,
+                        help="Threads or processes for each --exec-python file (default {})"
+                        .format(DEFAULT_PYTHON_WORKERS))
     parser.add_argument("-t", "--timeout", help="Timeout in seconds to use for actions being called (default {})."
                         .format(DEFAULT_COMMAND_TIMEOUT))
     parser.add_argument("--throttle-count", type=int, default=DEFAULT_THROTTLE_COUNT,
@@ -344,6 +467,26 @@ def parse_args():
                         in this many seconds (default {})"""
                                              .format(DEFAULT_THROTTLE_COUNT,
                                                      DEFAULT_THROTTLE_SECONDS)))
+    parser.add_argument("--throttle-source", type=float, nargs=2, metavar=("COUNT", "SECONDS"),
+                        help="Also throttle pushes from each source device to COUNT in SECONDS")
+    parser.add_argument("--throttle-sender", type=float, nargs=2, metavar=("COUNT", "SECONDS"),
+                        help="Also throttle pushes from each sender to COUNT in SECONDS")
+    parser.add_argument("--throttle-action", type=float, nargs=2, metavar=("COUNT", "SECONDS"),
+                        help="Also throttle the pushes given to each action to COUNT in SECONDS")
+    parser.add_argument("--throttle-queue-size", type=int, default=DEFAULT_MAX_PENDING,
+                        help=textwrap.dedent("""
+                        Throttled pushes that may wait their turn before pblisten stops
+                        reading more (default {})""".format(DEFAULT_MAX_PENDING)))
+    parser.add_argument("--action-workers", type=int, default=DEFAULT_ACTION_WORKERS,
+                        help="Pushes each action may handle at once (default {})".format(DEFAULT_ACTION_WORKERS))
+    parser.add_argument("--action-queue-size", type=int, default=DEFAULT_ACTION_QUEUE_SIZE,
+                        help="Pushes that may wait for each action's workers (default {})"
+                        .format(DEFAULT_ACTION_QUEUE_SIZE))
+    parser.add_argument("--action-overflow", choices=OVERFLOW_POLICIES, default="block",
+                        help=textwrap.dedent("""
+                        What to do with a push when an action's queue is full: block
+                        (stop reading pushes until there is room), drop_oldest or
+                        drop_newest (default block)"""))
 
     parser.add_argument("-d", "--device", help="Only listen for pushes targeted at given device name")
     parser.add_argument("--list-devices", action="store_true", help="List registered device names")
@@ -361,9 +504,62 @@ def parse_args():
         parser.print_help()
         sys.exit(errors.__ERR_NOTHING_TO_DO__)
 
+    if args.throttle_count < 0 or args.throttle_seconds < 0:
+        parser.error("--throttle-count and --throttle-seconds cannot be negative (0 turns that limit off)")
+    for flag, budget in (("--throttle-source", args.throttle_source),
+                         ("--throttle-sender", args.throttle_sender),
+                         ("--throttle-action", args.throttle_action)):
+        if budget is not None and (budget[0] < 1 or budget[0] != int(budget[0]) or not budget[1] > 0):
+            parser.error("{} needs a whole COUNT of at least 1 and SECONDS above 0".format(flag))
+
     return args
 
 
+async def push_response(response, pb: AsyncPushbullet):
+    """
+    Sends the pushes an action responded with: a dict such as
+    {"title": "title here", "body": "body here"}, a list of them, or anything
+    else, which is sent as the body of a note.
+    """
+
+    async def _hndl_resp(_resp):
+        # Interpret structures response
+        title = _resp.get("title")
+        body = _resp.get("body")
+
+        if _resp.get("type") == "file":
+            file_type = _resp.get("file_type")
+            file_url = _resp.get("file_url")
+            file_name = _resp.get("file_name")
+            await pb.async_push_file(file_name=file_name,
+                                     file_url=file_url,
+                                     file_type=file_type,
+                                     title=title,
+                                     body=body)
+        else:
+            await pb.async_push_note(title=title, body=body)
+        del title, body
+
+    if type(response) == list:
+        for resp in response:
+            await _hndl_resp(resp)
+    elif type(response) == dict:
+        await _hndl_resp(response)
+    else:
+        # Not sure what was returned
+        await pb.async_push_note(title="Response", body=str(response))
+
+
+async def _stop_process(proc: asyncio.subprocess.Process, timeout: float = PROCESS_STOP_SECONDS):
+    """Terminates a child process, killing it if it has not exited after timeout seconds."""
+    proc.terminate()
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+
+
 class Action:
     """ Base class for actions that this listener will take upon receiving new pushes. """
 
@@ -373,6 +569,16 @@ class Action:
     async def on_push(self, push: dict, pb: AsyncPushbullet):
         pass
 
+    @property
+    def enforces_timeout(self) -> bool:
+        """True if the action stops its own work when it runs out of time, so the
+        listener should leave it to do so rather than cancel it."""
+        return False
+
+    async def close(self):
+        """Releases anything the action holds, such as processes, when the listener closes."""
+        pass
+
     def __repr__(self):
         return type(self).__name__
 
@@ -403,6 +609,29 @@ class ExecutableAction(Action):
     Or simpler form for a single push:
 
         { "title" = "title here", "body" = "body here"}
+
+    Starting a process for every push costs a fork/exec and, for scripts, an
+    interpreter startup each time.  With persistent_workers > 0, that many
+    processes are started once and kept running instead, restarted if they exit.
+    Each push is written to a worker's stdin as one line of JSON with an id:
+
+        {"id": 1, "push": { ...the push... }}
+
+    and the worker answers with one line on stdout carrying the same id and a
+    response in the form above, or an error message:
+
+        {"id": 1, "response": {"title": "title here", "body": "body here"}}
+        {"id": 2, "error": "Something went wrong"}
+
+    Each worker is sent one push at a time.  Anything written to stderr is logged.
+    A response line longer than response_line_limit bytes fails its push, and
+    the worker is restarted.
+
+    Alternately, with batch_size > 1, pushes that arrive close together share a
+    process.  Pushes are collected until there are batch_size of them or the
+    first has waited batch_seconds, and the process gets them all on stdin as a
+    JSON array (batch_format="json") or one JSON object per line ("jsonl").  It
+    can respond with an array of pushes, as above.
     """
 
     class _ProcessProtocol(asyncio.SubprocessProtocol):
@@ -420,13 +649,32 @@ class ExecutableAction(Action):
         def process_exited(self):
             print("_ProcessProtocol.process_exited")
 
-    def __init__(self, path_to_executable, args_for_exec=(), loop: asyncio.BaseEventLoop = None, timeout=None):
+    def __init__(self, path_to_executable, args_for_exec=(), loop: asyncio.BaseEventLoop = None, timeout=None,
+                 persistent_workers: int = 0,
+                 response_line_limit: int = DEFAULT_RESPONSE_LINE_LIMIT,
+                 batch_size: int = 1,
+                 batch_seconds: float = DEFAULT_BATCH_MILLISECONDS / 1000,
+                 batch_format: str = "json"):
         super().__init__()
+        if persistent_workers > 0 and batch_size > 1:
+            raise ValueError("Use persistent workers or batches, not both")
+        if batch_format not in BATCH_FORMATS:
+            raise ValueError("Unknown batch format {}: choose from {}".format(batch_format, ", ".join(BATCH_FORMATS)))
         self.path_to_executable = path_to_executable
         self.args_for_exec = args_for_exec
         self.protocol = ExecutableAction._ProcessProtocol(self)
         self.timeout = timeout
         self.proc_loop = loop
+        self.persistent_workers = persistent_workers  # type: int
+        self.response_line_limit = response_line_limit  # type: int
+        self.restarts = 0  # Times a persistent worker had to be started again
+        self._workers = []  # type: List[ExecutableAction._PersistentWorker]
+        self._idle_workers = None  # type: asyncio.Queue  # On proc_loop
+        self.batch_size = batch_size  # type: int
+        self.batch_seconds = batch_seconds  # type: float
+        self.batch_format = batch_format  # type: str
+        self._batch = []  # type: List[Tuple[dict, asyncio.Future]]
+        self._batch_timer = None  # type: asyncio.TimerHandle
 
         if not os.path.isfile(path_to_executable):
             self.log.warning("Executable not found at launch time.  " +
@@ -436,7 +684,19 @@ class ExecutableAction(Action):
     def __repr__(self):
         return "{}({} {})".format(super().__repr__(), self.path_to_executable, " ".join(self.args_for_exec))
 
+    @property
+    def enforces_timeout(self) -> bool:
+        return self.timeout is not None
+
     async def on_push(self, push: dict, pb: AsyncPushbullet):
+        if self.persistent_workers > 0:
+            return await self._on_push_persistent(push, pb)
+        if self.batch_size > 1:
+            return await self._on_push_batched(push, pb)
+        await self._run_process(self.transform_push_to_stdin_data(push), pb)
+
+    async def _run_process(self, input_bytes: bytes, pb: AsyncPushbullet):
+        """Runs the executable once with input_bytes on stdin and responds to its output."""
         io_loop = asyncio.get_event_loop()  # Loop handling the pushbullet IO
 
         async def _on_proc_loop():
@@ -453,20 +713,17 @@ class ExecutableAction(Action):
                                .format(self.path_to_executable, e))
 
             else:
-                # Pass the incoming push via stdin (json form)
-                input_bytes = json.dumps(push).encode(ENCODING)
-
                 try:
                     # print("Awaiting process completion", self.path_to_executable, *self.args_for_exec)
                     self.log.debug(
                         "Awaiting process completion {}".format([self.path_to_executable, *self.args_for_exec]))
                     stdout_data, stderr_data = await asyncio.wait_for(proc.communicate(input=input_bytes),
                                                                       timeout=self.timeout)
-                except asyncio.futures.TimeoutError:
+                except asyncio.TimeoutError:
+                    await _stop_process(proc)
                     err_msg = "Execution timed out after {} seconds. {}".format(self.timeout, repr(self))
                     self.log.error(err_msg)
                     await pb.async_push_note(title="AsyncPushbullet Error", body=err_msg)
-                    proc.terminate()
 
                 else:
                     # Handle the response from the subprocess
@@ -479,18 +736,216 @@ class ExecutableAction(Action):
                         self.handle_process_response(stdout_data, stderr_data, pb),
                         loop=io_loop)
                 finally:
+                    if proc.returncode is None:  # This push was cancelled, so do not leave the process behind
+                        await _stop_process(proc)
                     self.log.debug("Process complete {}".format([self.path_to_executable, *self.args_for_exec]))
                     # print("Process complete", self.path_to_executable, *self.args_for_exec)
 
         # This Action's do() function must process on the alternate event loop
         # This is necessary mostly for the windows world where we have to have
         # a different event loop, a ProactorLoop, to handle subprocesses.
-        asyncio.run_coroutine_threadsafe(_on_proc_loop(), self.proc_loop)
+        # Wait for the process so that the action's workers bound how many run at once.
+        proc_task = []  # type: List[asyncio.Task]  # Running _on_proc_loop, on proc_loop
+        finished = concurrent.futures.Future()  # Set to proc_task[0] when it is done, however it ends
+
+        def _start():
+            task = asyncio.ensure_future(_on_proc_loop())
+            task.add_done_callback(finished.set_result)
+            proc_task.append(task)
+
+        self.proc_loop.call_soon_threadsafe(_start)
+        try:
+            task = await asyncio.shield(asyncio.wrap_future(finished))
+        except asyncio.CancelledError:
+            # Cancel the process too, and wait while it is stopped, so that nothing is left running
+            self.proc_loop.call_soon_threadsafe(lambda: proc_task[0].cancel())  # Always after _start
+            await asyncio.wrap_future(finished)
+            raise
+        task.result()  # Raises whatever it raised
+
+    async def _on_push_batched(self, push: dict, pb: AsyncPushbullet):
+        fut = asyncio.get_event_loop().create_future()
+        self._batch.append((push, fut))
+        if len(self._batch) >= self.batch_size:
+            self._start_batch(pb)
+        elif self._batch_timer is None:
+            self._batch_timer = asyncio.get_event_loop().call_later(self.batch_seconds, self._start_batch, pb)
+        await fut  # Until the batch's process is done
+
+    def _start_batch(self, pb: AsyncPushbullet):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        batch, self._batch = self._batch, []
+        if batch:
+            asyncio.get_event_loop().create_task(self._run_batch(batch, pb))
+
+    async def _run_batch(self, batch: List[Tuple[dict, asyncio.Future]], pb: AsyncPushbullet):
+        self.log.debug("Sending a batch of {} pushes to {}".format(len(batch), repr(self)))
+        try:
+            await self._run_process(self.transform_batch_to_stdin_data([push for push, _ in batch]), pb)
+        except Exception as ex:
+            err_msg = "Batch of {} pushes to {} caused exception {}".format(len(batch), repr(self), ex)
+            self.log.warning(err_msg)
+            await pb.async_push_note(title="AsyncPushbullet Error", body=err_msg)
+        finally:
+            for _, fut in batch:
+                if not fut.done():  # Its caller may have timed out already
+                    fut.set_result(None)
 
-    # def transform_push_to_stdin_data(self, push: dict) -> bytes:
-    #     json_push = json.dumps(push)
-    #     input_bytes = json_push.encode(ENCODING)
-    #     return input_bytes
+    def transform_push_to_stdin_data(self, push: dict) -> bytes:
+        return json.dumps(push).encode(ENCODING)
+
+    def transform_batch_to_stdin_data(self, pushes: List[dict]) -> bytes:
+        if self.batch_format == "jsonl":
+            return "".join(json.dumps(push) + "\n" for push in pushes).encode(ENCODING)
+        return json.dumps(pushes).encode(ENCODING)
+
+    async def _on_push_persistent(self, push: dict, pb: AsyncPushbullet):
+        # The workers live on the process loop, as one-off processes do
+        fut = asyncio.run_coroutine_threadsafe(self._persistent_request(push), self.proc_loop)
+        stdout_data, stderr_data = await asyncio.wrap_future(fut)
+        await self.handle_process_response(stdout_data, stderr_data, pb)
+
+    async def _persistent_request(self, push: dict) -> Tuple[bytes, bytes]:
+        if self._idle_workers is None:
+            self._idle_workers = asyncio.Queue()
+            self._workers = [ExecutableAction._PersistentWorker(self, n) for n in range(self.persistent_workers)]
+            for worker in self._workers:
+                self._idle_workers.put_nowait(worker)
+
+        worker = await self._idle_workers.get()  # type: ExecutableAction._PersistentWorker
+        try:
+            return await asyncio.wait_for(worker.request(push), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.log.error("Execution timed out after {} seconds. Restarting worker {} of {}"
+                           .format(self.timeout, worker.number, repr(self)))
+            await worker.stop()
+            raise
+        except asyncio.CancelledError:
+            await worker.stop()  # It may still answer, but no one is listening
+            raise
+        finally:
+            self._idle_workers.put_nowait(worker)
+
+    async def close(self):
+        if self._workers and self.proc_loop is not None and not self.proc_loop.is_closed():
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._stop_workers(), self.proc_loop))
+
+    async def _stop_workers(self):
+        for worker in self._workers:
+            await worker.stop()
+
+    class _PersistentWorker:
+        """A long-running child process that answers pushes over newline-delimited JSON."""
+
+        def __init__(self, action, number: int):
+            self.action = action  # type: ExecutableAction
+            self.number = number  # type: int
+            self.proc = None  # type: asyncio.subprocess.Process
+            self._next_id = 0
+            self._pending = {}  # type: Dict[int, asyncio.Future]  # Pushes sent to self.proc awaiting answers
+
+        async def start(self):
+            action = self.action
+            action.log.info("Launching worker {} for {}".format(self.number, repr(action)))
+            self.proc = await asyncio.create_subprocess_exec(action.path_to_executable,
+                                                             *action.args_for_exec,
+                                                             stdin=asyncio.subprocess.PIPE,
+                                                             stdout=asyncio.subprocess.PIPE,
+                                                             stderr=asyncio.subprocess.PIPE,
+                                                             limit=action.response_line_limit)
+            # Each process gets its own pending map, so that an old process's reader,
+            # still finishing after a restart, cannot fail pushes sent to the new one
+            self._pending = {}
+            loop = asyncio.get_event_loop()
+            loop.create_task(self._read_responses(self.proc, self._pending))
+            loop.create_task(self._read_stderr(self.proc))
+
+        async def stop(self):
+            proc, self.proc = self.proc, None
+            if proc is not None and proc.returncode is None:
+                await _stop_process(proc)
+
+        async def request(self, push: dict) -> Tuple[bytes, bytes]:
+            """Sends the push and returns the worker's response as (stdout_data, stderr_data)."""
+            if self.proc is None or self.proc.returncode is not None:
+                if self.proc is not None:
+                    self.action.restarts += 1
+                    self.action.log.warning("Worker {} of {} exited with code {}. Restarting."
+                                            .format(self.number, repr(self.action), self.proc.returncode))
+                await self.start()
+
+            self._next_id += 1
+            request_id = self._next_id
+            fut = asyncio.get_event_loop().create_future()
+            pending = self._pending
+            pending[request_id] = fut
+            try:
+                line = json.dumps({"id": request_id, "push": push}) + "\n"
+                self.proc.stdin.write(line.encode(ENCODING))
+                await self.proc.stdin.drain()
+                return await fut
+            except (BrokenPipeError, ConnectionResetError) as ex:
+                raise ChildProcessError("Worker {} of {} is not accepting pushes: {}"
+                                        .format(self.number, repr(self.action), ex))
+            finally:
+                pending.pop(request_id, None)
+
+        async def _read_responses(self, proc: asyncio.subprocess.Process, pending: Dict[int, asyncio.Future]):
+            """Answers the futures in pending, which are for pushes sent to proc, and fails
+            those left when proc ends."""
+            log = self.action.log
+            error = None  # type: Exception
+            while True:
+                try:
+                    line = await proc.stdout.readline()
+                except (ValueError, asyncio.LimitOverrunError) as ex:
+                    # Its stdout is no longer in step with its pushes, so start over
+                    log.error("Worker {} of {} sent a response longer than {} bytes. Restarting worker."
+                              .format(self.number, repr(self.action), self.action.response_line_limit))
+                    error = ChildProcessError("Worker {} of {} sent a response that was too long: {}"
+                                              .format(self.number, repr(self.action), ex))
+                    if proc.returncode is None:
+                        proc.kill()
+                    break
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line.decode(ENCODING, "replace"))
+                except ValueError:
+                    log.warning("Ignoring line from worker {} of {} that is not JSON: {}"
+                                .format(self.number, repr(self.action), line))
+                    continue
+                fut = pending.get(msg.get("id")) if isinstance(msg, dict) else None
+                if fut is None or fut.done():
+                    log.warning("Ignoring response from worker {} of {} to no waiting push: {}"
+                                .format(self.number, repr(self.action), line))
+                    continue
+                response = msg.get("response")
+                fut.set_result((b"" if response is None else json.dumps(response).encode(ENCODING),
+                                str(msg.get("error") or "").encode(ENCODING)))
+
+            # Process has ended: anyone still waiting will not get an answer
+            returncode = await proc.wait()
+            if error is None:
+                error = ChildProcessError("Worker {} of {} exited with code {}"
+                                          .format(self.number, repr(self.action), returncode))
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(error)
+
+        async def _read_stderr(self, proc: asyncio.subprocess.Process):
+            while True:
+                try:
+                    line = await proc.stderr.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    line = b"(line longer than the limit skipped)"  # The reader drops it and carries on
+                if not line:
+                    break
+                self.action.log.warning("Stderr from worker {} of {}: {}"
+                                        .format(self.number, repr(self.action),
+                                                line.decode(ENCODING, "replace").rstrip()))
 
     async def handle_process_response(self, stdout_data: bytes, stderr_data: bytes, pb: AsyncPushbullet):
 
@@ -529,33 +984,7 @@ class ExecutableAction(Action):
                 del title, body
 
             else:
-
-                async def _hndl_resp(_resp):
-                    # Interpret structures response
-                    title = _resp.get("title")
-                    body = _resp.get("body")
-
-                    if _resp.get("type") == "file":
-                        file_type = _resp.get("file_type")
-                        file_url = _resp.get("file_url")
-                        file_name = _resp.get("file_name")
-                        await pb.async_push_file(file_name=file_name,
-                                                 file_url=file_url,
-                                                 file_type=file_type,
-                                                 title=title,
-                                                 body=body)
-                    else:
-                        await pb.async_push_note(title=title, body=body)
-                    del title, body
-
-                if type(response) == list:
-                    for resp in response:
-                        await _hndl_resp(resp)
-                elif type(response) == dict:
-                    await _hndl_resp(response)
-                else:
-                    # Not sure what was returned
-                    await pb.async_push_note(title="Response", body=str(response))
+                await push_response(response, pb)
         else:
             pass
             # Nothing sent back in stdout or stderr: send no push
@@ -571,6 +1000,9 @@ class ExecutableActionSimplified(ExecutableAction):
         Fish Food Served
         Your automated fish feeding gadget has fed your fish.
 
+    In batches (batch_size > 1), each push takes two lines, the title and then
+    the body with its line breaks replaced by spaces, and so does each push in
+    the response.
     """
 
     def transform_push_to_stdin_data(self, push: dict) -> bytes:
@@ -580,12 +1012,23 @@ class ExecutableActionSimplified(ExecutableAction):
         output_bytes = output.encode(ENCODING)
         return output_bytes
 
+    def transform_batch_to_stdin_data(self, pushes: List[dict]) -> bytes:
+        lines = []
+        for push in pushes:
+            lines.append(str(push.get("title", "")).strip().replace("\n", " "))
+            lines.append(" ".join(str(push.get("body", "")).splitlines()))
+        return "".join(line + "\n" for line in lines).encode(ENCODING)
+
     async def handle_process_response(self, stdout_data: bytes, stderr_data: bytes, pb: AsyncPushbullet):
 
         if stdout_data != b"":
             data = stdout_data.decode(ENCODING, "replace")
             lines = data.splitlines()
-            if len(lines) > 0:
+            if self.batch_size > 1:
+                resps = [{"title": lines[i].rstrip(), "body": lines[i + 1].rstrip() if i + 1 < len(lines) else ""}
+                         for i in range(0, len(lines), 2)]
+                stdout_data = json.dumps(resps).encode(ENCODING)
+            elif len(lines) > 0:
                 title = lines.pop(0).rstrip()
                 body_lines = [line.rstrip() for line in lines]
                 body = "\n".join(body_lines)
@@ -602,13 +1045,35 @@ class ExecutableActionPython(Action):
     async def on_push(push:dict, pb:AsyncPushbullet):
         ...
 
+    For work that would hold up the event loop, on_push can instead be a plain
+    function.  It is run in a pool of threads (or, with pool="process", a pool
+    of processes) and returns any pushes to send back, in the same form as an
+    ExecutableAction's response, or None:
+
+    def on_push(push:dict):
+        return {"title": "title here", "body": "body here"}
+
+    With pool="process", on_push must be a plain function.  See also
+    ProcessPoolAction, which looks after its worker processes.
+
+    The file is loaded again when it changes.  A background task checks its
+    timestamp every reload_seconds, so pushes never wait on the file system.
     """
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, pool: str = "thread", workers: int = DEFAULT_PYTHON_WORKERS,
+                 reload_seconds: float = DEFAULT_RELOAD_SECONDS):
         super().__init__()
+        if pool not in PYTHON_POOLS:
+            raise ValueError("Unknown pool {}: choose from {}".format(pool, ", ".join(PYTHON_POOLS)))
         self.path = path  # type: str
+        self.pool = pool  # type: str
+        self.workers = workers  # type: int
+        self.reload_seconds = reload_seconds  # type: float
         self._mod_cache = None
-        self._mod_path_last_timestamp = 0.0  # type: float
+        self._mod_path_last_timestamp = None  # type: float  # Until the file is first loaded or checked
+        self._mod_version = 0  # type: int  # Changes with the file, so pool processes know to reload it
+        self._watcher = None  # type: asyncio.Task
+        self._executor = None  # type: Executor
         self.module_prefix = "{}_{}".format(self.__class__.__name__, id(self))  # type: str
 
     def __repr__(self):
@@ -616,32 +1081,475 @@ class ExecutableActionPython(Action):
 
     @property
     def module(self):
-        mtime = os.stat(self.path).st_mtime
-        mcache = self._mod_path_last_timestamp
-        if mtime > mcache and not math.isclose(mtime, mcache):
-            self.log.debug("Timestamp {} for file {} is newer than cached {}.  Reloading."
-                           .format(mtime, self.path, mcache))
-            self._mod_path_last_timestamp = mtime
-            self._mod_cache = None
+        if self._mod_cache is None:
+            self._mod_path_last_timestamp, self._mod_cache = self._load()
+        return self._mod_cache
 
+    async def async_module(self):
+        """Like module, but any loading is done in an executor."""
         if self._mod_cache is None:
-            spec = importlib.util.spec_from_file_location(self.module_prefix, self.path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            self._mod_cache = module
+            mtime, module = await asyncio.get_event_loop().run_in_executor(None, self._load)
+            if self._mod_cache is None:  # Unless another push loaded it meanwhile
+                self._mod_path_last_timestamp, self._mod_cache = mtime, module
         return self._mod_cache
 
+    def _load(self) -> Tuple[float, types.ModuleType]:
+        mtime = os.stat(self.path).st_mtime
+        return mtime, _load_python_file(self.path, self.module_prefix)
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix=self.module_prefix)
+        return self._executor
+
     async def on_push(self, push: dict, pb: AsyncPushbullet):
-        return await self.module.on_push(push, pb)
+        if self._watcher is None:
+            self._watcher = asyncio.get_event_loop().create_task(self._watch())
+
+        loop = asyncio.get_event_loop()
+        if self.pool == "process":
+            response = await loop.run_in_executor(self.executor, _call_python_file,
+                                                  self.path, self.module_prefix, self._mod_version, push)
+        else:
+            func = (await self.async_module()).on_push
+            if asyncio.iscoroutinefunction(func):
+                return await func(push, pb)
+            response = await loop.run_in_executor(self.executor, func, push)
+
+        if response is not None:
+            await push_response(response, pb)
+
+    async def _watch(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                mtime = (await loop.run_in_executor(None, os.stat, self.path)).st_mtime
+            except OSError as ex:
+                self.log.warning("Could not check {} for changes: {}".format(self.path, ex))
+            else:
+                mcache = self._mod_path_last_timestamp
+                if mcache is None:
+                    # Pool processes load the file themselves, so the first check sets the baseline
+                    self._mod_path_last_timestamp = mtime
+                elif mtime > mcache and not math.isclose(mtime, mcache):
+                    self.log.debug("Timestamp {} for file {} is newer than cached {}.  Reloading."
+                                   .format(mtime, self.path, mcache))
+                    self._mod_path_last_timestamp = mtime
+                    self._mod_version += 1
+                    self._mod_cache = None
+            await asyncio.sleep(self.reload_seconds)
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class ProcessPoolAction(ExecutableActionPython):
+    """
+    Runs a python file's plain on_push(push) function in worker processes, so that
+    CPU-heavy handlers can use every core without holding up the listener.
+
+    def on_push(push:dict):
+        return {"title": "title here", "body": "body here"}
+
+    Each worker is a process of its own working on one push at a time, so no more
+    than `workers` pushes are in progress.  Any pushes on_push returns are sent by
+    the listener's AsyncPushbullet.  Every health_check_seconds, idle workers must
+    answer a ping within health_check_timeout seconds.  A worker that has died,
+    does not answer, or spends longer than timeout on a push is replaced.
+    """
+
+    def __init__(self, path: str, workers: int = None,
+                 timeout: float = DEFAULT_COMMAND_TIMEOUT,
+                 health_check_seconds: float = DEFAULT_HEALTH_CHECK_SECONDS,
+                 health_check_timeout: float = DEFAULT_HEALTH_CHECK_TIMEOUT,
+                 reload_seconds: float = DEFAULT_RELOAD_SECONDS):
+        super().__init__(path, pool="process", workers=workers or os.cpu_count() or 1,
+                         reload_seconds=reload_seconds)
+        self.timeout = timeout  # type: float
+        self.health_check_seconds = health_check_seconds  # type: float
+        self.health_check_timeout = health_check_timeout  # type: float
+        self.handled = 0
+        self.restarts = 0  # Workers replaced because they died or stopped answering
+        self._processes = []  # type: List[ProcessPoolAction._WorkerProcess]
+        self._idle = None  # type: asyncio.Queue
+        self._started = None  # type: asyncio.Task
+        self._health_checker = None  # type: asyncio.Task
+
+    @property
+    def executor(self) -> Executor:
+        # Threads that wait on the worker processes, one per worker
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.module_prefix)
+        return self._executor
+
+    async def on_push(self, push: dict, pb: AsyncPushbullet):
+        loop = asyncio.get_event_loop()
+        if self._started is None:  # First push starts the workers while any others wait
+            self._started = loop.create_task(self._start())
+        started = self._started
+        try:
+            await asyncio.shield(started)  # Startup carries on even if this push is cancelled
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if self._started is started:
+                self._started = None  # The next push tries again
+            raise
+
+        worker = await self._idle.get()  # type: ProcessPoolAction._WorkerProcess
+        call = loop.run_in_executor(self.executor, worker.call, "push", (self._mod_version, push), self.timeout)
+        # If this push is cancelled (as when the listener's action timeout runs out), the
+        # worker is still busy with it, so it only goes back to the idle queue once done
+        await asyncio.shield(loop.create_task(self._settle(worker, call)))
+        response = call.result()
+
+        self.handled += 1
+        if response is not None:
+            await push_response(response, pb)
+
+    async def _start(self):
+        loop = asyncio.get_event_loop()
+        self._processes = [ProcessPoolAction._WorkerProcess(self, n) for n in range(self.workers)]
+        try:
+            await loop.run_in_executor(self.executor, self._start_processes)
+        except Exception:
+            await loop.run_in_executor(self.executor, self._stop_processes)  # Any that did start
+            raise
+        self._idle = asyncio.Queue()
+        for worker in self._processes:
+            self._idle.put_nowait(worker)
+        self._watcher = loop.create_task(self._watch())
+        if self.health_check_seconds:
+            self._health_checker = loop.create_task(self._check_health())
+
+    def _start_processes(self):
+        for worker in self._processes:
+            worker.start()
+
+    async def _settle(self, worker, call: asyncio.Future):
+        """Waits for a worker's call to finish, replaces the worker if it failed, and returns it
+        to the idle queue.  The call's result or exception is left for on_push to collect."""
+        try:
+            await call
+        except (ChildProcessError, TimeoutError) as ex:
+            await self._replace(worker, ex)
+        except Exception:
+            pass
+        finally:
+            if self._idle is not None:
+                self._idle.put_nowait(worker)
+
+    async def _replace(self, worker, reason: Exception):
+        self.restarts += 1
+        self.log.warning("Replacing worker {} of {}: {}".format(worker.number, repr(self), reason))
+        await asyncio.get_event_loop().run_in_executor(self.executor, worker.restart)
+
+    async def _check_health(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.health_check_seconds)
+            for _ in range(self._idle.qsize()):  # Busy workers are checked by their push's timeout
+                worker = self._idle.get_nowait()
+                try:
+                    await loop.run_in_executor(self.executor, worker.call, "ping", None, self.health_check_timeout)
+                except (ChildProcessError, TimeoutError) as ex:
+                    await self._replace(worker, ex)
+                finally:
+                    self._idle.put_nowait(worker)
+
+    async def close(self):
+        if self._health_checker is not None:
+            self._health_checker.cancel()
+            self._health_checker = None
+        if self._started is not None and not self._started.done():
+            await asyncio.wait([self._started])  # Let startup finish, so its processes get stopped
+        if self._processes:
+            await asyncio.get_event_loop().run_in_executor(self.executor, self._stop_processes)
+        self._idle = None
+        self._started = None
+        await super().close()
+
+    def _stop_processes(self):
+        for worker in self._processes:
+            worker.stop()
+        self._processes = []
+
+    class _WorkerProcess:
+        """One worker process and the pipe to it.  Its methods block, so call them in an executor."""
+
+        def __init__(self, action, number: int):
+            self.action = action  # type: ProcessPoolAction
+            self.number = number  # type: int
+            self.process = None  # type: multiprocessing.Process
+            self.conn = None
+            self._next_id = 0
+
+        def start(self):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            self.process = multiprocessing.Process(target=_process_pool_worker,
+                                                   args=(self.action.path, self.action.module_prefix, child_conn),
+                                                   name="{}-{}".format(self.action.module_prefix, self.number),
+                                                   daemon=True)
+            self.process.start()
+            child_conn.close()
+            self.conn = parent_conn
+
+        def stop(self):
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            if self.process is not None:
+                self.process.terminate()
+                self.process.join(timeout=1)
+                if self.process.is_alive():
+                    self.process.kill()
+                    self.process.join()
+                self.process = None
+
+        def restart(self):
+            self.stop()
+            self.start()
+
+        def call(self, kind: str, payload, timeout: float):
+            """Sends a request and returns the worker's answer, raising ChildProcessError if
+            the worker is gone, TimeoutError if it does not answer in time, or RuntimeError
+            if on_push raised an exception.  Late answers to earlier requests are discarded."""
+            if self.process is None or not self.process.is_alive():
+                raise ChildProcessError("Worker {} is not running".format(self.number))
+            self._next_id += 1
+            deadline = time.monotonic() + timeout
+            try:
+                self.conn.send((kind, self._next_id, payload))
+                while True:
+                    answered = self.conn.poll(max(0.0, deadline - time.monotonic()))
+                    if not answered:
+                        break
+                    status, request_id, result = self.conn.recv()
+                    if request_id == self._next_id:
+                        break
+                    self.action.log.warning("Worker {} of {} answered request {} late. Discarding the answer."
+                                            .format(self.number, repr(self.action), request_id))
+            except (EOFError, OSError) as ex:
+                raise ChildProcessError("Worker {} exited: {}".format(self.number, ex))
+            if not answered:
+                raise TimeoutError("Worker {} did not answer within {} seconds".format(self.number, timeout))
+            if status == "error":
+                raise RuntimeError(result)
+            return result
+
+
+def _process_pool_worker(path: str, module_name: str, conn):
+    """Runs in each ProcessPoolAction worker: answers pings and hands pushes to on_push."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is for the listener to handle
+    while True:
+        try:
+            kind, request_id, payload = conn.recv()
+        except (EOFError, OSError):
+            break  # Listener is gone
+        if kind == "ping":
+            conn.send(("ok", request_id, None))
+            continue
+        version, push = payload
+        try:
+            conn.send(("ok", request_id, _call_python_file(path, module_name, version, push)))
+        except Exception as ex:
+            conn.send(("error", request_id, "{}: {}".format(ex.__class__.__name__, ex)))
+
+
+def _load_python_file(path: str, module_name: str) -> types.ModuleType:
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Files loaded in each pool process, by module name, with the version they were loaded at
+_pool_modules = {}  # type: Dict[str, Tuple[int, types.ModuleType]]
+
+
+def _call_python_file(path: str, module_name: str, version: int, push: dict):
+    """Calls a python file's on_push in a pool process, loading the file if it is new or has changed."""
+    version_and_module = _pool_modules.get(module_name)
+    if version_and_module is None or version_and_module[0] != version:
+        version_and_module = (version, _load_python_file(path, module_name))
+        _pool_modules[module_name] = version_and_module
+    func = version_and_module[1].on_push
+    if asyncio.iscoroutinefunction(func):
+        raise TypeError("on_push in {} must be a plain function to run in a process pool".format(path))
+    return func(push)
+
+
+class ActionWorkerPool:
+    """
+    Runs each action on a fixed number of worker tasks, fed from a bounded queue.
+
+    A burst of pushes then starts at most `workers` calls of each action at a
+    time, instead of one task (and perhaps one process) per push per action.
+    When an action's queue is full, the overflow policy decides what happens:
+
+        block        submit() waits for room, so pushes stop being read
+        drop_oldest  the push that has waited longest is discarded
+        drop_newest  the push being submitted is discarded
+
+    Each action keeps stats on how many pushes it handled and dropped, how long
+    they took from submission to completion, and how deep its queue got.
+    """
+
+    def __init__(self, call: Callable[[Action, dict], Awaitable],
+                 workers: int = DEFAULT_ACTION_WORKERS,
+                 queue_size: int = DEFAULT_ACTION_QUEUE_SIZE,
+                 overflow: str = "block",
+                 timer: Callable[[], float] = time.monotonic):
+        """
+        :param call: coroutine function called as call(action, push) by the workers
+        :param workers: default number of workers for each action
+        :param queue_size: pushes that may wait for each action's workers
+        :param overflow: "block", "drop_oldest" or "drop_newest"
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy {}: choose from {}"
+                             .format(overflow, ", ".join(OVERFLOW_POLICIES)))
+        self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        self.call = call
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.overflow = overflow
+        self._timer = timer
+        self._lanes = []  # type: List[ActionWorkerPool._Lane]
+
+    def add_action(self, action: Action, workers: int = None):
+        """Adds an action, optionally with its own number of workers."""
+        self._lanes.append(ActionWorkerPool._Lane(self, action, workers or self.workers))
+
+    async def submit(self, push: dict, action: Action = None):
+        """Queues the push for the given action, or for every action, applying the overflow
+        policy where a queue is full."""
+        for lane in self._lanes:
+            if action is None or lane.action is action:
+                await lane.submit(push)
+
+    async def join(self):
+        """Waits until every queued push has been handled."""
+        for lane in self._lanes:
+            if lane.queue is not None:
+                await lane.queue.join()
+
+    async def close(self):
+        """Stops the workers, abandoning any pushes still queued."""
+        for lane in self._lanes:
+            await lane.stop()
+
+    def stats(self) -> Dict[str, dict]:
+        """Returns each action's stats, keyed by repr(action)."""
+        return {repr(lane.action): lane.stats() for lane in self._lanes}
+
+    class _Lane:
+        """One action's queue, workers and stats."""
+
+        def __init__(self, pool, action: Action, workers: int):
+            self.pool = pool  # type: ActionWorkerPool
+            self.action = action  # type: Action
+            self.workers = workers  # type: int
+            self.queue = None  # type: asyncio.Queue
+            self.tasks = []  # type: List[asyncio.Task]
+            self.submitted = 0
+            self.completed = 0
+            self.dropped = 0
+            self.max_depth = 0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+
+        async def submit(self, push: dict):
+            if self.queue is None:  # Start on first use so we're on the right loop
+                self.queue = asyncio.Queue(maxsize=self.pool.queue_size)
+                loop = asyncio.get_event_loop()
+                self.tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+            self.submitted += 1
+            item = (push, self.pool._timer())
+            if self.queue.full() and self.pool.overflow != "block":
+                self.dropped += 1
+                if self.pool.overflow == "drop_newest":
+                    self.pool.log.warning("Queue for {} is full, dropped newest push".format(repr(self.action)))
+                    return
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.pool.log.warning("Queue for {} is full, dropped oldest push".format(repr(self.action)))
+            await self.queue.put(item)
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+
+        async def stop(self):
+            for task in self.tasks:
+                task.cancel()
+            for task in self.tasks:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+            self.tasks = []
+            self.queue = None
+
+        async def _work(self):
+            while True:
+                push, submitted_at = await self.queue.get()
+                try:
+                    await self.pool.call(self.action, push)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as ex:
+                    self.pool.log.warning("Action {} raised {}: {}".format(repr(self.action),
+                                                                         ex.__class__.__name__, ex))
+                finally:
+                    latency = self.pool._timer() - submitted_at
+                    self.completed += 1
+                    self.total_latency += latency
+                    self.max_latency = max(self.max_latency, latency)
+                    self.queue.task_done()
+
+        def stats(self) -> dict:
+            return {"workers": self.workers,
+                    "submitted": self.submitted,
+                    "completed": self.completed,
+                    "dropped": self.dropped,
+                    "queue_depth": 0 if self.queue is None else self.queue.qsize(),
+                    "max_queue_depth": self.max_depth,
+                    "mean_latency": self.total_latency / self.completed if self.completed else 0.0,
+                    "max_latency": self.max_latency}
 
 
 class ListenApp:
+    """
+    Listens for pushes and hands each one to the actions that were added.
+
+    Pushes are throttled to throttle_count every throttle_seconds, and optionally
+    also per source device, per sender and per action, each given as a
+    (count, seconds) budget.  Pushes over budget wait in a queue of up to
+    throttle_queue_size, so pushes under other budgets carry on meanwhile.
+    """
+
     def __init__(self, api_key: str,
                  proxy=None,
                  throttle_count: int = DEFAULT_THROTTLE_COUNT,
                  throttle_seconds: float = DEFAULT_THROTTLE_SECONDS,
+                 throttle_per_source: Optional[Tuple[int, float]] = None,
+                 throttle_per_sender: Optional[Tuple[int, float]] = None,
+                 throttle_per_action: Optional[Tuple[int, float]] = None,
+                 throttle_queue_size: int = DEFAULT_MAX_PENDING,
                  device: str = None,
-                 timeout: float = None):
+                 timeout: float = None,
+                 action_workers: int = DEFAULT_ACTION_WORKERS,
+                 action_queue_size: int = DEFAULT_ACTION_QUEUE_SIZE,
+                 action_overflow: str = "block"):
         self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
 
         # Passed arguments
@@ -656,9 +1564,26 @@ class ListenApp:
         self._account = None  # type: AsyncPushbullet
         self._wrapped_account = None  # type: AsyncPushbullet
         self._listener = None  # type: LiveStreamListener
-        self._throttle_timestamps = []  # type: List[float]
         self._actions = []  # type: List[Action]
-        self._sent_push_idens = []  # type: List[str]
+        self._push_throttle = Throttle(self._deliver_push, max_pending=throttle_queue_size)  # type: Throttle
+        if throttle_count and throttle_seconds:
+            self._push_throttle.add_budget("all", throttle_count, throttle_seconds)
+        if throttle_per_source:
+            self._push_throttle.add_budget("source", *throttle_per_source,
+                                           key=lambda p: p.get("source_device_iden"))
+        if throttle_per_sender:
+            self._push_throttle.add_budget("sender", *throttle_per_sender,
+                                           key=lambda p: p.get("sender_iden") or p.get("sender_email"))
+        self._action_throttle = None  # type: Throttle
+        if throttle_per_action:
+            self._action_throttle = Throttle(self._deliver_to_action, max_pending=throttle_queue_size)
+            self._action_throttle.add_budget("action", *throttle_per_action, key=lambda item: id(item[1]))
+        self._action_pool = ActionWorkerPool(self._call_on_push,
+                                             workers=action_workers,
+                                             queue_size=action_queue_size,
+                                             overflow=action_overflow)  # type: ActionWorkerPool
+        self._sent_push_idens = BoundedExpiringSet(maxlen=SENT_PUSH_MEMORY_COUNT,
+                                                   ttl=SENT_PUSH_MEMORY_SECONDS)  # type: BoundedExpiringSet
         self.persistent_connection = True
         self.persistent_connection_wait_interval = 10  # seconds between retry
 
@@ -674,7 +1599,8 @@ class ListenApp:
             async def _new(zelf, *kargs, **kwargs):
                 resp = await zelf.__orig_async_push(*kargs, **kwargs)
                 if resp and "iden" in resp:
-                    self._sent_push_idens.append(resp.get("iden"))
+                    self._sent_push_idens.add(resp.get("iden"))
+                return resp
 
             acct.__orig_async_push = acct._async_push
             acct._async_push = types.MethodType(_new, acct)
@@ -682,32 +1608,85 @@ class ListenApp:
 
         return self._wrapped_account
 
-    def add_action(self, action: Action):
+    def add_action(self, action: Action, workers: int = None):
         self._actions.append(action)
+        self._action_pool.add_action(action, workers=workers)
         self.log.info("Action added: {}".format(repr(action)))
 
+    def action_stats(self) -> Dict[str, dict]:
+        """Returns each action's worker pool stats, keyed by repr(action)."""
+        return self._action_pool.stats()
+
+    def throttle_metrics(self) -> Dict[str, dict]:
+        """Returns the throttles' metrics: how many pushes were delayed and for how long, and
+        how often reading pushes stalled because too many were waiting."""
+        metrics = {"pushes": self._push_throttle.metrics()}
+        if self._action_throttle is not None:
+            metrics["actions"] = self._action_throttle.metrics()
+        return metrics
+
     async def close(self):
+        await self._push_throttle.close()
+        if self._action_throttle is not None:
+            await self._action_throttle.close()
+        await self._action_pool.close()
+        for action in self._actions:
+            await action.close()
+        if self.log.isEnabledFor(logging.INFO):
+            for name, stats in self.action_stats().items():
+                self.log.info("Action stats {}: {}".format(name, stats))
+            for name, metrics in self.throttle_metrics().items():
+                self.log.info("Throttle metrics for {}: {}".format(name, metrics))
+
         if self._listener is not None:
             await self._listener.close()
 
         if self._account is not None:
             await self._account.async_close()
 
-    async def _throttle(self):
-        """ Makes one tick and stalls if necessary """
-
-        self._throttle_timestamps.append(time.time())  # tick!
-        if len(self._throttle_timestamps) > self.throttle_max_count:  # limit list size
-            self._throttle_timestamps.pop(0)
-
-        span = self._throttle_timestamps[-1] - self._throttle_timestamps[0]  # span between first and last
-
-        # Stall enough so that the next push won't get throttled
-        if len(self._throttle_timestamps) >= self.throttle_max_count and span < self.throttle_max_seconds:
-            future_time = self._throttle_timestamps[1] + self.throttle_max_seconds
-            stall = future_time - time.time()
-            self.log.warning("Throttling pushes that are coming too fast. Stalling {:0.1f} seconds ...".format(stall))
-            await asyncio.sleep(stall)
+    async def _deliver_push(self, push: dict):
+        if self._action_throttle is None:
+            await self._action_pool.submit(push)
+        else:
+            for action in self._actions:
+                await self._action_throttle.submit((push, action))
+
+    async def _deliver_to_action(self, push_and_action: Tuple[dict, Action]):
+        push, action = push_and_action
+        await self._action_pool.submit(push, action=action)
+
+    async def _call_on_push(self, action: Action, push: dict):
+        self.log.info("Calling action {}".format(repr(action)))
+        pb = self._account
+        # An action that times out on its own cleans up when it does; cancelling it
+        # on a timeout of the same length would cut that short
+        timeout = None if action.enforces_timeout else self.action_timeout
+        try:
+            await asyncio.wait_for(action.on_push(push, self.wrapped_account), timeout=timeout)
+            await asyncio.sleep(0)
+
+        except asyncio.TimeoutError as te:
+            err_msg = "Action {} timed out after {}+ seconds".format(action, self.action_timeout)
+            await pb.async_push_note(title="AsyncPushbullet Error", body=err_msg)
+            if not self.log.isEnabledFor(logging.DEBUG):
+                err_msg += " (turn on --debug to see traceback)"
+            self.log.warning(err_msg)
+            if self.log.isEnabledFor(logging.DEBUG):
+                traceback.print_tb(sys.exc_info()[2])
+            del err_msg
+
+        except Exception as ex:
+            err_msg = "Action {} caused exception {}".format(action, ex)
+            await pb.async_push_note(title="AsyncPushbullet Error", body=err_msg)
+            if not self.log.isEnabledFor(logging.DEBUG):
+                err_msg += " (turn on --debug to see traceback)"
+            self.log.warning(err_msg)
+            if self.log.isEnabledFor(logging.DEBUG):
+                traceback.print_tb(sys.exc_info()[2])
+            del err_msg
+
+        finally:
+            self.log.debug("Leaving action {}".format(repr(action)))
 
     async def run(self):
         exit_code = 0
@@ -732,7 +1711,8 @@ class ListenApp:
                             else:
                                 self.log.info("Device {} was not found, so we created it.".format(self.device_name))
 
-                    async with LiveStreamListener(pb, only_this_device_nickname=self.device_name) as lsl:
+                    async with LiveStreamListener(pb, only_this_device_nickname=self.device_name,
+                                                  ignore_idens=self._sent_push_idens) as lsl:
                         print("Connected.", flush=True)
                         self.log.info("Connected to Pushbullet websocket.")
                         self._listener = lsl
@@ -748,47 +1728,13 @@ class ListenApp:
                             print("Received push (title={}, body={})"
                                   .format(push.get("title"), push.get("body")))
 
-                            await self._throttle()
-
                             if push.get("iden") in self._sent_push_idens:
                                 # This is one we sent - ignore it
                                 self.log.debug(
                                     "Ignoring an incoming push that we sent. (iden={})".format(push.get('iden')))
                                 continue
 
-                            async def _call_on_push(_action: Action):
-                                self.log.info("Calling action {}".format(repr(_action)))
-                                try:
-                                    await asyncio.wait_for(_action.on_push(push, self.wrapped_account),
-                                                           timeout=self.action_timeout)
-                                    await asyncio.sleep(0)
-
-                                except asyncio.TimeoutError as te:
-                                    err_msg = "Action {} timed out after {}+ seconds".format(_action,
-                                                                                             self.action_timeout)
-                                    await pb.async_push_note(title="AsyncPushbullet Error", body=err_msg)
-                                    if not self.log.isEnabledFor(logging.DEBUG):
-                                        err_msg += " (turn on --debug to see traceback)"
-                                    self.log.warning(err_msg)
-                                    if self.log.isEnabledFor(logging.DEBUG):
-                                        traceback.print_tb(sys.exc_info()[2])
-                                    del err_msg
-
-                                except Exception as ex:
-                                    err_msg = "Action {} caused exception {}".format(_action, ex)
-                                    await pb.async_push_note(title="AsyncPushbullet Error", body=err_msg)
-                                    if not self.log.isEnabledFor(logging.DEBUG):
-                                        err_msg += " (turn on --debug to see traceback)"
-                                    self.log.warning(err_msg)
-                                    if self.log.isEnabledFor(logging.DEBUG):
-                                        traceback.print_tb(sys.exc_info()[2])
-                                    del err_msg
-
-                                finally:
-                                    self.log.debug("Leaving action {}".format(repr(_action)))
-
-                            for a in self._actions:
-                                asyncio.get_event_loop().create_task(_call_on_push(a))
+                            await self._push_throttle.submit(push)  # Waits only if the queue is full
 
 
             except InvalidKeyError as ex:
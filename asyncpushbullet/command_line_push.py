@@ -8,8 +8,11 @@ This file contains entry points for both pbpush and pbtransfer.
 usage: command_line_push.py [-h] [-k KEY] [--key-file KEY_FILE]
                             [--proxy PROXY] [-t TITLE] [-b BODY] [-d DEVICE]
                             [--list-devices] [-u URL] [-f FILE]
-                            [--transfer.sh] [-q] [--oauth2] [--debug] [-v]
-                            [--version]
+                            [--transfer.sh] [--upload-to URL]
+                            [--upload-file-url URL] [--upload-cache]
+                            [--upload-cache-ttl UPLOAD_CACHE_TTL] [--resume]
+                            [--compress {gzip,zstd}] [-q] [--oauth2]
+                            [--debug] [-v] [--version]
 
 optional arguments:
   -h, --help            show this help message and exit
@@ -26,6 +29,21 @@ optional arguments:
   -f FILE, --file FILE  Pathname to file to push
   --transfer.sh         Use www.transfer.sh website for uploading files (use
                         with --file)
+  --upload-to URL       Upload files too large for Pushbullet (all files, with
+                        pbtransfer or --transfer.sh) to this URL with HTTP
+                        PUT, instead of to transfer.sh
+  --upload-file-url URL
+                        Where files sent with --upload-to can be downloaded
+                        (default: the --upload-to URL)
+  --upload-cache        Do not upload files whose contents were recently
+                        uploaded already
+  --upload-cache-ttl UPLOAD_CACHE_TTL
+                        Hours an earlier upload may be reused (default 24)
+  --resume              Save upload progress so that an interrupted transfer
+                        can be resumed
+  --compress {gzip,zstd}
+                        Compress files on their way, unless already compressed
+                        (not with --resume)
   -q, --quiet           Suppress all output
   --oauth2              Register your command line tool using OAuth2
   --debug               Turn on debug logging
@@ -39,7 +57,10 @@ import asyncio
 import logging
 import os
 import sys
-from typing import Dict
+import time
+from typing import Dict, List, Optional
+
+from tqdm import tqdm  # pip install tqdm
 
 from asyncpushbullet import AsyncPushbullet, __version__
 from asyncpushbullet import Device
@@ -47,6 +68,11 @@ from asyncpushbullet import InvalidKeyError, PushbulletError
 from asyncpushbullet import errors
 from asyncpushbullet import oauth2
 from asyncpushbullet.command_line_listen import try_to_find_key
+from asyncpushbullet.compression import COMPRESSION_METHODS
+from asyncpushbullet.filetype import async_get_file_type
+from asyncpushbullet.upload import UploadCache, UploadState
+from asyncpushbullet.upload_router import HttpPutBackend, PushbulletBackend, TransferShBackend, UploadBackend, \
+    UploadRouter
 
 
 def main():
@@ -130,6 +156,18 @@ async def _run(args):
     # Proxy
     proxy = lambda: args.proxy or os.environ.get("https_proxy") or os.environ.get("http_proxy")
 
+    # Remember uploads?
+    upload_cache = None  # type: UploadCache
+    if getattr(args, "upload_cache", False):
+        upload_cache = UploadCache(ttl=args.upload_cache_ttl * 60 * 60)
+
+    # Where to upload files
+    router = _make_router(args)
+    compress = getattr(args, "compress", None)
+    if compress and args.resume:
+        print("--compress cannot be used with --resume.", file=sys.stderr)
+        return errors.__ERR_NOTHING_TO_DO__
+
     try:
         # List devices?
         if args.list_devices:
@@ -160,10 +198,27 @@ async def _run(args):
                                             quiet=args.quiet,
                                             title=args.title,
                                             body=args.body,
-                                            target_device=target_device)
+                                            target_device=target_device,
+                                            upload_cache=upload_cache,
+                                            resume=args.resume,
+                                            router=router,
+                                            compress=compress)
 
         elif getattr(args, "files", False):
             async with AsyncPushbullet(api_key, proxy=proxy()) as pb:
+                if getattr(args, "jobs", 1) > 1:
+                    return await _transfer_files(pb=pb,
+                                                 file_paths=args.files,
+                                                 jobs=args.jobs,
+                                                 use_transfer_sh=args.transfer_sh,
+                                                 quiet=args.quiet,
+                                                 title=args.title,
+                                                 body=args.body,
+                                                 target_device=target_device,
+                                                 upload_cache=upload_cache,
+                                                 resume=args.resume,
+                                                 router=router,
+                                                 compress=compress)
                 for file_path in args.files:  # type str
                     _ = await _transfer_file(pb=pb,
                                              file_path=file_path,
@@ -171,7 +226,11 @@ async def _run(args):
                                              quiet=args.quiet,
                                              title=args.title,
                                              body=args.body,
-                                             target_device=target_device)
+                                             target_device=target_device,
+                                             upload_cache=upload_cache,
+                                             resume=args.resume,
+                                             router=router,
+                                             compress=compress)
 
         # Push note
         elif args.title or args.body:
@@ -215,24 +274,31 @@ async def _transfer_file(pb: AsyncPushbullet,
                          quiet: bool = False,
                          title: str = None,
                          body: str = None,
-                         target_device: Device = None):
+                         target_device: Device = None,
+                         upload_cache: UploadCache = None,
+                         resume: bool = False,
+                         router: UploadRouter = None,
+                         compress: str = None):
     if not os.path.isfile(file_path):
         print("File not found:", file_path, file=sys.stderr)
         return errors.__ERR_FILE_NOT_FOUND__
 
-    show_progress = not quiet
-    if use_transfer_sh:
-        if not quiet:
-            print("Uploading file to transfer.sh ... {}".format(file_path))
+    if router is None:
+        router = UploadRouter([TransferShBackend()] if use_transfer_sh else None)
+    backend = await router.async_choose(file_path)  # Before sending anything
+    state_file = None  # type: str
+    if resume:
+        state_file = UploadState.default_state_file(file_path, backend.name)
 
-        info: Dict = await pb.async_upload_file_to_transfer_sh(file_path=file_path,
-                                                               show_progress=show_progress)
-
-    else:
-        if not quiet:
-            print("Uploading file to Pushbullet ... {}".format(file_path))
-        info: Dict = await pb.async_upload_file(file_path=file_path,
-                                                show_progress=show_progress)
+    if not quiet:
+        print("Uploading file to {} ... {}".format(backend.name, file_path))
+    info: Dict = await router.async_upload(pb, file_path,
+                                           backend=backend,
+                                           show_progress=not quiet,
+                                           upload_cache=upload_cache,
+                                           state_file=state_file,
+                                           keep_state=True,  # Until pushed
+                                           compress=compress)
 
     file_url: str = info["file_url"]
     file_type: str = info["file_type"]
@@ -247,6 +313,214 @@ async def _transfer_file(pb: AsyncPushbullet,
                              title=title,
                              body=body or file_url,
                              device=target_device)
+    if state_file is not None:
+        _remove_state_file(state_file)
+
+
+def _remove_state_file(state_file: str):
+    try:
+        os.remove(state_file)
+    except FileNotFoundError:
+        pass
+
+
+def _file_sizes(file_paths: List[str]) -> List[Optional[int]]:
+    """Returns each file's size, or None for paths that are not files.  This blocks."""
+    return [os.path.getsize(p) if os.path.isfile(p) else None for p in file_paths]
+
+
+class _FileJob:
+    """One file making its way through the pbtransfer --jobs pipeline."""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.file_name = os.path.basename(file_path)
+        self.file_type = None  # type: str
+        self.size = 0
+        self.sent = 0
+        self.upload_url = None  # type: str
+        self.state_file = None  # type: str
+        self.backend = None  # type: UploadBackend
+        self.file_url = None  # type: str
+        self.error = None  # type: Exception
+        self.start = None  # type: float
+        self.end = None  # type: float
+
+
+async def _transfer_files(pb: AsyncPushbullet,
+                          file_paths: List[str],
+                          jobs: int = 4,
+                          use_transfer_sh: bool = True,
+                          quiet: bool = False,
+                          title: str = None,
+                          body: str = None,
+                          target_device: Device = None,
+                          upload_cache: UploadCache = None,
+                          resume: bool = False,
+                          router: UploadRouter = None,
+                          compress: str = None) -> int:
+    """Transfers many files at once, pipelining the upload-request, upload and push stages.
+
+    Each stage runs at most jobs files at a time, so one file can be pushed
+    while the next uploads and a third gets its upload URL.  No more than
+    twice that many files are in progress overall.  Files found in the
+    upload_cache skip straight to the push stage.  With resume, each upload
+    saves its state, so a file whose upload was interrupted, or that was
+    uploaded but not pushed, carries on from there the next time.
+
+    The router picks where each file goes.  Files bound for Pushbullet get
+    their upload URL in a stage of their own; other backends, and compressed
+    files, upload in one step.
+    """
+    if router is None:
+        router = UploadRouter([TransferShBackend()] if use_transfer_sh else None)
+    loop = asyncio.get_event_loop()
+    file_jobs = [_FileJob(p) for p in file_paths]
+    sizes = await loop.run_in_executor(None, _file_sizes, file_paths)
+    for fj, size in zip(file_jobs, sizes):
+        if size is None:
+            fj.error = FileNotFoundError("File not found")
+            continue
+        fj.size = size
+        try:
+            fj.backend = router.choose(fj.size)  # Before sending anything
+        except PushbulletError as ex:
+            fj.error = ex
+            continue
+        if resume:
+            fj.state_file = UploadState.default_state_file(fj.file_path, fj.backend.name)
+
+    todo = [fj for fj in file_jobs if fj.error is None]
+    bar = None
+    if not quiet:
+        print(end="", flush=True)  # Flush output buffer to help tqdm
+        bar = tqdm(desc="{} files".format(len(todo)), unit="bytes", unit_scale=True,
+                   total=sum(fj.size for fj in todo))
+
+    in_flight = asyncio.Semaphore(jobs * 2)
+    request_slots = asyncio.Semaphore(jobs)
+    upload_slots = asyncio.Semaphore(jobs)
+    push_slots = asyncio.Semaphore(jobs)
+    counts = {"done": 0, "failed": 0}
+
+    async def _upload(fj: _FileJob):
+
+        def _progress(sent: int, total: int):
+            if bar is not None:
+                bar.update(sent - fj.sent)
+            fj.sent = sent
+
+        if resume or compress or not isinstance(fj.backend, PushbulletBackend):
+            async with upload_slots:
+                info = await router.async_upload(pb, fj.file_path,
+                                                 backend=fj.backend,
+                                                 progress=_progress,
+                                                 upload_cache=upload_cache if compress else None,
+                                                 state_file=fj.state_file,
+                                                 keep_state=True,  # Until pushed
+                                                 compress=compress)
+                fj.file_name = info["file_name"]
+                fj.file_type = info["file_type"]
+                fj.file_url = info["file_url"]
+
+        else:
+            async with request_slots:
+                fj.file_type = await async_get_file_type(fj.file_path)
+                upload = await pb.async_upload_request(fj.file_name, fj.file_type)
+                fj.upload_url = upload["upload_url"]
+                fj.file_url = upload["file_url"]
+                fj.file_type = upload["file_type"]
+
+            async with upload_slots:
+                start = time.monotonic()
+                await pb.async_upload_to_url(fj.upload_url, fj.file_path,
+                                             file_name=fj.file_name,
+                                             file_type=fj.file_type,
+                                             progress=_progress)
+                router.record(fj.backend, fj.size, time.monotonic() - start)
+
+        if upload_cache is not None and not compress:  # The router caches compressed uploads
+            await upload_cache.async_put(fj.file_path, {"file_type": fj.file_type, "file_url": fj.file_url},
+                                         backend=fj.backend.name)
+
+    async def _transfer(fj: _FileJob):
+        async with in_flight:
+            fj.start = time.time()
+            try:
+                cached = None
+                if upload_cache is not None and not compress:
+                    cached = await upload_cache.async_get(fj.file_path, backend=fj.backend.name)
+                if cached is None:
+                    await _upload(fj)
+                else:
+                    fj.file_type = cached["file_type"]
+                    fj.file_url = cached["file_url"]
+                    if bar is not None:
+                        bar.update(fj.size)
+
+                async with push_slots:
+                    await pb.async_push_file(file_name=fj.file_name,
+                                             file_type=fj.file_type,
+                                             file_url=fj.file_url,
+                                             title=title or "File: {}".format(fj.file_name),
+                                             body=body or fj.file_url,
+                                             device=target_device)
+                if fj.state_file is not None:
+                    await loop.run_in_executor(None, _remove_state_file, fj.state_file)
+                counts["done"] += 1
+
+            except Exception as ex:
+                fj.error = ex
+                counts["failed"] += 1
+
+            finally:
+                fj.end = time.time()
+                if bar is not None:
+                    bar.set_postfix(counts)
+
+    start = time.time()
+    await asyncio.gather(*[_transfer(fj) for fj in todo])
+    elapsed = time.time() - start
+    if bar is not None:
+        bar.close()
+
+    if not quiet:
+        _print_transfer_summary(file_jobs, elapsed)
+
+    for fj in file_jobs:
+        if isinstance(fj.error, InvalidKeyError):
+            raise fj.error
+    if any(isinstance(fj.error, FileNotFoundError) for fj in file_jobs):
+        return errors.__ERR_FILE_NOT_FOUND__
+    if any(fj.error is not None for fj in file_jobs):
+        return errors.__ERR_UNKNOWN__
+    return errors.__EXIT_NO_ERROR__
+
+
+def _make_router(args) -> UploadRouter:
+    """Pushbullet storage first unless --transfer.sh, then transfer.sh or the --upload-to server."""
+    backends = []  # type: List[UploadBackend]
+    if not args.transfer_sh:
+        backends.append(PushbulletBackend())
+    if getattr(args, "upload_to", None):
+        backends.append(HttpPutBackend(args.upload_to, file_url=args.upload_file_url))
+    else:
+        backends.append(TransferShBackend())
+    return UploadRouter(backends)
+
+
+def _print_transfer_summary(file_jobs: List[_FileJob], elapsed: float):
+    print("{:<40} {:>10} {:>8}  {}".format("File", "Size", "Seconds", "Result"))
+    for fj in file_jobs:
+        secs = "" if fj.start is None else "{:0.1f}".format(fj.end - fj.start)
+        result = fj.file_url if fj.error is None else "FAILED: {}".format(fj.error)
+        print("{:<40} {:>10} {:>8}  {}".format(fj.file_name[:40], tqdm.format_sizeof(fj.size, "B"), secs, result))
+
+    ok = [fj for fj in file_jobs if fj.error is None]
+    total_bytes = sum(fj.size for fj in ok)
+    print("Pushed {} of {} files, {} in {:0.1f} seconds ({}/s)".format(
+        len(ok), len(file_jobs), tqdm.format_sizeof(total_bytes, "B"), elapsed,
+        tqdm.format_sizeof(total_bytes / elapsed if elapsed else 0, "B")))
 
 
 def parse_args_pbpush():
@@ -262,6 +536,19 @@ def parse_args_pbpush():
     parser.add_argument("-f", "--file", help="Pathname to file to push")
     parser.add_argument("--transfer.sh", dest="transfer_sh", action="store_true",
                         help="Use www.transfer.sh website for uploading files (use with --file)")
+    parser.add_argument("--upload-to", metavar="URL",
+                        help="Upload files too large for Pushbullet (all files, with pbtransfer or --transfer.sh) "
+                             "to this URL with HTTP PUT, instead of to transfer.sh")
+    parser.add_argument("--upload-file-url", metavar="URL",
+                        help="Where files sent with --upload-to can be downloaded (default: the --upload-to URL)")
+    parser.add_argument("--upload-cache", action="store_true",
+                        help="Do not upload files whose contents were recently uploaded already")
+    parser.add_argument("--upload-cache-ttl", type=float, default=24,
+                        help="Hours an earlier upload may be reused (default 24)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Save upload progress so that an interrupted transfer can be resumed")
+    parser.add_argument("--compress", choices=COMPRESSION_METHODS,
+                        help="Compress files on their way, unless already compressed (not with --resume)")
     parser.add_argument("-q", "--quiet", action="store_true", help="Suppress all output")
     parser.add_argument("--oauth2", action="store_true", help="Register your command line tool using OAuth2")
     parser.add_argument("--debug", action="store_true", help="Turn on debug logging")
@@ -286,6 +573,21 @@ def parse_args_pbtransfer():
     parser.add_argument("--list-devices", action="store_true", help="List registered device names")
     parser.add_argument("-f", "--file", help="Pathname to file to push")
     parser.add_argument('files', nargs='*', help="Remaining arguments will be files to push")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of files to transfer at once (default 1)")
+    parser.add_argument("--upload-to", metavar="URL",
+                        help="Upload files too large for Pushbullet (all files, with pbtransfer or --transfer.sh) "
+                             "to this URL with HTTP PUT, instead of to transfer.sh")
+    parser.add_argument("--upload-file-url", metavar="URL",
+                        help="Where files sent with --upload-to can be downloaded (default: the --upload-to URL)")
+    parser.add_argument("--upload-cache", action="store_true",
+                        help="Do not upload files whose contents were recently uploaded already")
+    parser.add_argument("--upload-cache-ttl", type=float, default=24,
+                        help="Hours an earlier upload may be reused (default 24)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Save upload progress so that an interrupted transfer can be resumed")
+    parser.add_argument("--compress", choices=COMPRESSION_METHODS,
+                        help="Compress files on their way, unless already compressed (not with --resume)")
     parser.add_argument("-q", "--quiet", action="store_true", help="Suppress all output")
     parser.add_argument("--oauth2", action="store_true", help="Register your command line tool using OAuth2")
     parser.add_argument("--debug", action="store_true", help="Turn on debug logging")
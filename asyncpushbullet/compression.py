@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Compresses files on their way to an upload, without blocking the event loop.
+
+Text logs and JSON dumps shrink several times over when compressed, and the
+upload shrinks with them.  The file is read and compressed in an executor, a
+chunk at a time, and the compressed chunks are streamed into the request, so
+no compressed copy is ever written to disk.  Because the compressed size is
+not known in advance, the request body is sent with chunked transfer encoding.
+
+Pushbullet's upload URLs want a Content-Length, so for them the file is
+instead compressed into a spooled temporary file first (held in memory if
+small, on disk otherwise), and that is uploaded once its size is known.
+
+Files whose types are already compressed (images, audio, video, archives and
+so on) are not worth compressing again; should_compress tells them apart.
+
+gzip is always available.  zstd needs the zstandard package (pip install zstandard).
+
+Most callers just pass compress="gzip" to AsyncPushbullet.async_upload_file.  To
+compress by hand:
+
+    file_name, file_type, method = await async_compression_plan(file_path, None, "gzip")
+    data = async_compressed_chunks(file_path, method) if method else open(file_path, "rb")
+    await pb.async_upload_data(data, file_name, file_type)
+
+"""
+import asyncio
+import os
+import tempfile
+import zlib
+from concurrent.futures import Executor
+from typing import AsyncIterator, BinaryIO, Callable, Optional, Tuple
+
+try:
+    import zstandard  # pip install zstandard
+except ImportError:
+    zstandard = None
+
+from .filetype import async_get_file_type
+from .upload import DEFAULT_CHUNK_SIZE
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+COMPRESSION_METHODS = ("gzip", "zstd")
+DEFAULT_SPOOL_MEMORY = 8 * 1024 * 1024  # bytes of compressed data kept in memory before spilling to disk
+_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+_FILE_TYPES = {"gzip": "application/gzip", "zstd": "application/zstd"}
+
+# Types that compress poorly because they are compressed already
+_COMPRESSED_PREFIXES = ("image/", "audio/", "video/", "font/woff")
+_COMPRESSED_TYPES = {
+    "application/gzip", "application/x-gzip", "application/zstd", "application/zip",
+    "application/x-bzip2", "application/x-xz", "application/x-lzma", "application/x-7z-compressed",
+    "application/x-rar-compressed", "application/vnd.rar", "application/x-compress",
+    "application/java-archive", "application/epub+zip", "application/pdf",
+    "application/vnd.android.package-archive", "application/x-apple-diskimage",
+}
+_UNCOMPRESSED_EXCEPTIONS = {"image/svg+xml", "image/bmp", "image/x-ms-bmp", "image/tiff", "audio/wav",
+                            "audio/x-wav"}
+
+
+def should_compress(file_type: str) -> bool:
+    """Whether a file of this mime type is likely to get meaningfully smaller when compressed."""
+    file_type = (file_type or "").split(";")[0].strip().lower()
+    if file_type in _UNCOMPRESSED_EXCEPTIONS:
+        return True
+    if file_type in _COMPRESSED_TYPES or file_type.startswith(_COMPRESSED_PREFIXES):
+        return False
+    if file_type.startswith("application/vnd.openxmlformats") or file_type.startswith("application/vnd.oasis"):
+        return False  # Office documents are zip files
+    return True
+
+
+def compressed_name_and_type(file_name: str, file_type: str, method: str) -> Tuple[str, str]:
+    """Returns the file name and mime type of the file once compressed with method."""
+    _check_method(method)
+    return file_name + _EXTENSIONS[method], _FILE_TYPES[method]
+
+
+async def async_compression_plan(file_path: str, file_type: str = None,
+                                 method: str = None) -> Tuple[str, str, Optional[str]]:
+    """Returns the file name and mime type to upload a file as, and the compression
+    method to use: method itself, or None if method is None or the file's type is
+    already compressed.
+
+    :param file_path: the file to be uploaded
+    :param file_type: the file's mime type, if known (otherwise it is detected when needed)
+    :param method: "gzip", "zstd" or None
+    """
+    file_name = os.path.basename(file_path)
+    if not method:
+        return file_name, file_type, None
+    _check_method(method)
+    file_type = file_type or await async_get_file_type(file_path)
+    if not should_compress(file_type):
+        return file_name, file_type, None
+    file_name, file_type = compressed_name_and_type(file_name, file_type, method)
+    return file_name, file_type, method
+
+
+def _check_method(method: str):
+    if method not in COMPRESSION_METHODS:
+        raise ValueError("Unknown compression {}: choose from {}".format(method, ", ".join(COMPRESSION_METHODS)))
+    if method == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package (pip install zstandard)")
+
+
+def _compressor(method: str, level: int = None):
+    # Each has compress(bytes) -> bytes and flush() -> bytes
+    if method == "gzip":
+        return zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+
+
+async def async_compressed_chunks(file_path: str, method: str = "gzip",
+                                  level: int = None,
+                                  chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                  executor: Executor = None,
+                                  progress: Callable[[int, int], None] = None) -> AsyncIterator[bytes]:
+    """Yields a file's contents compressed with method ("gzip" or "zstd").
+
+    Each chunk is read and compressed in an executor.  If given, progress is
+    called with the bytes of the original file read so far and its size.
+
+    :param file_path: the file to compress
+    :param method: "gzip" or "zstd"
+    :param level: compression level (default: 6 for gzip, 3 for zstd)
+    :param chunk_size: bytes of the original file read at a time
+    :param executor: where to read and compress (default: the loop's executor)
+    :param progress: optional callback taking (bytes_read, total_bytes)
+    """
+    _check_method(method)
+    loop = asyncio.get_event_loop()
+    compressor = _compressor(method, level)
+    total = await loop.run_in_executor(executor, os.path.getsize, file_path)
+    f = await loop.run_in_executor(executor, open, file_path, "rb")
+    try:
+        done = 0
+        while True:
+            raw, compressed = await loop.run_in_executor(executor, _read_and_compress, f, compressor, chunk_size)
+            if not raw:
+                break
+            done += raw
+            if progress is not None:
+                progress(done, total)
+            if compressed:
+                yield compressed
+        tail = await loop.run_in_executor(executor, compressor.flush)
+        if tail:
+            yield tail
+    finally:
+        await loop.run_in_executor(executor, f.close)
+
+
+def _read_and_compress(f, compressor, chunk_size: int) -> Tuple[int, bytes]:
+    chunk = f.read(chunk_size)
+    return len(chunk), compressor.compress(chunk) if chunk else b""
+
+
+async def async_compressed_spool(file_path: str, method: str = "gzip",
+                                 level: int = None,
+                                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                 executor: Executor = None,
+                                 max_memory: int = DEFAULT_SPOOL_MEMORY) -> Tuple[BinaryIO, int]:
+    """Compresses a file into a temporary file, for uploads that need the compressed size up front.
+
+    The file is compressed in an executor into a tempfile.SpooledTemporaryFile,
+    which stays in memory up to max_memory bytes and moves to disk beyond that.
+    Returns the temporary file, rewound, and its size.  The caller closes it.
+
+    :param file_path: the file to compress
+    :param method: "gzip" or "zstd"
+    :param level: compression level (default: 6 for gzip, 3 for zstd)
+    :param chunk_size: bytes of the original file read at a time
+    :param executor: where to read and compress (default: the loop's executor)
+    :param max_memory: compressed bytes to hold in memory before spilling to disk
+    """
+    _check_method(method)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, _compress_to_spool, file_path, method, level, chunk_size, max_memory)
+
+
+def _compress_to_spool(file_path: str, method: str, level: int, chunk_size: int,
+                       max_memory: int) -> Tuple[BinaryIO, int]:
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    try:
+        compressor = _compressor(method, level)
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                spool.write(compressor.compress(chunk))
+        spool.write(compressor.flush())
+        size = spool.tell()
+        spool.seek(0)
+        return spool, size
+    except BaseException:
+        spool.close()
+        raise
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for downloading the files in file pushes without blocking the event loop.
+
+Every download on an event loop, from any AsyncPushbullet, takes one of
+MAX_CONCURRENT_DOWNLOADS slots, so a burst of file pushes cannot open an
+unbounded number of connections.  Change the limit before the first
+download starts on a loop.
+
+Example:
+
+    async for push in listener:
+        if push.get("type") == "file":
+            path = await pb.async_download_file(push, "downloads")
+
+"""
+import asyncio
+import os
+import weakref
+from typing import Dict, Tuple, Union
+from urllib.parse import unquote, urlparse
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+MAX_CONCURRENT_DOWNLOADS = 4
+
+_download_slots = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+
+def download_slots() -> asyncio.Semaphore:
+    """Returns the semaphore shared by all downloads on the current event loop."""
+    loop = asyncio.get_event_loop()
+    slots = _download_slots.get(loop)
+    if slots is None:
+        slots = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        _download_slots[loop] = slots
+    return slots
+
+
+def file_url_and_name(push_or_url: Union[Dict, str]) -> Tuple[str, str]:
+    """Returns the file_url and file_name of a file push, or a URL and the
+    name at the end of its path."""
+    if isinstance(push_or_url, dict):
+        file_url = push_or_url.get("file_url")
+        if not file_url:
+            raise ValueError("Push has no file_url: {}".format(push_or_url.get("iden")))
+        file_name = push_or_url.get("file_name")
+    else:
+        file_url = push_or_url
+        file_name = None
+    file_name = file_name or unquote(os.path.basename(urlparse(file_url).path)) or "download"
+    return file_url, os.path.basename(file_name)  # Never let a name step outside the destination folder
+
+
+def destination_path(dest: str, file_name: str) -> str:
+    """Returns dest itself, or file_name within dest if dest is a folder (or None, the current folder)."""
+    if dest is None:
+        return file_name
+    if os.path.isdir(dest):
+        return os.path.join(dest, file_name)
+    return dest
@@ -10,6 +10,7 @@ from typing import TypeVar, Generic, AsyncIterator
 
 sys.path.append("..")  # Since examples are buried one level into source tree
 from asyncpushbullet import AsyncPushbullet, LiveStreamListener
+from asyncpushbullet.async_listeners import StreamHub
 
 __author__ = "Robert Harder"
 __email__ = "rob@iharder.net"
@@ -19,9 +20,15 @@ T = TypeVar('T')
 
 class EphemeralComm(Generic[T]):
 
-    def __init__(self, pb: AsyncPushbullet, t: namedtuple):
+    def __init__(self, pb: AsyncPushbullet, t: namedtuple, hub: StreamHub = None):
+        """
+        :param pb: the account on which to send and receive ephemerals
+        :param t: the namedtuple type of message being exchanged
+        :param hub: optional StreamHub, such as pb.stream_hub, to share a websocket with other listeners
+        """
         self.pb: AsyncPushbullet = pb
         self.t: namedtuple = t
+        self.hub: StreamHub = hub
         self.lsl: LiveStreamListener = None
         self.queue: asyncio.Queue = None
         self.ephemeral_type: str = f"ephemeral:{self.t.__name__}"
@@ -40,12 +47,13 @@ class EphemeralComm(Generic[T]):
 
         async def _listen():
             try:
-                async with LiveStreamListener(self.pb, types=self.ephemeral_type) as lsl:
+                async with LiveStreamListener(self.pb, types=self.ephemeral_type, hub=self.hub) as lsl:
                     self.lsl = lsl
                     ready.set()
                     async for msg in lsl:
-                        del msg["push"]["type"]
-                        kmsg = self.t(**msg["push"])
+                        # Messages may be shared with other hub subscribers, so don't alter them
+                        fields = {k: v for k, v in msg["push"].items() if k != "type"}
+                        kmsg = self.t(**fields)
                         await self.queue.put(kmsg)
             except Exception as ex:
                 print("ERROR:", ex, file=sys.stderr, flush=True)
@@ -1,4 +1,17 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import mimetypes
+import os
+from collections import OrderedDict
+from concurrent.futures import Executor
+
+DEFAULT_FILE_TYPE = "application/octet-stream"
+
+
+def get_file_type_from_name(file_name):
+    """Guesses a mime type from a file name's extension alone, for data that is not in a file."""
+    return mimetypes.guess_type(file_name)[0] or DEFAULT_FILE_TYPE
+
 
 def _magic_get_file_type(filename):
     with open(filename, "rb") as f:
@@ -22,8 +35,64 @@ def maybe_decode(s):
 try:
     import magic
 except Exception:
-    import mimetypes
-
     get_file_type = _guess_file_type
 else:
     get_file_type = _magic_get_file_type
+
+
+class FileTypeDetector:
+    """Works out the mime types of files without blocking the event loop, remembering the answers.
+
+    Detection (libmagic if python-magic is installed, otherwise the file's
+    extension) runs in an executor.  Results are kept in a bounded LRU
+    keyed by path, size and modification time, so asking again about an
+    unchanged file costs one os.stat (also in the executor).  In fast mode
+    only the extension is consulted, with no file access at all.
+    """
+
+    def __init__(self, max_entries: int = 1024, fast: bool = False, executor: Executor = None):
+        """
+        :param max_entries: bound on remembered files, least recently used forgotten first
+        :param fast: go by file extension only
+        :param executor: where to run file access and libmagic (default: the loop's executor)
+        """
+        self.max_entries = max_entries
+        self.fast = fast
+        self.executor = executor
+        self._types = OrderedDict()  # (path, size, mtime) -> file type, least recently used first
+
+    async def async_get_file_type(self, file_path: str, fast: bool = None) -> str:
+        """Returns the mime type of a file.
+
+        :param file_path: the file
+        :param fast: go by file extension only (default: as given to the constructor)
+        """
+        if self.fast if fast is None else fast:
+            return get_file_type_from_name(file_path)
+        loop = asyncio.get_event_loop()
+        key = await loop.run_in_executor(self.executor, _file_key, file_path)
+        file_type = self._types.get(key)
+        if file_type is None:
+            file_type = await loop.run_in_executor(self.executor, get_file_type, file_path) or DEFAULT_FILE_TYPE
+            self._types[key] = file_type
+            while len(self._types) > self.max_entries:
+                self._types.popitem(last=False)
+        else:
+            self._types.move_to_end(key)
+        return file_type
+
+    def clear(self):
+        self._types.clear()
+
+
+def _file_key(file_path):
+    st = os.stat(file_path)
+    return os.path.abspath(file_path), st.st_size, st.st_mtime
+
+
+_detector = FileTypeDetector()
+
+
+async def async_get_file_type(file_path: str, fast: bool = False) -> str:
+    """Returns the mime type of a file using a FileTypeDetector shared by the whole process."""
+    return await _detector.async_get_file_type(file_path, fast=fast)
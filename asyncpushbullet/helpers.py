@@ -2,7 +2,11 @@
 
 from __future__ import unicode_literals
 
+import asyncio
 import sys
+import threading
+import time
+from collections import OrderedDict
 from functools import update_wrapper
 
 import aiohttp
@@ -52,3 +56,112 @@ class reify():
         return val
 
 
+class BoundedExpiringSet():
+    """
+    A set with O(1) membership checks that forgets items after ttl seconds
+    and holds no more than maxlen items, evicting the oldest first.
+
+    Handy for remembering the idens of pushes we sent so that their echoes
+    on the live stream can be ignored.
+    """
+
+    def __init__(self, maxlen: int = 1000, ttl: float = 3600, timer=time.monotonic):
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self._timer = timer
+        self._items = OrderedDict()  # item -> expiration time, oldest first
+
+    def add(self, item):
+        now = self._timer()
+        self._items[item] = now + self.ttl
+        self._items.move_to_end(item)
+        self._expire(now)
+        while len(self._items) > self.maxlen:
+            self._items.popitem(last=False)
+
+    def discard(self, item):
+        self._items.pop(item, None)
+
+    def _expire(self, now):
+        # Items are kept in order of insertion, which is also order of expiration
+        while self._items:
+            oldest, expires = next(iter(self._items.items()))
+            if expires > now:
+                break
+            del self._items[oldest]
+
+    def __contains__(self, item):
+        expires = self._items.get(item)
+        if expires is None:
+            return False
+        if expires <= self._timer():
+            del self._items[item]
+            return False
+        return True
+
+    def __len__(self):
+        self._expire(self._timer())
+        return len(self._items)
+
+    def __repr__(self):
+        return "{}(maxlen={}, ttl={}, size={})".format(self.__class__.__name__, self.maxlen, self.ttl,
+                                                       len(self._items))
+
+
+class BackgroundEventLoop():
+    """
+    An asyncio event loop running forever on its own daemon thread, so that
+    synchronous code can hand it coroutines.
+
+    Most code should use BackgroundEventLoop.shared(), a single loop for the
+    whole process, so that many sync objects cost one thread between them.
+    """
+    _shared = None  # type: BackgroundEventLoop
+    _shared_lock = threading.Lock()
+
+    def __init__(self, name: str = "Thread-asyncio"):
+        self.loop = asyncio.new_event_loop()  # type: asyncio.AbstractEventLoop
+        _ready = threading.Event()  # Don't leave this function until thread is ready
+
+        def _thread_run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(_ready.set)
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=_thread_run, name=name, daemon=True)
+        self.thread.start()
+        _ready.wait()
+
+    @classmethod
+    def shared(cls):
+        """Returns the process-wide background loop, starting it if necessary.
+
+        :rtype: BackgroundEventLoop
+        """
+        with cls._shared_lock:
+            if cls._shared is None or not cls._shared.running:
+                cls._shared = cls(name="Thread-asyncpushbullet")
+            return cls._shared
+
+    @property
+    def running(self) -> bool:
+        return self.thread.is_alive() and self.loop.is_running()
+
+    def submit(self, coro):
+        """Schedules a coroutine on the loop and returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float = None):
+        """Runs a coroutine on the loop and blocks until its result is available.
+
+        Must not be called from the loop's own thread.
+        """
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("BackgroundEventLoop.run() called from its own thread would deadlock")
+        return self.submit(coro).result(timeout)
+
+    def stop(self, timeout: float = None):
+        """Stops the loop and waits for its thread to exit."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout)
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 """Used with non-asyncio Pushbullet class.
 If you are not using the asyncio capabilities of this package,
-it is recommended that you stick with Igor's own package."""
+it is recommended that you stick with Igor's own package.
+
+See also SyncLiveStreamListener in sync_listener.py, which needs no extra
+websocket library, reconnects on its own, and delivers only real pushes."""
 
 __author__ = 'Igor Maculan <n3wtron@gmail.com>'
 
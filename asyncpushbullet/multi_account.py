@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Supervises live streams for many pushbullet accounts at once and merges
+their pushes into a single tagged async stream.
+
+Example:
+
+    accounts = {"alice": "o.abc...", "bob": "o.def..."}
+    async with MultiAccountStreamManager(accounts) as mgr:
+        async for tag, push in mgr:
+            print(tag, push.get("title"))
+
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from typing import Dict, Iterable, Union, Callable, Tuple, AsyncIterator, List
+
+import aiohttp  # pip install aiohttp
+
+from .async_listeners import LiveStreamListener
+from .async_pushbullet import AsyncPushbullet
+from .errors import InvalidKeyError
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+
+class _Backoff:
+    """One account's reconnect delay, which doubles with each failure (up to a
+    maximum) and resets when the account connects again.
+
+    Each account keeps its own, so one healthy account does not reset the
+    delay of others that are still failing.  When the network drops, every
+    account backs off on the same schedule, and the jitter spreads out their
+    reconnects.
+    """
+
+    def __init__(self, initial: float, maximum: float):
+        self.initial = initial
+        self.maximum = maximum
+        self.delay = initial
+
+    def failure(self) -> float:
+        """Records a failure and returns how long the caller should wait (with jitter)."""
+        delay = self.delay
+        self.delay = min(self.delay * 2, self.maximum)
+        return delay * random.uniform(0.5, 1.0)
+
+    def success(self):
+        self.delay = self.initial
+
+
+class MultiAccountStreamManager:
+    """Runs one live stream per account over a single shared connection pool.
+
+    Connections are made in a staggered fashion with a cap on how many may
+    be in progress at once, and dropped streams reconnect with a backoff that
+    grows while that account keeps failing.  Accounts skip the startup round trip that
+    AsyncPushbullet normally uses to verify the key; a bad key is reported
+    when its websocket is refused.  Nor do they retrieve pushes each time they
+    connect; anything that arrived while disconnected comes with the next push
+    tickle.  examples/benchmark_multi_account.py measures the cost per account.
+
+    Events arrive as (tag, push) tuples, where tag is the key of the
+    accounts dictionary (or the index, if a plain list of API keys is given).
+    """
+
+    def __init__(self,
+                 accounts: Union[Dict[str, str], Iterable[str]],
+                 types: Iterable[str] = None,
+                 push_filter: Callable = None,
+                 proxy: str = None,
+                 verify_ssl: bool = None,
+                 stagger: float = 0.05,
+                 max_concurrent_connects: int = 10,
+                 backoff_initial: float = 1.0,
+                 backoff_max: float = 300.0,
+                 max_queue_size: int = 1000,
+                 connection_limit: int = 100):
+        """
+        :param accounts: dict of tag -> API key, or a list of API keys
+        :param types: the types of pushes to receive (see LiveStreamListener)
+        :param push_filter: filter applied before anything is queued (see LiveStreamListener)
+        :param proxy: optional web proxy
+        :param verify_ssl: set to False to disable SSL/TLS verification
+        :param stagger: seconds between each account's first connection attempt
+        :param max_concurrent_connects: cap on connection attempts in progress at once
+        :param backoff_initial: first reconnect delay in seconds
+        :param backoff_max: longest reconnect delay in seconds
+        :param max_queue_size: bound on merged events waiting to be consumed
+        :param connection_limit: bound on HTTP connections in the shared pool, beyond the
+            one that each account's websocket holds for as long as it is open
+        """
+        self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        if not isinstance(accounts, dict):
+            accounts = {str(i): key for i, key in enumerate(accounts)}
+        self._api_keys: Dict[str, str] = dict(accounts)
+        self.types = types
+        self.push_filter = push_filter
+        self.proxy = proxy
+        self.verify_ssl = verify_ssl
+        self.stagger = stagger
+        self.max_concurrent_connects = max_concurrent_connects
+        self.max_queue_size = max_queue_size
+        self.connection_limit = connection_limit
+
+        self.accounts: Dict[str, AsyncPushbullet] = {}
+        self._backoffs: Dict[str, _Backoff] = {tag: _Backoff(backoff_initial, backoff_max)
+                                               for tag in self._api_keys}
+        self._connector: aiohttp.TCPConnector = None
+        self._connect_semaphore: asyncio.Semaphore = None
+        self._queue: asyncio.Queue = None
+        self._tasks: List[asyncio.Task] = []
+        self._closing: bool = False
+        self._stats: Dict[str, Dict] = {tag: {"state": "idle", "events": 0, "connects": 0,
+                                              "failures": 0, "last_event": None}
+                                        for tag in self._api_keys}
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def start(self):
+        """Creates the shared connector and launches one supervisor task per account."""
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._connect_semaphore = asyncio.Semaphore(self.max_concurrent_connects)
+        ssl = False if self.verify_ssl is False else None
+        # Each websocket keeps its connection for good, so leave room for all of them
+        self._connector = aiohttp.TCPConnector(limit=len(self._api_keys) + self.connection_limit, ssl=ssl)
+
+        loop = asyncio.get_event_loop()
+        for index, (tag, api_key) in enumerate(self._api_keys.items()):
+            pb = AsyncPushbullet(api_key, verify_ssl=self.verify_ssl, proxy=self.proxy,
+                                 connector=self._connector, verify_on_connect=False)
+            self.accounts[tag] = pb
+            self._tasks.append(loop.create_task(self._supervise(index, tag, pb)))
+
+    async def close(self):
+        self._closing = True
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for pb in self.accounts.values():
+            await pb.async_close()
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+        if self._queue is not None:
+            if self._queue.full():
+                self._queue.get_nowait()  # Make room for the sentinel
+            self._queue.put_nowait(StopAsyncIteration("MultiAccountStreamManager closed"))
+
+    async def _supervise(self, index: int, tag: str, pb: AsyncPushbullet):
+        stats = self._stats[tag]
+        backoff = self._backoffs[tag]
+        await asyncio.sleep(index * self.stagger)
+        while not self._closing:
+            try:
+                async with self._connect_semaphore:
+                    stats["state"] = "connecting"
+                    lsl = LiveStreamListener(pb, types=self.types, push_filter=self.push_filter,
+                                             direct_dispatch=True, fetch_on_connect=pb.verify_on_connect)
+                    await lsl.__aenter__()
+                stats["state"] = "connected"
+                stats["connects"] += 1
+                backoff.success()
+                try:
+                    async for push in lsl:
+                        stats["events"] += 1
+                        stats["last_event"] = time.time()
+                        await self._queue.put((tag, push))
+                finally:
+                    await lsl.__aexit__(*sys.exc_info())
+
+            except asyncio.CancelledError:
+                stats["state"] = "closed"
+                raise
+
+            except (InvalidKeyError, aiohttp.WSServerHandshakeError) as ex:
+                if isinstance(ex, InvalidKeyError) or ex.status == 401:
+                    stats["state"] = "invalid key"
+                    self.log.error("Account {} has an invalid key; not reconnecting".format(tag))
+                    return
+                stats["failures"] += 1
+                self.log.warning("Account {} stream failed: {}".format(tag, ex))
+
+            except Exception as ex:
+                stats["failures"] += 1
+                self.log.warning("Account {} stream failed: {}".format(tag, ex))
+
+            stats["state"] = "waiting"
+            delay = backoff.failure()
+            self.log.debug("Account {} reconnecting in {:0.1f} seconds".format(tag, delay))
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        """Returns per-account counters along with totals useful for judging overhead.
+
+        open_fds is only available on platforms that expose /proc/self/fd.
+        """
+        connected = sum(1 for s in self._stats.values() if s["state"] == "connected")
+        open_fds = None
+        if os.path.isdir("/proc/self/fd"):
+            open_fds = len(os.listdir("/proc/self/fd"))
+        return {"accounts": len(self._api_keys),
+                "connected": connected,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "open_fds": open_fds,
+                "open_fds_per_connected_account": open_fds / connected if open_fds and connected else None,
+                "per_account": {tag: dict(s, backoff_delay=self._backoffs[tag].delay)
+                                for tag, s in self._stats.items()}}
+
+    async def next(self, timeout: float = None) -> Tuple[str, Dict]:
+        """Returns the next (tag, push) from any account."""
+        item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        if isinstance(item, StopAsyncIteration):
+            self._queue.put_nowait(item)  # Leave it for any other consumers
+            raise item
+        return item
+
+    def __aiter__(self) -> AsyncIterator[Tuple[str, Dict]]:
+        return self
+
+    async def __anext__(self) -> Tuple[str, Dict]:
+        return await self.next()
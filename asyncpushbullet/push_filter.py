@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Declarative filters for pushes, compiled once into a single predicate.
+
+Example:
+
+    f = PushFilter(types="note", source_device="Phone", title=r"^Alarm")
+    async with LiveStreamListener(pb, push_filter=f) as lsl:
+        ...
+
+"""
+import re
+from typing import Callable, Iterable, Union, Dict, List
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+_PATTERN_TYPE = type(re.compile(""))  # re.Pattern is not available in Python 3.6
+
+
+class PushFilter:
+    """Matches pushes against a small declarative spec.
+
+    Every criterion is optional and may be a single value or an iterable of
+    values, any one of which may match.  A push must satisfy all criteria
+    that were given.  Devices may be given by iden or by nickname.  The title
+    and body criteria are regular expressions (strings or compiled patterns)
+    searched anywhere in the text.
+    """
+    SPEC_KEYS = ("types", "source_device", "target_device", "sender_email",
+                 "channel_tag", "title", "body")
+
+    def __init__(self,
+                 types: Union[str, Iterable[str]] = None,
+                 source_device: Union[str, Iterable[str]] = None,
+                 target_device: Union[str, Iterable[str]] = None,
+                 sender_email: Union[str, Iterable[str]] = None,
+                 channel_tag: Union[str, Iterable[str]] = None,
+                 title=None,
+                 body=None):
+        """
+        :param types: push types to allow, eg note, link, file
+        :param source_device: iden or nickname of the device that sent the push
+        :param target_device: iden or nickname of the device the push was sent to
+        :param sender_email: email address of the sender
+        :param channel_tag: tag (or iden) of the channel the push came through
+        :param title: regular expression(s) to search for in the title
+        :param body: regular expression(s) to search for in the body
+        """
+        self.types = PushFilter._as_set(types)
+        self.source_device = PushFilter._as_set(source_device)
+        self.target_device = PushFilter._as_set(target_device)
+        self.sender_email = PushFilter._as_set(sender_email, normalize=str.lower)
+        self.channel_tag = PushFilter._as_set(channel_tag)
+        self.title = PushFilter._as_patterns(title)
+        self.body = PushFilter._as_patterns(body)
+        self._predicate: Callable[[Dict], bool] = self._compile()
+
+    @classmethod
+    def from_dict(cls, spec: Dict) -> "PushFilter":
+        """Creates a filter from a dictionary such as one loaded from json."""
+        unknown = set(spec.keys()) - set(cls.SPEC_KEYS)
+        if unknown:
+            raise ValueError("Unknown push filter key(s): {}".format(", ".join(sorted(unknown))))
+        return cls(**spec)
+
+    def __call__(self, push: Dict) -> bool:
+        return self._predicate(push)
+
+    def __repr__(self):
+        crit = {k: getattr(self, k) for k in self.SPEC_KEYS if getattr(self, k) is not None}
+        return "{}({})".format(self.__class__.__name__, crit)
+
+    @staticmethod
+    def _as_set(val, normalize: Callable = None):
+        if val is None:
+            return None
+        if isinstance(val, str):
+            val = (val,)
+        return frozenset(normalize(x) if normalize else x for x in val)
+
+    @staticmethod
+    def _as_patterns(val):
+        if val is None:
+            return None
+        if isinstance(val, (str, _PATTERN_TYPE)):
+            val = (val,)
+        return tuple(x if isinstance(x, _PATTERN_TYPE) else re.compile(x) for x in val)
+
+    def _compile(self) -> Callable[[Dict], bool]:
+        """Builds one closure per criterion and chains them into a single predicate."""
+        checks: List[Callable[[Dict], bool]] = []
+
+        if self.types is not None:
+            types = self.types
+            checks.append(lambda p: p.get("type") in types)
+
+        for field, wanted in (("source_device_iden", self.source_device),
+                              ("target_device_iden", self.target_device)):
+            if wanted is not None:
+                nick_field = "{}:nickname".format(field)
+                checks.append(lambda p, f=field, n=nick_field, w=wanted: p.get(f) in w or p.get(n) in w)
+
+        if self.sender_email is not None:
+            emails = self.sender_email
+            checks.append(lambda p: (p.get("sender_email_normalized") in emails
+                                     or str(p.get("sender_email", "")).lower() in emails))
+
+        if self.channel_tag is not None:
+            tags = self.channel_tag
+            checks.append(lambda p: p.get("channel_tag") in tags or p.get("channel_iden") in tags)
+
+        for field, patterns in (("title", self.title), ("body", self.body)):
+            if patterns is not None:
+                checks.append(lambda p, f=field, pats=patterns:
+                              any(pat.search(p.get(f) or "") for pat in pats))
+
+        if not checks:
+            return lambda p: True
+        elif len(checks) == 1:
+            return checks[0]
+
+        def _predicate(push: Dict) -> bool:
+            for check in checks:
+                if not check(push):
+                    return False
+            return True
+
+        return _predicate
@@ -17,7 +17,7 @@ from .channel import Channel
 from .chat import Chat
 from .device import Device
 from .errors import InvalidKeyError, HttpError, PushbulletError
-from .filetype import get_file_type
+from .filetype import get_file_type, get_file_type_from_name
 from .subscription import Subscription
 
 
@@ -904,10 +904,33 @@ class Pushbullet:
 
         return next(gen)  # Post process response
 
+    def upload_data(self, data, file_name: str, file_type: str = None) -> dict:
+        """Uploads bytes or a file-like object, rather than a file on disk, to pushbullet storage.
+
+        :param data: bytes, a memoryview or a file-like object opened for binary reading
+        :param str file_name: name for the file
+        :param str file_type: mime type of the data (default: guessed from file_name's extension)
+        """
+        if not file_type:
+            file_type = get_file_type_from_name(file_name)
+        gen = self._upload_generator(file_name, file_type)
+        xfer = next(gen)  # Prep request params
+
+        data_request = xfer["data"]
+        xfer["msg"] = self._post_data(self.UPLOAD_REQUEST_URL, data=json.dumps(data_request))
+        next(gen)  # Prep upload params
+
+        xfer["msg"] = self._post_data(str(xfer["upload_url"]), files={"file": (file_name, data, file_type)})
+
+        return next(gen)  # Post process response
+
     def _upload_file_generator(self, file_path: str, file_type: str = None):
         file_name = os.path.basename(file_path)
         if not file_type:
             file_type = get_file_type(file_path)
+        return self._upload_generator(file_name, file_type)
+
+    def _upload_generator(self, file_name: str, file_type: str):
         data = {"file_name": file_name, "file_type": file_type}
         xfer = {"data": data}
         yield xfer  # Request upload
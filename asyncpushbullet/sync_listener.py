@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+A synchronous listener for the pushbullet live stream, built on LiveStreamListener.
+
+Every SyncLiveStreamListener runs its asyncio side on one background event
+loop shared by the whole process, so a program with many listeners has one
+extra thread for networking, not one per listener.
+
+Example:
+
+    def on_push(push):
+        print("Push:", push.get("title"), push.get("body"))
+
+    with SyncLiveStreamListener(api_key, on_push=on_push) as listener:
+        listener.join()
+
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Iterable, Iterator, Union
+
+from .async_listeners import LiveStreamListener
+from .async_pushbullet import AsyncPushbullet
+from .errors import InvalidKeyError
+from .helpers import BackgroundEventLoop
+from .pushbullet import Pushbullet
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+
+class SyncLiveStreamListener:
+    """Listens for pushes on a background event loop and hands them to synchronous code.
+
+    Pushes (not tickles or nops) arrive through a thread-safe bounded queue.
+    If an on_push callback is given, a dispatch thread calls it with each push;
+    otherwise read them with next_push() or a for loop.  If the queue fills
+    because the consumer is slow, the oldest push is dropped.
+
+    A dropped connection is retried every reconnect_interval seconds until
+    close() is called.  An invalid API key stops the listener for good.
+
+    The account may be an API key, a Pushbullet or an AsyncPushbullet.  Several
+    listeners given the same AsyncPushbullet share one websocket through its
+    StreamHub; note that an AsyncPushbullet given here must not also be used on
+    another event loop.
+    """
+
+    def __init__(self, account: Union[str, Pushbullet, AsyncPushbullet],
+                 on_push: Callable = None,
+                 on_error: Callable = None,
+                 types: Iterable[str] = None,
+                 max_queue_size: int = 1000,
+                 reconnect_interval: float = 10,
+                 background_loop: BackgroundEventLoop = None,
+                 **listener_kwargs):
+        """
+        :param account: an API key, Pushbullet or AsyncPushbullet
+        :param on_push: called on the dispatch thread with each push
+        :param on_error: called on a worker thread with each exception that drops the connection
+        :param types: the types of pushes to receive (see LiveStreamListener), default real pushes only
+        :param max_queue_size: bound on pushes waiting for the consumer
+        :param reconnect_interval: seconds to wait before reconnecting
+        :param background_loop: loop to run on, default BackgroundEventLoop.shared()
+        :param listener_kwargs: passed on to LiveStreamListener, such as push_filter
+        """
+        self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        self.on_push: Callable = on_push
+        self.on_error: Callable = on_error
+        self.types = types
+        self.reconnect_interval: float = reconnect_interval
+        self.listener_kwargs = listener_kwargs
+        self.background_loop: BackgroundEventLoop = background_loop
+
+        if isinstance(account, AsyncPushbullet):
+            self._account: AsyncPushbullet = account
+            self._owns_account: bool = False
+        elif isinstance(account, Pushbullet):
+            self._account = AsyncPushbullet(account.api_key, verify_ssl=account.verify_ssl, proxy=account.proxy)
+            self._owns_account = True
+        else:
+            self._account = AsyncPushbullet(account)
+            self._owns_account = True
+
+        self.connected: bool = False
+        self.last_update: float = None
+        self.exception: Exception = None  # Why the listener stopped for good, if it did
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._closing: threading.Event = threading.Event()
+        self._future: Future = None
+        self._task: asyncio.Task = None
+        self._dispatcher: threading.Thread = None
+        self._STOP = object()  # Sentinel to end iteration and the dispatch thread
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._closing.is_set()
+
+    def start(self):
+        """Connects on the background loop and, if there is an on_push callback, starts dispatching."""
+        if self._future is not None:
+            raise RuntimeError("SyncLiveStreamListener already started")
+        if self.background_loop is None:
+            self.background_loop = BackgroundEventLoop.shared()
+        self._future = self.background_loop.submit(self._run())
+        if self.on_push is not None:
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True,
+                                                name="Thread-{}".format(self.__class__.__name__))
+            self._dispatcher.start()
+
+    def close(self, timeout: float = None):
+        """Disconnects and stops the dispatch thread.  Pushes still queued are discarded."""
+        if self._closing.is_set():
+            return
+        self._closing.set()
+        if self._future is not None:
+            self.background_loop.loop.call_soon_threadsafe(self._cancel)
+            try:
+                self._future.result(timeout)
+            except Exception:
+                pass
+        self._put(self._STOP)
+        if self._dispatcher is not None and self._dispatcher is not threading.current_thread():
+            self._dispatcher.join(timeout)
+
+    def join(self, timeout: float = None):
+        """Blocks until the listener is closed or stops for good."""
+        if self._future is not None:
+            try:
+                self._future.result(timeout)
+            except Exception:
+                pass
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+
+    def next_push(self, timeout: float = None) -> dict:
+        """Returns the next push, blocking until one arrives.
+
+        Raises queue.Empty if the timeout passes first and StopIteration
+        once the listener has closed.
+        """
+        item = self._queue.get(timeout=timeout)
+        if item is self._STOP:
+            self._put(self._STOP)  # Leave it for any other consumers
+            raise StopIteration("SyncLiveStreamListener closed")
+        return item
+
+    def __iter__(self) -> Iterator[dict]:
+        while True:
+            try:
+                yield self.next_push()
+            except StopIteration:
+                return
+
+    def _put(self, item):
+        # Called on the background loop, so never block: drop the oldest instead
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                    if dropped is not self._STOP:
+                        self.log.warning("Queue full (maxsize={}), dropped oldest push".format(self._queue.maxsize))
+                except queue.Empty:
+                    pass
+
+    def _dispatch(self):
+        for push in self:
+            try:
+                self.on_push(push)
+            except Exception as ex:
+                self.log.error("on_push raised {}: {}".format(ex.__class__.__name__, ex))
+                self.log.debug("on_push traceback", exc_info=True)
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _report_error(self, ex: Exception):
+        if self.on_error is not None:
+            asyncio.get_event_loop().run_in_executor(None, self.on_error, ex)
+
+    async def _run(self):
+        self._task = asyncio.current_task()
+        pb = self._account
+        hub = None if self._owns_account else pb.stream_hub
+        try:
+            while not self._closing.is_set():
+                try:
+                    async with LiveStreamListener(pb, types=self.types, hub=hub, **self.listener_kwargs) as lsl:
+                        self.connected = True
+                        self.log.info("Connected to Pushbullet websocket.")
+                        async for push in lsl:
+                            self.last_update = time.time()
+                            self._put(push)
+                    self.log.info("Connection closed.")
+
+                except asyncio.CancelledError:
+                    break
+
+                except InvalidKeyError as ex:
+                    self.log.warning(ex)
+                    self.exception = ex
+                    self._report_error(ex)
+                    break  # Invalid key results in immediate exit
+
+                except Exception as ex:
+                    self.log.warning("{}: {}".format(ex.__class__.__name__, ex))
+                    self._report_error(ex)
+
+                finally:
+                    self.connected = False
+
+                if not self._closing.is_set():
+                    self.log.info("Waiting {} seconds to reconnect...".format(self.reconnect_interval))
+                    try:
+                        await asyncio.sleep(self.reconnect_interval)
+                    except asyncio.CancelledError:
+                        break
+        finally:
+            if self._owns_account:
+                await pb.async_close()
+            self._put(self._STOP)
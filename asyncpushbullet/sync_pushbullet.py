@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Blocking access to pushbullet.com for synchronous code, driven by AsyncPushbullet.
+
+Example:
+
+    with SyncPushbullet(api_key) as pb:
+        pb.push_note("Hello", "World")
+        for push in pb.pushes_iter(limit=100):
+            print(push.get("title"))
+
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Iterator
+
+import aiohttp  # pip install aiohttp
+
+from .async_pushbullet import AsyncPushbullet, PushbulletAsyncIterator
+from .helpers import BackgroundEventLoop
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+
+class SyncPushbullet:
+    """Runs an AsyncPushbullet on a private background event loop and exposes it
+    through blocking methods and iterators.
+
+    Every async_xxx method of AsyncPushbullet is available as a blocking xxx
+    method, so pb.push_note(...) runs async_push_note(...), and every
+    xxx_asynciter is available as a blocking xxx_iter iterator.  Calls from
+    any thread share one pooled connection to pushbullet.com.
+
+    Iterators retrieve pages in the background: while the caller works
+    through the objects already retrieved, the next page is on its way,
+    up to prefetch objects ahead.  GET requests, including each page, are
+    retried on 429 and 5xx responses and network errors (see AsyncPushbullet).
+    """
+
+    def __init__(self, api_key: str = None,
+                 verify_ssl: bool = None,
+                 proxy: str = None,
+                 retries: int = 3,
+                 retry_backoff: float = 0.5,
+                 prefetch: int = 500,
+                 connection_limit: int = 10,
+                 timeout: float = None,
+                 **kwargs):
+        """
+        :param api_key: the pushbullet.com API key
+        :param verify_ssl: set to False to disable SSL/TLS verification
+        :param proxy: optional web proxy
+        :param retries: how many times to retry a failed GET request
+        :param retry_backoff: seconds before the first retry, doubling each time
+        :param prefetch: how many objects an iterator may retrieve ahead of the caller
+        :param connection_limit: bound on HTTP connections in the pool
+        :param timeout: optional limit in seconds on each blocking call
+        :param kwargs: passed on to AsyncPushbullet
+        """
+        self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        self.prefetch: int = prefetch
+        self.timeout: float = timeout
+        self.background_loop: BackgroundEventLoop = BackgroundEventLoop(name="Thread-SyncPushbullet")
+
+        async def _create_connector():
+            ssl = False if verify_ssl is False else None
+            return aiohttp.TCPConnector(limit=connection_limit, ssl=ssl)
+
+        self._connector: aiohttp.TCPConnector = self.background_loop.run(_create_connector())
+        self.async_pushbullet: AsyncPushbullet = AsyncPushbullet(api_key, verify_ssl=verify_ssl, proxy=proxy,
+                                                                 connector=self._connector,
+                                                                 retries=retries,
+                                                                 retry_backoff=retry_backoff,
+                                                                 **kwargs)
+
+    def __enter__(self):
+        self.verify_key()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def api_key(self) -> str:
+        return self.async_pushbullet.api_key
+
+    def run(self, coro, timeout: float = None):
+        """Runs any coroutine on this object's event loop and waits for its result."""
+        return self.background_loop.run(coro, timeout=timeout or self.timeout)
+
+    def close(self):
+        """Closes connections and stops the background event loop."""
+        if not self.background_loop.running:
+            return
+        try:
+            self.run(self.async_pushbullet.async_close())
+            self.run(self._connector.close())
+        finally:
+            self.background_loop.stop()
+
+    def __getattr__(self, name: str) -> Callable:
+        # Only called for names not otherwise found: map them onto the async engine
+        if not name.startswith("_"):
+            async_func = getattr(self.async_pushbullet, "async_" + name, None)
+            if async_func is not None and asyncio.iscoroutinefunction(async_func):
+                func = self._blocking(async_func)
+                setattr(self, name, func)  # Skip __getattr__ next time
+                return func
+
+            if name.endswith("_iter"):
+                iter_func = getattr(self.async_pushbullet, name[:-len("_iter")] + "_asynciter", None)
+                if iter_func is not None:
+                    func = self._iterating(iter_func)
+                    setattr(self, name, func)
+                    return func
+
+        raise AttributeError("{} has no attribute {}".format(self.__class__.__name__, name))
+
+    def _blocking(self, async_func: Callable) -> Callable:
+        def _func(*kargs, **kwargs) -> Any:
+            return self.run(async_func(*kargs, **kwargs))
+
+        _func.__name__ = async_func.__name__[len("async_"):]
+        _func.__doc__ = async_func.__doc__
+        return _func
+
+    def _iterating(self, iter_func: Callable) -> Callable:
+        def _func(*kargs, **kwargs) -> Iterator:
+            return SyncPushbullet._Iterator(self, iter_func(*kargs, **kwargs))
+
+        _func.__name__ = iter_func.__name__.replace("_asynciter", "_iter")
+        _func.__doc__ = iter_func.__doc__
+        return _func
+
+    class _Iterator(Iterator):
+        """Blocking iterator fed by a task that works through the async iterator ahead of the caller."""
+        _END = object()
+
+        def __init__(self, sync_pb, async_iter: PushbulletAsyncIterator):
+            self.sync_pb: SyncPushbullet = sync_pb
+            self._async_iter: PushbulletAsyncIterator = async_iter
+            self._batch: deque = deque()
+            self._done: bool = False
+            self._queue: asyncio.Queue = None
+            self._producer: asyncio.Task = None
+            sync_pb.run(self._start())
+
+        async def _start(self):
+            self._queue = asyncio.Queue(maxsize=max(1, self.sync_pb.prefetch))
+            self._producer = asyncio.get_event_loop().create_task(self._produce())
+
+        async def _produce(self):
+            try:
+                async for item in self._async_iter:
+                    await self._queue.put(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                await self._queue.put(ex)
+            else:
+                await self._queue.put(SyncPushbullet._Iterator._END)
+
+        async def _next_batch(self) -> list:
+            # One trip between threads collects everything retrieved so far
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            return batch
+
+        async def _stop(self):
+            if self._producer is not None:
+                self._producer.cancel()
+
+        def __iter__(self) -> Iterator:
+            return self
+
+        def __next__(self):
+            if not self._batch:
+                if self._done:
+                    raise StopIteration()
+                self._batch.extend(self.sync_pb.run(self._next_batch()))
+            item = self._batch.popleft()
+            if item is SyncPushbullet._Iterator._END:
+                self._done = True
+                raise StopIteration()
+            if isinstance(item, Exception):
+                self._done = True
+                raise item
+            return item
+
+        def close(self):
+            """Stops retrieving objects, for callers that leave the loop early."""
+            self._done = True
+            self._batch.clear()
+            if self.sync_pb.background_loop.running:
+                self.sync_pb.run(self._stop())
+
+        def __del__(self):
+            try:
+                if not self._done and self.sync_pb.background_loop.running:
+                    self.sync_pb.background_loop.submit(self._stop())
+            except Exception:
+                pass
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Holds items back until their rate budgets allow them through, queueing them rather
+than stalling whoever submitted them.
+
+A budget allows count items in any seconds-long window.  It may apply to every
+item, or be kept separately for each key, such as each sender of a push, so that
+one chatty sender does not use up everyone else's budget.  An item waits until
+every budget it falls under has room, while items under other budgets go ahead.
+
+Example:
+
+    throttle = Throttle(release=handle_push)
+    throttle.add_budget("all", 10, 10)
+    throttle.add_budget("sender", 3, 10, key=lambda p: p.get("sender_iden"))
+    async for push in lsl:
+        await throttle.submit(push)  # Only waits if max_pending pushes are already waiting
+
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+DEFAULT_MAX_PENDING = 1000
+
+
+class SlidingWindow:
+    """Allows at most count events in any seconds-long window."""
+
+    def __init__(self, count: int, seconds: float):
+        self.count = count  # type: int
+        self.seconds = seconds  # type: float
+        self._times = deque()  # type: Deque[float]
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until another event is allowed (0 if it is allowed now)."""
+        while self._times and self._times[0] <= now - self.seconds:
+            self._times.popleft()
+        if len(self._times) < self.count:
+            return 0.0
+        return self._times[0] + self.seconds - now
+
+    def record(self, now: float):
+        self._times.append(now)
+
+    def idle(self, now: float) -> bool:
+        """Whether no events fall within the window any more."""
+        self.wait_time(now)
+        return not self._times
+
+
+class Budget:
+    """A rate limit of count items per seconds, kept per key if a key function is given."""
+
+    def __init__(self, name: str, count: int, seconds: float, key: Callable[[Any], Hashable] = None):
+        """
+        :param name: name of the budget, for logs and metrics
+        :param count: items allowed ...
+        :param seconds: ... in any window this long
+        :param key: optional function of an item giving the key it is counted under,
+                    or None if the budget does not apply to the item
+        """
+        if count < 1:
+            raise ValueError("Budget {} must allow at least 1 item, not {}".format(name, count))
+        if not seconds > 0:
+            raise ValueError("Budget {} needs a window longer than 0 seconds, not {}".format(name, seconds))
+        self.name = name  # type: str
+        self.count = count  # type: int
+        self.seconds = seconds  # type: float
+        self.key = key  # type: Callable[[Any], Hashable]
+        self.throttled = 0  # type: int  # Items this budget held back
+        self._windows = {}  # type: Dict[Hashable, SlidingWindow]
+
+    def __repr__(self):
+        return "{}({!r}, count={}, seconds={})".format(self.__class__.__name__, self.name, self.count, self.seconds)
+
+    def window_for(self, item) -> Optional[SlidingWindow]:
+        key = None if self.key is None else self.key(item)
+        if self.key is not None and key is None:
+            return None
+        window = self._windows.get(key)
+        if window is None:
+            window = SlidingWindow(self.count, self.seconds)
+            self._windows[key] = window
+        return window
+
+    def prune(self, now: float):
+        """Forgets keys that have not been seen for a whole window."""
+        for key in [k for k, w in self._windows.items() if w.idle(now)]:
+            del self._windows[key]
+
+
+class Throttle:
+    """
+    Passes submitted items to release, in order, as fast as their budgets allow.
+
+    submit() returns at once unless max_pending items are already waiting, so a
+    burst of items queues up instead of holding up their source.  Items are
+    released by a background task, one at a time.  An item whose budgets cannot
+    be worked out, say because a key function raises, is logged and dropped.
+    """
+
+    def __init__(self, release: Callable[[Any], Awaitable],
+                 max_pending: int = DEFAULT_MAX_PENDING,
+                 timer: Callable[[], float] = time.monotonic):
+        """
+        :param release: coroutine function called with each item once its budgets allow
+        :param max_pending: items that may wait before submit() itself waits
+        :param timer: source of the current time, in seconds
+        """
+        self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        self.release = release
+        self.max_pending = max_pending  # type: int
+        self.budgets = []  # type: List[Budget]
+        self._timer = timer
+        self._pending = []  # type: List[Throttle._Pending]
+        self._room = None  # type: asyncio.Semaphore
+        self._wakeup = None  # type: asyncio.Event
+        self._dispatcher = None  # type: asyncio.Task
+
+        # Metrics
+        self.submitted = 0
+        self.released = 0
+        self.delayed = 0  # Items that had to wait for a budget
+        self.dropped = 0  # Items dropped because their budgets could not be worked out
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self.max_pending_seen = 0
+        self.stalls = 0  # Times submit() waited because max_pending items were waiting
+        self.stall_seconds = 0.0
+
+    def add_budget(self, name: str, count: int, seconds: float, key: Callable[[Any], Hashable] = None) -> Budget:
+        """Adds a budget of count items per seconds, per key if key is given (see Budget)."""
+        budget = Budget(name, count, seconds, key=key)
+        self.budgets.append(budget)
+        return budget
+
+    async def submit(self, item):
+        """Queues the item to be released when its budgets allow."""
+        if self._dispatcher is None:  # Start on first use so we're on the right loop
+            self._room = asyncio.Semaphore(self.max_pending)
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.get_event_loop().create_task(self._dispatch())
+
+        if self._room.locked():
+            self.stalls += 1
+            start = self._timer()
+            self.log.warning("{} items are waiting to be released.  Waiting for room ...".format(self.max_pending))
+            await self._room.acquire()
+            self.stall_seconds += self._timer() - start
+        else:
+            await self._room.acquire()
+
+        self.submitted += 1
+        try:
+            windows = [(b, w) for b, w in ((b, b.window_for(item)) for b in self.budgets) if w is not None]
+        except Exception as ex:
+            self._drop(item, ex)
+            return
+        self._pending.append(Throttle._Pending(item, self._timer(), windows))
+        self.max_pending_seen = max(self.max_pending_seen, len(self._pending))
+        self._wakeup.set()
+
+    async def close(self):
+        """Stops releasing items, abandoning any still waiting."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        self._pending = []
+
+    def metrics(self) -> dict:
+        return {"submitted": self.submitted,
+                "released": self.released,
+                "pending": len(self._pending),
+                "max_pending": self.max_pending_seen,
+                "delayed": self.delayed,
+                "dropped": self.dropped,
+                "mean_delay": self.total_delay / self.released if self.released else 0.0,
+                "max_delay": self.max_delay,
+                "stalls": self.stalls,
+                "stall_seconds": self.stall_seconds,
+                "throttled_by": {b.name: b.throttled for b in self.budgets}}
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            next_wait = None  # type: float
+            for pending in list(self._pending):
+                now = self._timer()
+                try:
+                    wait = self._wait_time(pending, now)
+                except Exception as ex:
+                    self._pending.remove(pending)
+                    self._drop(pending.item, ex)
+                    continue
+                if wait > 0:
+                    if not pending.throttled:
+                        pending.throttled = True
+                        self.delayed += 1
+                        if self.log.isEnabledFor(logging.INFO):
+                            self.log.info("Throttling items that are coming too fast. Delaying {:0.1f} seconds ..."
+                                          .format(wait))
+                    next_wait = wait if next_wait is None else min(next_wait, wait)
+                    continue
+
+                # Release it
+                self._pending.remove(pending)
+                for _, window in pending.windows:
+                    window.record(now)
+                delay = now - pending.submitted_at
+                self.total_delay += delay
+                self.max_delay = max(self.max_delay, delay)
+                self.released += 1
+                self._room.release()
+                try:
+                    await self.release(pending.item)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as ex:
+                    self.log.warning("Releasing {} raised {}: {}".format(pending.item, ex.__class__.__name__, ex))
+
+            if not self._pending:
+                for budget in self.budgets:
+                    try:
+                        budget.prune(self._timer())
+                    except Exception as ex:
+                        self.log.warning("Pruning budget {} raised {}: {}"
+                                         .format(budget.name, ex.__class__.__name__, ex))
+            if self._wakeup.is_set():
+                continue  # More arrived while releasing
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=next_wait)
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    def _wait_time(pending, now: float) -> float:
+        # Seconds until every budget the item falls under has room
+        wait = 0.0
+        for budget, window in pending.windows:
+            budget_wait = window.wait_time(now)
+            if budget_wait > 0 and not pending.throttled:
+                budget.throttled += 1
+            wait = max(wait, budget_wait)
+        return wait
+
+    def _drop(self, item, ex: Exception):
+        self.dropped += 1
+        self._room.release()
+        self.log.warning("Dropping {} because its budgets raised {}: {}".format(item, ex.__class__.__name__, ex))
+
+    class _Pending:
+        __slots__ = ("item", "submitted_at", "windows", "throttled")
+
+        def __init__(self, item, submitted_at: float, windows: list):
+            self.item = item
+            self.submitted_at = submitted_at
+            self.windows = windows
+            self.throttled = False
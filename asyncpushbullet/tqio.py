@@ -64,3 +64,29 @@ class tqio(io.BufferedReader):
         super().close()
 
 
+class TqdmProgress:
+    """A progress callback, as taken by upload.AsyncFilePayload, that draws a tqdm bar.
+
+    with TqdmProgress("Uploading") as progress:
+        await pb.async_upload_file(path, progress=progress)
+    """
+
+    def __init__(self, descr=None):
+        self.descr = descr
+        self.t = None  # type: tqdm
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __call__(self, sent: int, total: int):
+        if self.t is None:
+            print(end="", flush=True)  # Flush output buffer to help tqdm
+            self.t = tqdm(desc=self.descr, unit="bytes", unit_scale=True, total=total)
+        self.t.update(sent - self.t.n)
+
+    def close(self):
+        if self.t is not None:
+            self.t.close()
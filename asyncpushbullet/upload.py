@@ -0,0 +1,581 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for uploading files without blocking the event loop.
+
+Example:
+
+    def progress(sent, total):
+        print("{} of {} bytes".format(sent, total))
+
+    payload = AsyncFilePayload("video.mp4", progress=progress)
+    await session.post(url, data=payload)
+
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import Executor
+from typing import AsyncIterable, BinaryIO, Callable, Dict, Optional, Union
+
+import aiohttp  # pip install aiohttp
+import appdirs  # pip install appdirs
+from aiohttp import payload
+
+from .errors import HttpError
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # bytes
+DEFAULT_RANGE_SIZE = 8 * 1024 * 1024  # bytes per request when uploading in ranges
+
+
+class AsyncFilePayload(payload.Payload):
+    """An aiohttp payload that streams a file from disk without blocking the event loop.
+
+    The file is opened, read and closed in an executor, in chunks of
+    chunk_size bytes, so a large upload leaves the event loop free for
+    other work such as websocket processing.  Its size is known up front,
+    so multipart bodies built with it get a Content-Length.  From async
+    code, pass size (found in an executor) so that constructing the
+    payload does not stat the file on the event loop.
+
+    After each chunk is handed to aiohttp, progress (if given) is called on
+    the event loop thread with the bytes sent so far and the total.
+    """
+
+    def __init__(self, file_path: str,
+                 progress: Callable[[int, int], None] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 executor: Executor = None,
+                 size: int = None,
+                 *kargs, **kwargs):
+        """
+        :param file_path: the file to send
+        :param progress: optional callback taking (bytes_sent, total_bytes)
+        :param chunk_size: bytes read from disk at a time
+        :param executor: where to run the blocking file operations (default: the loop's executor)
+        :param size: the file's size, if already known (otherwise the file is stat'ed here)
+        """
+        kwargs.setdefault("filename", os.path.basename(file_path))
+        super().__init__(file_path, *kargs, **kwargs)
+        self.file_path: str = file_path
+        self.progress: Callable[[int, int], None] = progress
+        self.chunk_size: int = chunk_size
+        self.executor: Executor = executor
+        self._size = os.path.getsize(file_path) if size is None else size
+
+    def decode(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        with open(self.file_path, "rb") as f:
+            return f.read().decode(encoding, errors)
+
+    async def write(self, writer):
+        await self.write_with_length(writer, None)
+
+    async def write_with_length(self, writer, content_length: int = None):
+        loop = asyncio.get_event_loop()
+        total = self._size if content_length is None else min(self._size, content_length)
+        sent = 0
+        f = await loop.run_in_executor(self.executor, open, self.file_path, "rb")
+        try:
+            while sent < total:
+                chunk = await loop.run_in_executor(self.executor, f.read, min(self.chunk_size, total - sent))
+                if not chunk:
+                    break  # File shrank underneath us
+                await writer.write(chunk)
+                sent += len(chunk)
+                if self.progress is not None:
+                    self.progress(sent, total)
+        finally:
+            await loop.run_in_executor(self.executor, f.close)
+
+
+class BufferPayload(payload.Payload):
+    """An aiohttp payload that sends bytes, a bytearray or a memoryview in chunks, with progress.
+
+    Each chunk is a memoryview slice of the original buffer, so nothing is
+    copied on the way into the request body.
+    """
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview],
+                 progress: Callable[[int, int], None] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 *kargs, **kwargs):
+        """
+        :param data: the bytes to send
+        :param progress: optional callback taking (bytes_sent, total_bytes)
+        :param chunk_size: bytes handed to aiohttp at a time
+        """
+        super().__init__(data, *kargs, **kwargs)
+        self.view: memoryview = memoryview(data).cast("B")
+        self.progress: Callable[[int, int], None] = progress
+        self.chunk_size: int = chunk_size
+        self._size = self.view.nbytes
+
+    def decode(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        return self.view.tobytes().decode(encoding, errors)
+
+    async def write(self, writer):
+        await self.write_with_length(writer, None)
+
+    async def write_with_length(self, writer, content_length: int = None):
+        total = self._size if content_length is None else min(self._size, content_length)
+        for sent in range(0, total, self.chunk_size):
+            chunk = self.view[sent:min(sent + self.chunk_size, total)]
+            await writer.write(chunk)
+            if self.progress is not None:
+                self.progress(sent + len(chunk), total)
+
+
+class AsyncStreamPayload(payload.Payload):
+    """An aiohttp payload that sends a file-like object or an async iterator of chunks.
+
+    A file-like object (anything with a read method) is read in an executor,
+    chunk_size bytes at a time.  An async iterator is sent chunk by chunk as
+    it produces them.  Give size if it is known, so the request can have a
+    Content-Length; otherwise it is found for seekable file-like objects, and
+    failing that the body is sent with chunked transfer encoding.
+
+    After each chunk is handed to aiohttp, progress (if given) is called on
+    the event loop thread with the bytes sent so far and the total (or None).
+    """
+
+    def __init__(self, stream: Union[BinaryIO, AsyncIterable[bytes]],
+                 size: int = None,
+                 progress: Callable[[int, int], None] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 executor: Executor = None,
+                 *kargs, **kwargs):
+        """
+        :param stream: a file-like object opened for binary reading, or an async iterator of bytes
+        :param size: bytes the stream will produce, if known
+        :param progress: optional callback taking (bytes_sent, total_bytes or None)
+        :param chunk_size: bytes read from a file-like object at a time
+        :param executor: where to run the blocking reads (default: the loop's executor)
+        """
+        super().__init__(stream, *kargs, **kwargs)
+        self.stream = stream
+        self.progress: Callable[[int, int], None] = progress
+        self.chunk_size: int = chunk_size
+        self.executor: Executor = executor
+        if size is None and hasattr(stream, "read"):
+            size = _remaining_size(stream)
+        self._size = size
+
+    def decode(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        raise TypeError("Unable to decode a stream")
+
+    async def write(self, writer):
+        await self.write_with_length(writer, None)
+
+    async def write_with_length(self, writer, content_length: int = None):
+        total = self._size if content_length is None or self._size is None else min(self._size, content_length)
+        sent = 0
+        async for chunk in self._chunks():
+            if total is not None and len(chunk) > total - sent:
+                chunk = chunk[:total - sent]
+            await writer.write(chunk)
+            sent += len(chunk)
+            if self.progress is not None:
+                self.progress(sent, total)
+            if total is not None and sent >= total:
+                break
+
+    async def _chunks(self):
+        if hasattr(self.stream, "read"):
+            loop = asyncio.get_event_loop()
+            while True:
+                chunk = await loop.run_in_executor(self.executor, self.stream.read, self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        else:
+            async for chunk in self.stream:
+                if chunk:
+                    yield chunk
+
+
+def _remaining_size(f: BinaryIO) -> Optional[int]:
+    # Bytes left in a seekable file-like object, or None if it cannot tell
+    try:
+        if not f.seekable():
+            return None
+        here = f.tell()
+        end = f.seek(0, os.SEEK_END)
+        f.seek(here)
+        return end - here
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def data_payload(data: Union[bytes, bytearray, memoryview, BinaryIO, AsyncIterable[bytes]],
+                 size: int = None,
+                 progress: Callable[[int, int], None] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 executor: Executor = None,
+                 **kwargs) -> payload.Payload:
+    """Returns a BufferPayload for bytes-like data, otherwise an AsyncStreamPayload."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return BufferPayload(data, progress=progress, chunk_size=chunk_size, **kwargs)
+    if hasattr(data, "read") or hasattr(data, "__aiter__"):
+        return AsyncStreamPayload(data, size=size, progress=progress, chunk_size=chunk_size,
+                                  executor=executor, **kwargs)
+    raise TypeError("Cannot upload {}: expected bytes, a memoryview, a file-like object or an async iterator"
+                    .format(type(data).__name__))
+
+
+def data_form_data(data: Union[bytes, bytearray, memoryview, BinaryIO, AsyncIterable[bytes]],
+                   file_name: str, file_type: str,
+                   size: int = None,
+                   progress: Callable[[int, int], None] = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   executor: Executor = None) -> aiohttp.FormData:
+    """Returns multipart form data with data (see data_payload) as the "file" field."""
+    form = aiohttp.FormData()
+    form.add_field("file",
+                   data_payload(data, size=size, progress=progress, chunk_size=chunk_size, executor=executor,
+                                filename=file_name, content_type=file_type),
+                   filename=file_name,
+                   content_type=file_type)
+    return form
+
+
+def file_form_data(file_path: str, file_name: str = None, file_type: str = None,
+                   progress: Callable[[int, int], None] = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   executor: Executor = None,
+                   size: int = None) -> aiohttp.FormData:
+    """Returns multipart form data with the file streamed as the "file" field,
+    which is what pushbullet.com's upload URLs and transfer.sh expect."""
+    file_name = file_name or os.path.basename(file_path)
+    form = aiohttp.FormData()
+    form.add_field("file",
+                   AsyncFilePayload(file_path, progress=progress, chunk_size=chunk_size, executor=executor,
+                                    size=size, filename=file_name, content_type=file_type),
+                   filename=file_name,
+                   content_type=file_type)
+    return form
+
+
+async def async_file_form_data(file_path: str, file_name: str = None, file_type: str = None,
+                               progress: Callable[[int, int], None] = None,
+                               chunk_size: int = DEFAULT_CHUNK_SIZE,
+                               executor: Executor = None) -> aiohttp.FormData:
+    """Like file_form_data, but finds the file's size in an executor."""
+    size = await asyncio.get_event_loop().run_in_executor(executor, os.path.getsize, file_path)
+    return file_form_data(file_path, file_name=file_name, file_type=file_type, progress=progress,
+                          chunk_size=chunk_size, executor=executor, size=size)
+
+
+def hash_file(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """Returns the SHA-256 hex digest of a file, read in chunks.  This blocks, so
+    from async code run it in an executor."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadCache:
+    """Remembers where files were uploaded so that the same content need not be uploaded again.
+
+    Uploads are keyed by the SHA-256 hash and size of the file's contents
+    (and by which service received them), so a status image regenerated
+    with identical bytes is still a hit.  To avoid rehashing, the hash of
+    each file is also remembered against its path, size and modification
+    time, and recomputed only when one of those changes.  Hashing is done
+    in an executor.
+
+    Entries older than ttl seconds are ignored and eventually pruned.  The
+    cache is kept as a JSON file in the user's cache folder, or in cache_file
+    if given, or only in memory if cache_file is False.
+    """
+    DEFAULT_TTL = 24 * 60 * 60  # seconds
+    DEFAULT_MAX_ENTRIES = 10000
+
+    def __init__(self, cache_file: str = None,
+                 ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 executor: Executor = None,
+                 timer: Callable[[], float] = time.time):
+        """
+        :param cache_file: JSON file to keep the cache in (default: in the user cache folder;
+            False: do not save to disk)
+        :param ttl: seconds an upload is assumed to remain available
+        :param max_entries: bound on remembered uploads, oldest forgotten first
+        :param executor: where to run hashing and file operations (default: the loop's executor)
+        :param timer: source of the current time, replaceable for testing
+        """
+        self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        if cache_file is None:
+            cache_dir = appdirs.user_cache_dir("asyncpushbullet", "net.iharder.asyncpushbullet")
+            cache_file = os.path.join(cache_dir, "upload_cache.json")
+        self.cache_file: str = cache_file or None
+        self.ttl: float = ttl
+        self.max_entries: int = max_entries
+        self.executor: Executor = executor
+        self._timer: Callable[[], float] = timer
+        self._uploads: Dict[str, Dict] = None  # content key -> upload info and timestamp
+        self._hashes: Dict[str, Dict] = None  # file path -> size, mtime and hash
+        self._lock: asyncio.Lock = None
+
+    async def async_get(self, file_path: str, backend: str = "pushbullet") -> Optional[Dict]:
+        """Returns {"file_type", "file_url", "file_name"} if this content was uploaded
+        to backend within the ttl, otherwise None."""
+        await self._async_load()
+        key = await self._async_content_key(file_path, backend)
+        entry = self._uploads.get(key)
+        if entry is None or entry["time"] + self.ttl <= self._timer():
+            return None
+        return {"file_type": entry["file_type"],
+                "file_url": entry["file_url"],
+                "file_name": os.path.basename(file_path)}
+
+    async def async_put(self, file_path: str, info: Dict, backend: str = "pushbullet"):
+        """Records that file_path was uploaded to backend, given the dict returned by the upload."""
+        await self._async_load()
+        key = await self._async_content_key(file_path, backend)
+        self._uploads.pop(key, None)  # Re-insert so that dict order stays oldest first
+        self._uploads[key] = {"file_type": info.get("file_type"),
+                              "file_url": info.get("file_url"),
+                              "time": self._timer()}
+        await self._async_save()
+
+    def clear(self):
+        self._uploads = {}
+        self._hashes = {}
+
+    async def _async_content_key(self, file_path: str, backend: str) -> str:
+        loop = asyncio.get_event_loop()
+        path = os.path.abspath(file_path)
+        st = await loop.run_in_executor(self.executor, os.stat, path)
+        known = self._hashes.get(path)
+        if known is None or known["size"] != st.st_size or known["mtime"] != st.st_mtime:
+            digest = await loop.run_in_executor(self.executor, hash_file, path)
+            known = {"size": st.st_size, "mtime": st.st_mtime, "sha256": digest}
+            self._hashes[path] = known
+        return "{}:{}:{}".format(backend, known["sha256"], known["size"])
+
+    async def _async_load(self):
+        if self._uploads is not None:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._uploads is not None:
+                return
+            data = {}
+            if self.cache_file is not None:
+                data = await asyncio.get_event_loop().run_in_executor(self.executor, self._read_file)
+            self._uploads = data.get("uploads", {})
+            self._hashes = data.get("hashes", {})
+
+    def _read_file(self) -> Dict:
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as ex:
+            self.log.warning("Ignoring unreadable upload cache {}: {}".format(self.cache_file, ex))
+            return {}
+
+    async def _async_save(self):
+        # Forget expired uploads and the oldest beyond max_entries
+        oldest_allowed = self._timer() - self.ttl
+        for key in [k for k, v in self._uploads.items() if v["time"] <= oldest_allowed]:
+            del self._uploads[key]
+        while len(self._uploads) > self.max_entries:
+            del self._uploads[next(iter(self._uploads))]
+        while len(self._hashes) > self.max_entries:
+            del self._hashes[next(iter(self._hashes))]
+
+        if self.cache_file is not None:
+            data = json.dumps({"uploads": self._uploads, "hashes": self._hashes})
+            await asyncio.get_event_loop().run_in_executor(self.executor, self._write_file, data)
+
+    def _write_file(self, data: str):
+        try:
+            _replace_file(self.cache_file, data)
+        except OSError as ex:
+            self.log.warning("Could not save upload cache {}: {}".format(self.cache_file, ex))
+
+
+class UploadState:
+    """How far an upload got, saved as JSON so that it can be resumed later, even by another process.
+
+    An upload has two stages: asking the backend where to upload (which
+    gives upload_url and file_url) and sending the file there.  Once the
+    first stage is done, a retry or a restarted program goes straight to
+    the second.  If the backend accepts the file in ranges (see
+    async_put_range), offset records how many bytes it already has and
+    only the rest is sent.
+
+    The state belongs to the file as it was: if the file's size or
+    modification time changes, or the state is older than max_age seconds,
+    matches() is False and the upload should start over.
+    """
+    MAX_AGE = 24 * 60 * 60  # seconds an upload_url is trusted to remain valid
+
+    def __init__(self, file_path: str, file_name: str = None, file_type: str = None,
+                 size: int = 0, mtime: float = 0.0,
+                 backend: str = "pushbullet", ranged: bool = False):
+        self.file_path: str = os.path.abspath(file_path)
+        self.file_name: str = file_name or os.path.basename(file_path)
+        self.file_type: str = file_type
+        self.size: int = size
+        self.mtime: float = mtime
+        self.backend: str = backend
+        self.ranged: bool = ranged
+        self.upload_url: str = None
+        self.file_url: str = None
+        self.offset: int = 0
+        self.uploaded: bool = False
+        self.created: float = time.time()
+
+    def __repr__(self):
+        return "{}({}, upload_url={}, offset={}/{}, uploaded={})".format(
+            self.__class__.__name__, self.file_name, self.upload_url, self.offset, self.size, self.uploaded)
+
+    @staticmethod
+    def default_state_file(file_path: str, backend: str = "pushbullet") -> str:
+        """Returns where, in the user's cache folder, to keep the state of uploading file_path to backend."""
+        cache_dir = appdirs.user_cache_dir("asyncpushbullet", "net.iharder.asyncpushbullet")
+        key = "{}:{}".format(backend, os.path.abspath(file_path)).encode("utf-8")
+        return os.path.join(cache_dir, "uploads", hashlib.sha1(key).hexdigest() + ".json")
+
+    @classmethod
+    def for_file(cls, file_path: str, **kwargs) -> "UploadState":
+        """Returns a fresh state for a file, recording its current size and modification time.
+        This calls os.stat, so from async code run it in an executor."""
+        st = os.stat(file_path)
+        return cls(file_path, size=st.st_size, mtime=st.st_mtime, **kwargs)
+
+    def matches(self, file_path: str, backend: str = None, max_age: float = MAX_AGE) -> bool:
+        """Whether this state is still good for resuming an upload of file_path.
+        This calls os.stat, so from async code run it in an executor."""
+        if os.path.abspath(file_path) != self.file_path:
+            return False
+        if backend is not None and backend != self.backend:
+            return False
+        if time.time() - self.created > max_age:
+            return False
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return False
+        return st.st_size == self.size and st.st_mtime == self.mtime
+
+    def reset(self):
+        """Forgets both stages, for when the upload_url is no longer accepted."""
+        self.upload_url = None
+        self.file_url = None
+        self.offset = 0
+        self.uploaded = False
+        self.created = time.time()
+
+    def to_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "UploadState":
+        state = cls(data["file_path"])
+        state.__dict__.update(data)
+        return state
+
+    def save(self, state_file: str):
+        """Writes the state to state_file, replacing any earlier one in a single step."""
+        _replace_file(state_file, json.dumps(self.to_dict()))
+
+    @classmethod
+    def load(cls, state_file: str) -> Optional["UploadState"]:
+        """Returns the state saved in state_file, or None if there is none or it cannot be read."""
+        try:
+            with open(state_file) as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def read_range(file_path: str, offset: int, length: int) -> bytes:
+    """Returns length bytes of a file starting at offset.  This blocks, so from
+    async code run it in an executor."""
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+async def async_put_range(session: aiohttp.ClientSession, upload_url: str,
+                          file_path: str, offset: int, total: int,
+                          range_size: int = DEFAULT_RANGE_SIZE,
+                          executor: Executor = None,
+                          **kwargs) -> int:
+    """Sends one range of a file to an upload_url that accepts uploads in ranges
+    and returns how many bytes the server now has.
+
+    The protocol is the common resumable one: each range is a PUT with a
+    Content-Range header, answered with 308 and a Range header while the
+    upload is incomplete and with 200, 201 or 204 once it is complete.
+
+    :param session: the session to send with
+    :param upload_url: where to send the range
+    :param file_path: the file being uploaded
+    :param offset: first byte to send
+    :param total: size of the whole file
+    :param range_size: bytes to send in this request
+    :param executor: where to read the file (default: the loop's executor)
+    :param kwargs: passed on to session.put, such as proxy
+    """
+    length = min(range_size, total - offset)
+    data = await asyncio.get_event_loop().run_in_executor(executor, read_range, file_path, offset, length)
+    if len(data) != length:
+        raise IOError("File changed during upload: {}".format(file_path))
+    headers = {"Content-Range": "bytes {}-{}/{}".format(offset, offset + length - 1, total)}
+    if total == 0:
+        headers["Content-Range"] = "bytes */0"
+    return await _async_range_request(session, upload_url, total, data=data, headers=headers, **kwargs)
+
+
+async def async_query_range(session: aiohttp.ClientSession, upload_url: str, total: int, **kwargs) -> int:
+    """Asks an upload_url that accepts uploads in ranges how many bytes it already has."""
+    headers = {"Content-Range": "bytes */{}".format(total)}
+    return await _async_range_request(session, upload_url, total, headers=headers, **kwargs)
+
+
+async def _async_range_request(session: aiohttp.ClientSession, upload_url: str, total: int, **kwargs) -> int:
+    async with session.put(upload_url, **kwargs) as resp:
+        body = await resp.read()
+        if resp.status in (200, 201, 204):
+            return total
+        if resp.status == 308:
+            return _bytes_received(resp.headers.get("Range"))
+        raise HttpError(resp.status, "Upload of range failed.", body)
+
+
+def _bytes_received(range_header: Optional[str]) -> int:
+    # "bytes=0-1234" means 1235 bytes have been received; no header means none
+    if not range_header:
+        return 0
+    return int(range_header.rpartition("-")[2]) + 1
+
+
+def _replace_file(path: str, data: str):
+    # Write to a temporary file and then swap it in, so readers never see half a file
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
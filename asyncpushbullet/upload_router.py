@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Chooses where to upload a file, by its size and how fast each service has been, before
+any bytes are sent.
+
+Pushbullet's own storage takes files up to 25 MB.  Larger files used to fail only
+after being sent; an UploadRouter sends them somewhere that will take them instead.
+
+Example:
+
+    router = UploadRouter([PushbulletBackend(), TransferShBackend()])
+    info = await router.async_upload(pb, "video.mp4")
+    await pb.async_push_file(info["file_name"], info["file_url"], info["file_type"])
+
+Backends are tried in order, so list the preferred one first.  To send large files to
+your own server, put an HttpPutBackend ahead of or after the others:
+
+    HttpPutBackend("http://localhost:9000/artifacts/{file_name}", min_size=25 * 1000 * 1000)
+
+"""
+import abc
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+from urllib.parse import quote
+
+from .async_pushbullet import AsyncPushbullet, _NoProgress
+from .compression import async_compressed_chunks, async_compression_plan
+from .errors import HttpError, PushbulletError
+from .filetype import async_get_file_type
+from .tqio import TqdmProgress
+from .upload import AsyncFilePayload, UploadCache
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+PUSHBULLET_MAX_SIZE = 25 * 1000 * 1000  # bytes, for accounts without Pushbullet Pro
+TRANSFER_SH_MAX_SIZE = 10 * 1000 * 1000 * 1000  # bytes
+
+
+class UploadBackend(abc.ABC):
+    """A place to upload files to, taking files of size between min_size and max_size bytes.
+
+    Subclasses must implement async_upload, returning the same dictionary as
+    AsyncPushbullet.async_upload_file; one that does not cannot be created.
+    """
+    name = "backend"
+
+    def __init__(self, max_size: int = None, min_size: int = 0):
+        """
+        :param max_size: largest file accepted, in bytes (None for no limit)
+        :param min_size: smallest file accepted, in bytes
+        """
+        self.max_size: int = max_size
+        self.min_size: int = min_size
+
+    def __repr__(self):
+        return "{}(min_size={}, max_size={})".format(self.__class__.__name__, self.min_size, self.max_size)
+
+    def accepts(self, size: int) -> bool:
+        return size >= self.min_size and (self.max_size is None or size <= self.max_size)
+
+    @abc.abstractmethod
+    async def async_upload(self, pb: AsyncPushbullet, file_path: str,
+                           file_type: str = None,
+                           show_progress: bool = True,
+                           progress: Callable[[int, int], None] = None,
+                           state_file: str = None,
+                           keep_state: bool = False,
+                           compress: str = None) -> dict:
+        """Uploads the file and returns {"file_type", "file_url", "file_name"}.
+
+        :param pb: the account to upload with
+        :param file_path: the file to upload
+        :param file_type: optional mime type of the file
+        :param show_progress: show a progress bar on the terminal (ignored if progress is given)
+        :param progress: optional callback taking (bytes_sent, total_bytes)
+        :param state_file: save progress here so that the upload can be resumed, if the backend can
+        :param keep_state: leave the state file after success
+        :param compress: optionally "gzip" or "zstd" to compress the file on its way (not with state_file)
+        """
+
+
+class PushbulletBackend(UploadBackend):
+    """Pushbullet's own storage, limited to 25 MB files unless given a larger max_size."""
+    name = "pushbullet"
+
+    def __init__(self, max_size: int = PUSHBULLET_MAX_SIZE, min_size: int = 0):
+        super().__init__(max_size=max_size, min_size=min_size)
+
+    async def async_upload(self, pb: AsyncPushbullet, file_path: str, file_type: str = None,
+                           show_progress: bool = True, progress: Callable[[int, int], None] = None,
+                           state_file: str = None, keep_state: bool = False, compress: str = None) -> dict:
+        if state_file is not None:
+            return await pb.async_upload_file_resumable(file_path, file_type=file_type, state_file=state_file,
+                                                        backend=self.name, keep_state=keep_state,
+                                                        show_progress=show_progress, progress=progress)
+        return await pb.async_upload_file(file_path, file_type=file_type, show_progress=show_progress,
+                                          progress=progress, compress=compress)
+
+
+class TransferShBackend(UploadBackend):
+    """The https://transfer.sh service, which takes files up to 10 GB that last two weeks."""
+    name = "transfer.sh"
+
+    def __init__(self, max_size: int = TRANSFER_SH_MAX_SIZE, min_size: int = 0):
+        super().__init__(max_size=max_size, min_size=min_size)
+
+    async def async_upload(self, pb: AsyncPushbullet, file_path: str, file_type: str = None,
+                           show_progress: bool = True, progress: Callable[[int, int], None] = None,
+                           state_file: str = None, keep_state: bool = False, compress: str = None) -> dict:
+        if state_file is not None:
+            return await pb.async_upload_file_resumable(file_path, file_type=file_type, state_file=state_file,
+                                                        backend=self.name, keep_state=keep_state,
+                                                        show_progress=show_progress, progress=progress)
+        return await pb.async_upload_file_to_transfer_sh(file_path, file_type=file_type,
+                                                         show_progress=show_progress, progress=progress,
+                                                         compress=compress)
+
+
+class HttpPutBackend(UploadBackend):
+    """Any server that stores a file sent with an HTTP PUT, such as an S3-compatible
+    bucket that allows it or a simple WebDAV or artifact server.
+
+    The upload_url may contain {file_name}, which is replaced by the (quoted) file
+    name; otherwise the name is appended as the last part of the path.  The file is
+    then expected to be downloadable from file_url, formatted the same way, or from
+    the upload URL itself if no file_url is given.  Your API key is not sent.
+    """
+
+    def __init__(self, upload_url: str, file_url: str = None,
+                 headers: Dict[str, str] = None,
+                 name: str = "http",
+                 max_size: int = None, min_size: int = 0):
+        """
+        :param upload_url: where to PUT files, optionally containing {file_name}
+        :param file_url: where the uploaded files can be downloaded, optionally containing {file_name}
+        :param headers: extra headers to send, such as authorization for your server
+        :param name: name of this backend, for logs and upload caches
+        :param max_size: largest file accepted, in bytes (None for no limit)
+        :param min_size: smallest file accepted, in bytes
+        """
+        super().__init__(max_size=max_size, min_size=min_size)
+        self.upload_url: str = upload_url
+        self.file_url: str = file_url
+        self.headers: Dict[str, str] = headers or {}
+        self.name: str = name
+
+    def url_for(self, template: str, file_name: str) -> str:
+        if "{file_name}" in template:
+            return template.format(file_name=quote(file_name))
+        return template.rstrip("/") + "/" + quote(file_name)
+
+    async def async_upload(self, pb: AsyncPushbullet, file_path: str, file_type: str = None,
+                           show_progress: bool = True, progress: Callable[[int, int], None] = None,
+                           state_file: str = None, keep_state: bool = False, compress: str = None) -> dict:
+        file_name, file_type, compress = await async_compression_plan(file_path, file_type, compress)
+        file_type = file_type or await async_get_file_type(file_path)
+        put_url = self.url_for(self.upload_url, file_name)
+        headers = {"Access-Token": "", "Content-Type": file_type}  # Keep the API key to Pushbullet
+        headers.update(self.headers)
+
+        session = await pb.aio_session()
+        with TqdmProgress() if show_progress and progress is None else _NoProgress() as bar:
+            if compress:
+                data = async_compressed_chunks(file_path, compress, progress=progress or bar)
+            else:
+                size = await asyncio.get_event_loop().run_in_executor(None, os.path.getsize, file_path)
+                data = AsyncFilePayload(file_path, progress=progress or bar, size=size, content_type=file_type)
+            async with session.put(put_url, data=data, headers=headers, proxy=pb.proxy) as resp:
+                body = await resp.read()
+                if resp.status not in (200, 201, 204):
+                    raise HttpError(resp.status, "Upload to {} failed.".format(self.name), body)
+
+        return {"file_name": file_name,
+                "file_type": file_type,
+                "file_url": self.url_for(self.file_url, file_name) if self.file_url else put_url}
+
+
+class UploadRouter:
+    """Picks the backend for each upload, before any bytes are sent.
+
+    The first backend (in the order given) that accepts the file's size is
+    chosen.  The router also measures each backend's throughput as uploads
+    complete.  If max_seconds is set and the chosen backend is expected to
+    take longer than that, the backend expected to be fastest is used
+    instead (backends not yet measured are assumed to be as fast as any).
+    """
+
+    def __init__(self, backends: List[UploadBackend] = None,
+                 max_seconds: float = None,
+                 throughput: Dict[str, float] = None,
+                 smoothing: float = 0.3):
+        """
+        :param backends: where uploads may go, preferred first (default: Pushbullet, then transfer.sh)
+        :param max_seconds: optional upload time beyond which a faster backend is preferred
+        :param throughput: optional starting estimates in bytes per second, by backend name
+        :param smoothing: weight of each new measurement in the throughput estimates
+        """
+        self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        self.backends: List[UploadBackend] = backends or [PushbulletBackend(), TransferShBackend()]
+        self.max_seconds: float = max_seconds
+        self.throughput: Dict[str, float] = dict(throughput or {})
+        self.smoothing: float = smoothing
+
+    def choose(self, size: int) -> UploadBackend:
+        """Returns the backend for a file of this many bytes, raising PushbulletError if none will take it."""
+        candidates = [b for b in self.backends if b.accepts(size)]
+        if not candidates:
+            raise PushbulletError("No upload backend accepts a file of {:,} bytes (backends: {})"
+                                  .format(size, self.backends))
+        chosen = candidates[0]
+        if self.max_seconds is not None and len(candidates) > 1:
+            estimate = self.estimate_seconds(chosen, size)
+            if estimate is not None and estimate > self.max_seconds:
+                chosen = min(candidates, key=lambda b: self.estimate_seconds(b, size) or 0)
+        return chosen
+
+    async def async_choose(self, file_path: str) -> UploadBackend:
+        """Returns the backend for a file, finding its size without blocking the event loop."""
+        size = await asyncio.get_event_loop().run_in_executor(None, os.path.getsize, file_path)
+        return self.choose(size)
+
+    def estimate_seconds(self, backend: UploadBackend, size: int) -> Optional[float]:
+        """Expected upload time for size bytes, or None if the backend has not been measured."""
+        rate = self.throughput.get(backend.name)
+        return size / rate if rate else None
+
+    def record(self, backend: UploadBackend, size: int, seconds: float):
+        """Updates the throughput estimate for a backend with one upload's size and duration."""
+        if seconds <= 0 or size <= 0:
+            return
+        rate = size / seconds
+        previous = self.throughput.get(backend.name)
+        self.throughput[backend.name] = rate if previous is None else \
+            previous + self.smoothing * (rate - previous)
+
+    async def async_upload(self, pb: AsyncPushbullet, file_path: str,
+                           file_type: str = None,
+                           backend: UploadBackend = None,
+                           show_progress: bool = True,
+                           progress: Callable[[int, int], None] = None,
+                           upload_cache: UploadCache = None,
+                           state_file: str = None,
+                           keep_state: bool = False,
+                           compress: str = None) -> dict:
+        """Uploads a file to the backend chosen for it (or the one given) and returns
+        {"file_type", "file_url", "file_name", "backend"}.
+
+        If upload_cache remembers uploading the same content to that backend,
+        nothing is uploaded.  See UploadBackend.async_upload for the other parameters.
+        """
+        size = await asyncio.get_event_loop().run_in_executor(None, os.path.getsize, file_path)
+        backend = backend or self.choose(size)
+        cache_backend = backend.name + "+" + compress if compress else backend.name
+
+        info = None
+        if upload_cache is not None:
+            info = await upload_cache.async_get(file_path, backend=cache_backend)
+            if info is not None and compress:
+                info["file_name"], _, _ = await async_compression_plan(file_path, file_type, compress)
+        if info is None:
+            if self.log.isEnabledFor(logging.INFO):
+                self.log.info("Uploading {} ({:,} bytes) to {}".format(file_path, size, backend.name))
+            start = time.monotonic()
+            info = await backend.async_upload(pb, file_path, file_type=file_type, show_progress=show_progress,
+                                              progress=progress, state_file=state_file, keep_state=keep_state,
+                                              compress=compress)
+            self.record(backend, size, time.monotonic() - start)
+            if upload_cache is not None:
+                await upload_cache.async_put(file_path, info, backend=cache_backend)
+
+        info = dict(info)
+        info["backend"] = backend.name
+        return info
+
@@ -9,7 +9,9 @@ August 2018 - Initial creation
 """
 
 import asyncio
+import json
 import logging
+import re
 import sys
 from typing import AsyncIterator, Callable
 
@@ -20,6 +22,45 @@ __email__ = "rob@iharder.net"
 __license__ = "Public Domain"
 
 
+# The per-message compression threshold and the wire byte counts reach into
+# aiohttp's private websocket writer (ws._writer and its compress and transport
+# attributes), which has kept that shape throughout aiohttp 3.x.  With any other
+# version every message is compressed and the wire counts stay None.
+AIOHTTP_VERSION = tuple(int(x) for x in re.findall(r"\d+", aiohttp.__version__)[:2])
+WRITER_INTERNALS_SUPPORTED = (3, 0) <= AIOHTTP_VERSION < (4, 0)
+
+
+def private_writer(ws):
+    """Returns the aiohttp writer behind websocket ws, or None if this version
+    of aiohttp is not known to have the one we expect."""
+    if not WRITER_INTERNALS_SUPPORTED:
+        return None
+    writer = getattr(ws, "_writer", None)
+    if writer is None or not hasattr(writer, "compress") or not hasattr(writer, "transport"):
+        return None
+    return writer
+
+
+async def send_with_threshold(ws, send: Callable, data, threshold: int):
+    """Sends data with send(ws, data), uncompressed if it is shorter than threshold.
+
+    Once permessage-deflate is negotiated, aiohttp compresses every frame and
+    has no per-message way to opt out, so compression is switched off on the
+    socket's writer just while this frame is written.  A frame sent by another
+    task in that moment may go uncompressed too, which is harmless.
+    """
+    writer = private_writer(ws)
+    if not threshold or not ws.compress or writer is None or len(data) >= threshold:
+        await send(ws, data)
+        return
+    compress = writer.compress
+    writer.compress = 0
+    try:
+        await send(ws, data)
+    finally:
+        writer.compress = compress
+
+
 class WebsocketClient():
     """A handy class for consuming websockets as a client.
 
@@ -30,17 +71,38 @@ class WebsocketClient():
 
     """
 
-    def __init__(self, url, headers=None, verify_ssl=None, proxy=None, session=None):
+    def __init__(self, url, headers=None, verify_ssl=None, proxy=None, session=None,
+                 queue_incoming: bool = True,
+                 compress: int = 0,
+                 compress_threshold: int = 0):
+        """
+        :param queue_incoming: if False, no background task reads the socket and
+            nothing is queued; the caller reads self.socket directly (async for
+            and next_msg() are unavailable in that case)
+        :param compress: offer permessage-deflate with this window size in bits
+            (9 to 15); 0, the default, leaves compression off.  The server may decline.
+        :param compress_threshold: when compression was negotiated, messages we send
+            that are shorter than this many characters/bytes go uncompressed
+        """
         self.url = url
         self.headers = headers
         self.verify_ssl = verify_ssl
         self.proxy = None if proxy is None or str(proxy).strip() == "" else str(proxy)
+        self.queue_incoming: bool = queue_incoming
+        if compress and not 9 <= compress <= 15:
+            raise ValueError("compress must be a window size from 9 to 15 bits, or 0 for none")
+        self.compress: int = compress
+        self.compress_threshold: int = compress_threshold
+        self.bytes: WebsocketByteCounter = WebsocketByteCounter()
         self._provided_session: aiohttp.ClientSession = session
         self._created_session: aiohttp.ClientSession = None
         self.socket: aiohttp.ClientWebSocketResponse = None
         self._queue: asyncio.Queue = None
         self.loop: asyncio.BaseEventLoop = None
         self.log = logging.getLogger(__name__)
+        if compress_threshold and not WRITER_INTERNALS_SUPPORTED:
+            self.log.warning("compress_threshold is not supported with aiohttp {}; every message will be compressed"
+                             .format(aiohttp.__version__))
 
     @staticmethod
     def connect(url,
@@ -113,20 +175,38 @@ class WebsocketClient():
             raise Exception("No underlying websocket to close -- has this websocket connected yet?")
         return self.socket.closed
 
+    @property
+    def compressed(self) -> bool:
+        """True if permessage-deflate was negotiated with the server."""
+        return bool(self.socket is not None and self.socket.compress)
+
     async def send_str(self, data):
         """Sends a string to the websocket server."""
-        await self.socket.send_str(str(data))
+        data = str(data)
+        self.bytes.payload_sent += len(data)
+        await send_with_threshold(self.socket, aiohttp.ClientWebSocketResponse.send_str, data,
+                                  self.compress_threshold)
         await asyncio.sleep(0)
 
     async def send_bytes(self, data):
         """Sends raw bytes to the websocket server."""
-        await self.socket.send_bytes(data)
+        self.bytes.payload_sent += len(data)
+        await send_with_threshold(self.socket, aiohttp.ClientWebSocketResponse.send_bytes, data,
+                                  self.compress_threshold)
         await asyncio.sleep(0)
 
     async def send_json(self, data):
         """Converts data to a json message and sends to the websocket server."""
-        await self.socket.send_json(data)
-        await asyncio.sleep(0)
+        await self.send_str(json.dumps(data))
+
+    async def receive(self, timeout: float = None) -> aiohttp.WSMessage:
+        """Reads the next message straight off the socket, counting its payload.
+
+        This is for callers that created the client with queue_incoming=False.
+        """
+        msg: aiohttp.WSMessage = await self.socket.receive(timeout=timeout)
+        self.bytes.count_received(msg)
+        return msg
 
     async def flush_incoming(self, timeout: float = None):
         """Flushes (throws away) all messages received to date but not yet consumed.
@@ -203,14 +283,28 @@ class WebsocketClient():
             if session is None:
                 self._created_session = await self._create_session()
                 session = self._created_session
-            self.socket = await session.ws_connect(self.url, proxy=self.proxy)
+            self.socket = await session.ws_connect(self.url, proxy=self.proxy, compress=self.compress)
             self.log.debug("Connected socket {} to {}".format(id(self.socket), self.url))
         except Exception as ex:
-            if self._provided_session:
-                await self._provided_session.close()
-                self._provided_session = None
+            if self._created_session:  # Only close session if we created it here
+                await self._created_session.close()
+                self._created_session = None
             raise ex
 
+        if self.compress:
+            if self.compressed:
+                self.log.debug("Negotiated permessage-deflate with {} window bits".format(self.socket.compress))
+            else:
+                self.log.debug("Server declined permessage-deflate")
+        # aiohttp gives no public way to reach the connection before the handshake,
+        # so bytes that arrived along with the handshake reply go uncounted
+        writer = private_writer(self.socket)
+        self.bytes.count_incoming(getattr(writer, "transport", None))
+        self.bytes.count_outgoing(writer)
+
+        if not self.queue_incoming:
+            return self  # Caller reads self.socket directly (or uses receive())
+
         # Set up listener to receive messages and put them in a queue
         async def _listen_for_messages():
             try:
@@ -218,6 +312,7 @@ class WebsocketClient():
                 # Spend time here waiting for incoming messages
                 msg: aiohttp.WSMessage
                 async for msg in self.socket:
+                    self.bytes.count_received(msg)
                     if self.log.isEnabledFor(logging.DEBUG):
                         self.log.debug("Received {}".format(msg))
                     await self._queue.put(msg)
@@ -262,3 +357,117 @@ class WebsocketClient():
                 raise StopAsyncIteration("The websocket has closed.")
 
             return await self.ws_client.next_msg(timeout=self.timeout)
+
+
+class WebsocketByteCounter:
+    """Counts websocket traffic before and after compression.
+
+    The payload counts are message bodies as the application sends and receives
+    them (characters, for text messages).  The wire counts are what actually
+    crossed the connection after the handshake, frame headers included, so
+    comparing the two shows what permessage-deflate is saving.  If the
+    connection could not be instrumented, the wire counts stay None.
+
+    A WebsocketHandler starts counting before its handshake reply, so it sees
+    every frame.  A WebsocketClient can only start once ws_connect() returns;
+    frames the server sent in the same packet as its handshake reply have
+    already been read by then and are missing from wire_received (though not
+    from payload_received).
+    """
+
+    def __init__(self):
+        self.payload_sent: int = 0
+        self.payload_received: int = 0
+        self.wire_sent: int = None
+        self.wire_received: int = None
+
+    def __str__(self):
+        return "sent {}/{} bytes, received {}/{} bytes (wire/payload)".format(
+            self.wire_sent, self.payload_sent, self.wire_received, self.payload_received)
+
+    @property
+    def received_ratio(self) -> float:
+        """Wire bytes per payload byte received, or None if unknown."""
+        if self.wire_received is None or not self.payload_received:
+            return None
+        return self.wire_received / self.payload_received
+
+    @property
+    def sent_ratio(self) -> float:
+        """Wire bytes per payload byte sent, or None if unknown."""
+        if self.wire_sent is None or not self.payload_sent:
+            return None
+        return self.wire_sent / self.payload_sent
+
+    def count_received(self, msg: aiohttp.WSMessage):
+        if msg.type == aiohttp.WSMsgType.TEXT or msg.type == aiohttp.WSMsgType.BINARY:
+            self.payload_received += len(msg.data)
+
+    def count_incoming(self, transport: asyncio.Transport):
+        """Starts counting the bytes that arrive on a transport, by wrapping its protocol.
+
+        Several connections may share one counter.
+        """
+        if transport is None:
+            return
+        try:
+            transport.set_protocol(WebsocketByteCounter._Protocol(transport.get_protocol(), self))
+        except (AttributeError, NotImplementedError):
+            logging.getLogger(__name__).debug("Cannot count wire bytes received on {}".format(transport))
+            return
+        if self.wire_received is None:
+            self.wire_received = 0
+
+    def count_outgoing(self, writer):
+        """Starts counting the bytes that an aiohttp websocket writer (from
+        private_writer()) sends, by wrapping its transport."""
+        transport = getattr(writer, "transport", None)
+        if transport is None:
+            logging.getLogger(__name__).debug("Cannot count wire bytes sent by {}".format(writer))
+            return
+        if self.wire_sent is None:
+            self.wire_sent = 0
+        writer.transport = WebsocketByteCounter._Transport(transport, self)
+
+    class _Transport:
+        """Wraps a transport to count outgoing bytes."""
+
+        def __init__(self, transport, counter):
+            self._transport = transport
+            self._counter = counter
+
+        def write(self, data):
+            self._counter.wire_sent += len(data)
+            self._transport.write(data)
+
+        def __getattr__(self, name):
+            return getattr(self._transport, name)
+
+    class _Protocol(asyncio.Protocol):
+        """Wraps a protocol to count incoming bytes."""
+
+        def __init__(self, protocol, counter):
+            self._protocol = protocol
+            self._counter = counter
+
+        def connection_made(self, transport):
+            self._protocol.connection_made(transport)
+
+        def connection_lost(self, exc):
+            self._protocol.connection_lost(exc)
+
+        def pause_writing(self):
+            self._protocol.pause_writing()
+
+        def resume_writing(self):
+            self._protocol.resume_writing()
+
+        def data_received(self, data):
+            self._counter.wire_received += len(data)
+            self._protocol.data_received(data)
+
+        def eof_received(self):
+            return self._protocol.eof_received()
+
+        def __getattr__(self, name):
+            return getattr(self._protocol, name)
@@ -8,6 +8,7 @@ June 2018 - Updated for aiohttp v3.3
 August 2018 - Updated for Python 3.7, made WebServer support multiple routes on one port
 """
 import asyncio
+import json
 import logging
 import weakref
 from functools import partial
@@ -16,6 +17,9 @@ from typing import Dict, Set, List
 import aiohttp  # pip install aiohttp
 from aiohttp import web
 
+from .websocket_client import WebsocketByteCounter, send_with_threshold, private_writer, \
+    WRITER_INTERNALS_SUPPORTED
+
 __author__ = "Robert Harder"
 __email__ = "rob@iharder.net"
 __license__ = "Public Domain"
@@ -142,13 +146,34 @@ class WebHandler:
 
 class WebsocketHandler(WebHandler):
 
-    def __init__(self, *kargs, **kwargs):
+    def __init__(self, *kargs, compress: int = 15, compress_threshold: int = 0, **kwargs):
+        """
+        :param compress: accept permessage-deflate when a client offers it, compressing
+            with at most this window size in bits (9 to 15); 0 turns compression off.
+            True and False are taken as 15 and 0.  aiohttp itself uses the window the
+            client asks for, so when ours is smaller the socket is lowered to it, which
+            any client can still decompress.
+        :param compress_threshold: broadcast messages shorter than this many
+            characters/bytes are sent uncompressed.  Messages sent directly
+            with ws.send_str() and the like are always compressed.
+        """
         super().__init__(*kargs, **kwargs)
+        self.log = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        if compress is True or compress is False:
+            compress = 15 if compress else 0
+        if compress and not 9 <= compress <= 15:
+            raise ValueError("compress must be a window size from 9 to 15 bits, or 0 for none")
+        if compress_threshold and not WRITER_INTERNALS_SUPPORTED:
+            self.log.warning("compress_threshold is not supported with aiohttp {}; every message will be compressed"
+                             .format(aiohttp.__version__))
         self.websockets: Set[web.WebSocketResponse] = weakref.WeakSet()
+        self.compress: int = compress
+        self.compress_threshold: int = compress_threshold
+        self.bytes: WebsocketByteCounter = WebsocketByteCounter()  # Totals for all clients
 
     async def broadcast_json(self, msg):
         """ Converts msg to json and broadcasts the json data to all connected clients. """
-        await self._broadcast(msg, web.WebSocketResponse.send_json)
+        await self._broadcast(json.dumps(msg), web.WebSocketResponse.send_str)
 
     async def broadcast_text(self, msg: str):
         """ Broadcasts a string to all connected clients. """
@@ -160,7 +185,8 @@ class WebsocketHandler(WebHandler):
 
     async def _broadcast(self, msg, func: callable):
         for ws in set(self.websockets):  # type: web.WebSocketResponse
-            await func(ws, msg)
+            self.bytes.payload_sent += len(msg)
+            await send_with_threshold(ws, func, msg, self.compress_threshold)
 
     async def close_websockets(self):
         """Closes all active websockets for this handler."""
@@ -172,10 +198,15 @@ class WebsocketHandler(WebHandler):
 
         This method is not meant to be overridden when subclassed.
         """
-        ws = web.WebSocketResponse()
+        ws = web.WebSocketResponse(compress=self.compress)
         self.websockets.add(ws)
         try:
+            self.bytes.count_incoming(request.transport)  # Before the handshake, so no frame is missed
             await ws.prepare(request)
+            writer = private_writer(ws)
+            if writer is not None and self.compress and writer.compress > self.compress:
+                writer.compress = self.compress  # Before the first frame creates the compressor
+            self.bytes.count_outgoing(writer)
             await self.on_websocket(route, ws)
         finally:
             self.websockets.discard(ws)
@@ -201,6 +232,7 @@ class WebsocketHandler(WebHandler):
         try:
             while not ws.closed:
                 ws_msg = await ws.receive()  # type: aiohttp.WSMessage
+                self.bytes.count_received(ws_msg)
                 await self.on_message(route=route, ws=ws, ws_msg_from_client=ws_msg)
 
                 # If you override on_websocket and have your own loop
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Measures events/sec and per-event latency through LiveStreamListener,
+comparing the default double-queue path with direct_dispatch=True.
+
+A local websocket server stands in for stream.pushbullet.com.  For
+throughput it blasts ephemerals at the listener as fast as it can.  For
+latency it sends them one at a time, PACE_SECONDS apart, each stamped with
+the time it was sent, so that the figures measure the listener rather than
+how long events sat in a backlog.
+No Pushbullet account or network access is needed.
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.append("..")  # Since examples are buried one level into source tree
+from asyncpushbullet import AsyncPushbullet, LiveStreamListener
+from asyncpushbullet.websocket_server import WebServer, WebsocketHandler
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+HOST = "127.0.0.1"
+PORT = 8765
+BLAST_ROUTE = "/blast/"
+PACED_ROUTE = "/paced/"
+NUM_EVENTS = 20000
+NUM_PACED_EVENTS = 1000
+PACE_SECONDS = 0.002
+
+
+class OfflinePushbullet(AsyncPushbullet):
+    """An AsyncPushbullet that skips verifying its key with pushbullet.com."""
+
+    async def aio_session(self):
+        if self._aio_session is None or self._aio_session.closed:
+            import aiohttp
+            self._aio_session = aiohttp.ClientSession()
+        return self._aio_session
+
+
+class SendHandler(WebsocketHandler):
+    """Sends count ephemerals to each client that connects, pace seconds apart
+    (or all at once if pace is 0)."""
+
+    def __init__(self, count: int, pace: float = 0):
+        super().__init__()
+        self.count = count
+        self.pace = pace
+
+    async def on_websocket(self, route: str, ws: web.WebSocketResponse):
+        payload = '{{"type": "push", "push": {{"type": "bench", "seq": {}, "sent": {!r}}}}}'
+        for i in range(self.count):
+            await ws.send_str(payload.format(i, time.perf_counter()))
+            if self.pace:
+                await asyncio.sleep(self.pace)
+        await ws.receive()  # Wait for client to go away
+
+
+async def receive(route: str, count: int, direct_dispatch: bool):
+    """Returns the latency of each of count events and the seconds from the first to the last."""
+    latencies = []
+    pb = OfflinePushbullet(api_key="")
+    LiveStreamListener.PUSHBULLET_WEBSOCKET_URL = "ws://{}:{}{}".format(HOST, PORT, route)
+    try:
+        async with LiveStreamListener(pb, types=("ephemeral",), direct_dispatch=direct_dispatch) as lsl:
+            start = None
+            async for msg in lsl:
+                now = time.perf_counter()
+                start = start or now
+                latencies.append(now - msg["push"]["sent"])
+                if len(latencies) >= count:
+                    break
+            elapsed = time.perf_counter() - start
+    finally:
+        await pb.async_close()
+    return latencies, elapsed
+
+
+async def run_once(direct_dispatch: bool) -> dict:
+    _, elapsed = await receive(BLAST_ROUTE, NUM_EVENTS, direct_dispatch)
+    latencies, _ = await receive(PACED_ROUTE, NUM_PACED_EVENTS, direct_dispatch)
+    latencies.sort()
+    return {"events/sec": NUM_EVENTS / elapsed if elapsed else float("inf"),
+            "median_us": statistics.median(latencies) * 1e6,
+            "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6}
+
+
+async def main():
+    server = WebServer(host=HOST, port=PORT)
+    server.add_route(BLAST_ROUTE, SendHandler(NUM_EVENTS))
+    server.add_route(PACED_ROUTE, SendHandler(NUM_PACED_EVENTS, pace=PACE_SECONDS))
+    await server.start()
+    try:
+        print("{:<16} {:>12} {:>12} {:>12}".format("mode", "events/sec", "median us", "p99 us"))
+        for direct in (False, True):
+            result = await run_once(direct)
+            print("{:<16} {:>12,.0f} {:>12,.1f} {:>12,.1f}".format(
+                "direct" if direct else "double queue",
+                result["events/sec"], result["median_us"], result["p99_us"]))
+    finally:
+        await server.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Measures the per-event CPU spent in LiveStreamListener's hot paths with
+logging at INFO, and how much of that the old eager debug formatting cost.
+
+The listener used to run lines like
+
+    self.log.debug("WebSocket message: {}".format(msg.data))
+
+for every event, building a string of the whole message (a mirrored
+notification carries a base64 icon, so several kilobytes) even though
+nothing was logged.  The debug lines are now guarded, and this script
+times the current path against the eager formatting it avoids.
+
+No Pushbullet account or network access is needed.
+"""
+import asyncio
+import base64
+import json
+import logging
+import os
+import sys
+import time
+
+import aiohttp
+
+sys.path.append("..")  # Since examples are buried one level into source tree
+from asyncpushbullet import AsyncPushbullet, LiveStreamListener
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+NUM_EVENTS = 20000
+
+
+def make_mirror_message() -> aiohttp.WSMessage:
+    push = {"type": "mirror", "title": "New message", "body": "Are we still on for lunch? " * 4,
+            "application_name": "Messages", "package_name": "com.example.messages",
+            "notification_id": "1234", "source_device_iden": "ujpah72o0sjAoRtnM0jc",
+            "icon": base64.b64encode(os.urandom(3000)).decode()}
+    data = json.dumps({"type": "push", "push": push})
+    return aiohttp.WSMessage(aiohttp.WSMsgType.TEXT, data, None)
+
+
+def make_pushes(n: int):
+    return [{"iden": "ujpah72o0sjAoRtnM0jc{}".format(i), "type": "note", "active": True,
+             "dismissed": False, "modified": 1500000000.0 + i, "title": "Build finished",
+             "body": "All {} tests passed\n".format(i) * 20} for i in range(n)]
+
+
+async def time_listener(msg: aiohttp.WSMessage, pushes) -> dict:
+    """Per-event CPU through the websocket message and push acceptance paths."""
+    pb = AsyncPushbullet(api_key="")
+    lsl = LiveStreamListener(pb, types=("ephemeral", "push"))
+    lsl._queue = asyncio.Queue()  # Stand in for __aenter__, which would connect
+
+    start = time.process_time()
+    for _ in range(NUM_EVENTS):
+        await lsl._process_websocket_message(msg)
+        lsl._queue.get_nowait()
+    ws_cpu = (time.process_time() - start) / NUM_EVENTS
+
+    start = time.process_time()
+    await lsl._accept_pushes(pushes)
+    while not lsl._queue.empty():
+        lsl._queue.get_nowait()
+    push_cpu = (time.process_time() - start) / len(pushes)
+
+    return {"websocket message": ws_cpu, "accepted push": push_cpu}
+
+
+def time_eager_formatting(msg: aiohttp.WSMessage, pushes) -> dict:
+    """Per-event CPU of the debug lines as they used to run, unguarded."""
+    log = logging.getLogger(LiveStreamListener.__module__ + "." + LiveStreamListener.__name__)
+
+    start = time.process_time()
+    for _ in range(NUM_EVENTS):
+        log.debug("WebSocket message: {}".format(msg.data))
+    ws_cpu = (time.process_time() - start) / NUM_EVENTS
+
+    start = time.process_time()
+    for push in pushes:
+        log.debug("Adding to push queue: {}".format(push))
+    push_cpu = (time.process_time() - start) / len(pushes)
+
+    return {"websocket message": ws_cpu, "accepted push": push_cpu}
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    msg = make_mirror_message()
+    pushes = make_pushes(NUM_EVENTS)
+    print("Message size: {:,} characters; push size: {:,} characters".format(
+        len(msg.data), len(json.dumps(pushes[0]))))
+
+    now = await time_listener(msg, pushes)
+    saved = time_eager_formatting(msg, pushes)
+
+    print("{:<20} {:>12} {:>16} {:>8}".format("path", "now us", "eager saved us", "saved"))
+    for path in now:
+        before = now[path] + saved[path]
+        print("{:<20} {:>12.2f} {:>16.2f} {:>7.0f}%".format(
+            path, now[path] * 1e6, saved[path] * 1e6, 100 * saved[path] / before))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Measures what each account costs a MultiAccountStreamManager: resident memory,
+open file descriptors, and REST requests made while connecting.
+
+A local server stands in for stream.pushbullet.com and the /pushes endpoint.
+Both ends of every websocket live in this process, so the open fd figure
+counts two sockets per account.  No Pushbullet account or network access is
+needed.  Memory and fd figures come from /proc and so need Linux; elsewhere
+only the peak RSS from the resource module is shown.
+
+Usage: benchmark_multi_account.py [number of accounts]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.append("..")  # Since examples are buried one level into source tree
+from asyncpushbullet import AsyncPushbullet, LiveStreamListener, MultiAccountStreamManager
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+
+HOST = "127.0.0.1"
+PORT = 8766
+NUM_ACCOUNTS = 200
+
+
+class StandInStream:
+    """Accepts a websocket for any API key and counts GET /pushes requests."""
+
+    def __init__(self):
+        self.websockets = 0
+        self.push_requests = 0
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/websocket/{key:.*}", self.on_websocket)
+        app.router.add_get("/pushes", self.on_pushes)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, HOST, PORT).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def on_websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.websockets += 1
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            self.websockets -= 1
+        return ws
+
+    async def on_pushes(self, request):
+        self.push_requests += 1
+        return web.json_response({"pushes": []})
+
+
+def rss_kb() -> int:
+    """Current resident set size in KB, or the peak if /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def open_fds() -> int:
+    return len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None
+
+
+async def main(num_accounts: int):
+    server = StandInStream()
+    await server.start()
+    LiveStreamListener.PUSHBULLET_WEBSOCKET_URL = "ws://{}:{}/websocket/".format(HOST, PORT)
+    AsyncPushbullet.PUSH_URL = "http://{}:{}/pushes".format(HOST, PORT)
+    accounts = {"account{}".format(i): "key{}".format(i) for i in range(num_accounts)}
+    try:
+        rss_before, fds_before = rss_kb(), open_fds()
+        start = time.perf_counter()
+        async with MultiAccountStreamManager(accounts, stagger=0, max_concurrent_connects=50) as mgr:
+            while mgr.stats()["connected"] < num_accounts:
+                await asyncio.sleep(0.05)
+            elapsed = time.perf_counter() - start
+            rss_after, fds_after = rss_kb(), open_fds()
+
+        print("accounts connected:      {:,} in {:.2f}s".format(num_accounts, elapsed))
+        print("GET /pushes on connect:  {:,}".format(server.push_requests))
+        print("RSS per account:         {:,.1f} KB".format((rss_after - rss_before) / num_accounts))
+        if fds_before is not None:
+            print("open fds per account:    {:,.2f} (both ends of each websocket)"
+                  .format((fds_after - fds_before) / num_accounts))
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_ACCOUNTS
+    asyncio.get_event_loop().run_until_complete(main(count))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Demonstrates how to save the files that arrive in file pushes.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.append("..")  # Since examples are buried one level into source tree
+from asyncpushbullet import AsyncPushbullet, LiveStreamListener
+
+__author__ = 'Robert Harder'
+__email__ = "rob@iharder.net"
+
+API_KEY = ""  # YOUR API KEY
+PROXY = os.environ.get("https_proxy") or os.environ.get("http_proxy")
+DOWNLOAD_FOLDER = "downloads"
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(save_file_pushes())
+
+
+async def save_file_pushes():
+    os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
+    async with AsyncPushbullet(API_KEY, proxy=PROXY) as pb:
+        async with LiveStreamListener(pb) as lsl:
+            print("Awaiting file pushes...")
+            async for push in lsl:
+                if push.get("type") == "file":
+                    # Download in the background so the next push need not wait
+                    asyncio.get_event_loop().create_task(save_file(pb, push))
+
+
+async def save_file(pb: AsyncPushbullet, push: dict):
+    try:
+        path = await pb.async_download_file(push, DOWNLOAD_FOLDER)
+        print("Saved", path)
+    except Exception as ex:
+        print("Could not download {}: {}".format(push.get("file_name"), ex), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    if API_KEY == "":
+        with open("../api_key.txt") as f:
+            API_KEY = f.read().strip()
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Quitting")
+        pass
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Example of a long-running script for pblisten --exec with --exec-workers.
+
+    pblisten --exec python3 respond_to_listen_exec_workers.py --exec-workers 2
+
+The script is started once and then handed one push at a time, each as a line
+of JSON on stdin.  It answers each with a line of JSON on stdout carrying the
+same id, so it pays its startup cost once rather than once per push.
+"""
+import json
+import sys
+
+
+def respond(push: dict) -> dict:
+    body = push.get("body", "")
+    return {"title": "Got your push", "body": "It was {} characters long".format(len(body))}
+
+
+def main():
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            answer = {"id": request["id"], "response": respond(request["push"])}
+        except Exception as ex:
+            answer = {"id": request["id"], "error": str(ex)}
+        print(json.dumps(answer), flush=True)  # Flush, or pblisten will wait for the answer
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+A local stand-in for pushbullet.com's live stream websocket and the REST calls
+that listeners make, for tests that need no account or network access.
+"""
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+from asyncpushbullet import AsyncPushbullet, LiveStreamListener
+
+
+class StandInPushbullet:
+    """Serves /websocket/<api key> and /pushes on 127.0.0.1.
+
+    While running, LiveStreamListener.PUSHBULLET_WEBSOCKET_URL and
+    AsyncPushbullet.PUSH_URL point here, so listeners, stream hubs and account
+    managers all talk to it.
+    """
+
+    def __init__(self, port: int):
+        self.port = port
+        self.base_url = "http://127.0.0.1:{}".format(port)
+        self.pushes = []  # What GET /pushes answers with (those modified after the request's modified_after)
+        self.push_requests = 0
+        self.websockets = []  # Open websockets, in the order they connected
+        self.connects = []  # API key of each websocket connection, in order
+        self.invalid_keys = set()  # Websockets for these keys are refused with 401
+        self.failing_keys = set()  # Websockets for these keys are refused with 503
+        self.hold_pushes = None  # If set to an asyncio.Event, GET /pushes waits for it
+        self.runner = None
+        self._original_urls = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/websocket/{key:.*}", self.on_websocket)
+        app.router.add_get("/pushes", self.on_pushes)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", self.port).start()
+        self._original_urls = LiveStreamListener.PUSHBULLET_WEBSOCKET_URL, AsyncPushbullet.PUSH_URL
+        LiveStreamListener.PUSHBULLET_WEBSOCKET_URL = "ws://127.0.0.1:{}/websocket/".format(self.port)
+        AsyncPushbullet.PUSH_URL = self.base_url + "/pushes"
+
+    async def stop(self):
+        LiveStreamListener.PUSHBULLET_WEBSOCKET_URL, AsyncPushbullet.PUSH_URL = self._original_urls
+        await self.drop_websockets()
+        await self.runner.cleanup()
+
+    def account(self, api_key: str = "key", **kwargs) -> AsyncPushbullet:
+        """Returns an AsyncPushbullet that talks to this server."""
+        return AsyncPushbullet(api_key, verify_on_connect=False, **kwargs)
+
+    def new_push(self, **fields) -> dict:
+        """Adds a push, modified now, to what GET /pushes returns."""
+        push = {"iden": "push{}".format(len(self.pushes)), "type": "note", "active": True,
+                "dismissed": False, "modified": time.time()}
+        push.update(fields)
+        self.pushes.append(push)
+        return push
+
+    async def send(self, msg: dict):
+        """Sends msg to every open websocket."""
+        for ws in list(self.websockets):
+            await ws.send_str(json.dumps(msg))
+
+    async def tickle(self, **push_fields) -> dict:
+        """Adds a push and sends a push tickle about it."""
+        push = self.new_push(**push_fields)
+        await self.send({"type": "tickle", "subtype": "push"})
+        return push
+
+    async def drop_websockets(self):
+        for ws in list(self.websockets):
+            await ws.close()
+
+    async def wait_for_websockets(self, count: int, timeout: float = 5):
+        """Waits until count websockets are open."""
+        deadline = time.monotonic() + timeout
+        while len(self.websockets) < count:
+            if time.monotonic() > deadline:
+                raise asyncio.TimeoutError("Only {} of {} websockets connected".format(len(self.websockets), count))
+            await asyncio.sleep(0.01)
+
+    async def on_websocket(self, request):
+        key = request.match_info["key"]
+        if key in self.invalid_keys:
+            return web.Response(status=401)
+        if key in self.failing_keys:
+            return web.Response(status=503)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connects.append(key)
+        self.websockets.append(ws)
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            self.websockets.remove(ws)
+        return ws
+
+    async def on_pushes(self, request):
+        self.push_requests += 1
+        if self.hold_pushes is not None:
+            await self.hold_pushes.wait()
+        modified_after = float(request.query.get("modified_after", 0))
+        return web.json_response({"pushes": [p for p in reversed(self.pushes) if p["modified"] > modified_after]})
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+from aiohttp import web
+
+from asyncpushbullet import AsyncPushbullet, errors
+from asyncpushbullet.command_line_push import _transfer_files
+from asyncpushbullet.upload_router import PushbulletBackend, UploadRouter
+
+PORT = 18739
+
+
+class StandInUploads:
+    """Plays pushbullet.com's upload-request, upload and push endpoints, noting how many uploads overlap."""
+
+    def __init__(self, port: int):
+        self.base_url = "http://127.0.0.1:{}".format(port)
+        self.port = port
+        self.uploaded = {}  # File name -> bytes received
+        self.pushed = []
+        self.uploading = 0
+        self.most_uploading = 0
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/upload-request", self.on_upload_request)
+        app.router.add_post("/upload/{name}", self.on_upload)
+        app.router.add_post("/pushes", self.on_push)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", self.port).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def on_upload_request(self, request):
+        data = await request.post()
+        name = data["file_name"]
+        return web.json_response({"file_name": name, "file_type": data["file_type"],
+                                  "upload_url": self.base_url + "/upload/" + name,
+                                  "file_url": "https://files.example/" + name})
+
+    async def on_upload(self, request):
+        self.uploading += 1
+        self.most_uploading = max(self.most_uploading, self.uploading)
+        try:
+            data = await request.post()
+            await asyncio.sleep(0.1)  # Long enough for uploads to overlap
+            self.uploaded[request.match_info["name"]] = data["file"].file.read()
+        finally:
+            self.uploading -= 1
+        return web.Response(status=204)
+
+    async def on_push(self, request):
+        self.pushed.append(dict(await request.post()))
+        return web.json_response({"iden": "push{}".format(len(self.pushed))})
+
+
+class TestTransferFiles:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = StandInUploads(PORT)
+        self.loop.run_until_complete(self.server.start())
+        self.pb = AsyncPushbullet("key", verify_on_connect=False)
+        self.pb.UPLOAD_REQUEST_URL = self.server.base_url + "/upload-request"
+        self.pb.PUSH_URL = self.server.base_url + "/pushes"
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self, method):
+        self.loop.run_until_complete(self.pb.async_close())
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        shutil.rmtree(self.temp_dir)
+
+    def make_files(self, count: int) -> list:
+        paths = []
+        for n in range(count):
+            path = os.path.join(self.temp_dir, "file{}.txt".format(n))
+            with open(path, "wb") as f:
+                f.write("contents of file {}\n".format(n).encode() * (n + 1))
+            paths.append(path)
+        return paths
+
+    def transfer(self, file_paths, jobs) -> int:
+        router = UploadRouter([PushbulletBackend()])
+        return self.loop.run_until_complete(asyncio.wait_for(
+            _transfer_files(self.pb, file_paths, jobs=jobs, quiet=True, router=router), 10))
+
+    def test_jobs_upload_and_push_every_file(self):
+        paths = self.make_files(6)
+        assert self.transfer(paths, jobs=2) == errors.__EXIT_NO_ERROR__
+        for path in paths:
+            name = os.path.basename(path)
+            with open(path, "rb") as f:
+                assert self.server.uploaded[name] == f.read()
+        assert sorted(p["file_name"] for p in self.server.pushed) == sorted(os.path.basename(p) for p in paths)
+        assert all(p["type"] == "file" for p in self.server.pushed)
+        assert self.server.most_uploading == 2
+
+    def test_missing_file_does_not_stop_the_others(self):
+        paths = self.make_files(3)
+        missing = os.path.join(self.temp_dir, "missing.txt")
+        assert self.transfer(paths[:1] + [missing] + paths[1:], jobs=3) == errors.__ERR_FILE_NOT_FOUND__
+        assert len(self.server.pushed) == 3
+        assert "missing.txt" not in self.server.uploaded
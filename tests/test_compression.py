@@ -0,0 +1,137 @@
+import asyncio
+import gzip
+import os
+import shutil
+import tempfile
+
+from aiohttp import web
+
+from asyncpushbullet import AsyncPushbullet
+from asyncpushbullet.compression import async_compressed_chunks, async_compressed_spool, async_compression_plan, \
+    should_compress
+
+PORT = 18740
+
+
+class TestCompression:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "build.log")
+        self.data = b"".join(b"line %d: all is well\n" % i for i in range(50000))
+        with open(self.path, "wb") as f:
+            f.write(self.data)
+        self.loop = asyncio.new_event_loop()
+
+    def teardown_method(self, method):
+        self.loop.close()
+        shutil.rmtree(self.dir)
+
+    def test_should_compress(self):
+        assert should_compress("text/plain")
+        assert should_compress("application/json; charset=utf-8")
+        assert should_compress("image/svg+xml")
+        assert not should_compress("image/png")
+        assert not should_compress("video/mp4")
+        assert not should_compress("application/zip")
+
+    def test_gzip_round_trip(self):
+        seen = []
+
+        async def _compress():
+            return [c async for c in async_compressed_chunks(self.path, "gzip", chunk_size=65536,
+                                                             progress=lambda d, t: seen.append((d, t)))]
+
+        chunks = self.loop.run_until_complete(_compress())
+        compressed = b"".join(chunks)
+        assert gzip.decompress(compressed) == self.data
+        assert len(compressed) < len(self.data) / 4
+        assert seen[-1] == (len(self.data), len(self.data))
+
+    def test_spool_round_trip(self):
+        spool, size = self.loop.run_until_complete(async_compressed_spool(self.path, "gzip", max_memory=1024))
+        try:
+            assert spool._rolled  # Larger than max_memory, so on disk
+            compressed = spool.read()
+            assert len(compressed) == size
+            assert gzip.decompress(compressed) == self.data
+        finally:
+            spool.close()
+
+    def test_plan(self):
+        plan = self.loop.run_until_complete(async_compression_plan(self.path, "text/plain", "gzip"))
+        assert plan == ("build.log.gz", "application/gzip", "gzip")
+        plan = self.loop.run_until_complete(async_compression_plan(self.path, "image/png", "gzip"))
+        assert plan == ("build.log", "image/png", None)
+        plan = self.loop.run_until_complete(async_compression_plan(self.path, "text/plain", None))
+        assert plan == ("build.log", "text/plain", None)
+
+
+class StandInUploadUrl:
+    """Plays pushbullet.com's upload-request endpoint and an upload URL that, like
+    the storage behind it, refuses bodies without a Content-Length."""
+
+    def __init__(self, port: int):
+        self.base_url = "http://127.0.0.1:{}".format(port)
+        self.port = port
+        self.uploads = []  # (file name, file type, bytes) of each upload
+        self.runner = None
+
+    async def start(self):
+        app = web.Application(client_max_size=1 << 24)
+        app.router.add_post("/upload-request", self.on_upload_request)
+        app.router.add_post("/upload", self.on_upload)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", self.port).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def on_upload_request(self, request):
+        data = await request.post()
+        return web.json_response({"file_type": data["file_type"], "upload_url": self.base_url + "/upload",
+                                  "file_url": "https://files.example/" + data["file_name"]})
+
+    async def on_upload(self, request):
+        if request.content_length is None:
+            return web.Response(status=411)
+        data = await request.post()
+        field = data["file"]
+        self.uploads.append((field.filename, field.content_type, field.file.read()))
+        return web.Response(status=204)
+
+
+class TestCompressedUpload:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "build.log")
+        self.data = b"".join(b"line %d: all is well\n" % i for i in range(50000))
+        with open(self.path, "wb") as f:
+            f.write(self.data)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = StandInUploadUrl(PORT)
+        self.loop.run_until_complete(self.server.start())
+        self.pb = AsyncPushbullet("key", verify_on_connect=False)
+        self.pb.UPLOAD_REQUEST_URL = self.server.base_url + "/upload-request"
+
+    def teardown_method(self, method):
+        self.loop.run_until_complete(self.pb.async_close())
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        shutil.rmtree(self.dir)
+
+    def test_compressed_upload_has_length(self):
+        seen = []
+        info = self.loop.run_until_complete(asyncio.wait_for(
+            self.pb.async_upload_file(self.path, file_type="text/plain", compress="gzip",
+                                      progress=lambda sent, total: seen.append((sent, total))), 10))
+        assert info["file_name"] == "build.log.gz"
+        assert info["file_type"] == "application/gzip"
+        file_name, file_type, body = self.server.uploads[0]
+        assert (file_name, file_type) == ("build.log.gz", "application/gzip")
+        assert gzip.decompress(body) == self.data
+        assert seen[-1] == (len(body), len(body))
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+from aiohttp import web
+
+from asyncpushbullet import AsyncPushbullet
+from asyncpushbullet import download
+
+PORT = 18732
+BASE_URL = "http://127.0.0.1:{}".format(PORT)
+
+
+class StandInFileServer:
+    """Serves files the way pushbullet's file URLs do, and notes what each request looked like."""
+
+    def __init__(self, data):
+        self.data = data
+        self.active = 0
+        self.most_active = 0
+        self.access_tokens = []  # Access-Token header of each request, None if there was none
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/files/{name}", self.on_get)
+        app.router.add_get("/short/{name}", self.on_get_short)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", PORT).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def on_get(self, request):
+        self.access_tokens.append(request.headers.get("Access-Token"))
+        self.active += 1
+        self.most_active = max(self.most_active, self.active)
+        try:
+            await asyncio.sleep(0.05)
+            return web.Response(body=self.data)
+        finally:
+            self.active -= 1
+
+    async def on_get_short(self, request):
+        # Promise more than is sent, as a dropped connection would
+        resp = web.StreamResponse(headers={"Content-Length": str(len(self.data) + 10)})
+        await resp.prepare(request)
+        await resp.write(self.data)
+        request.transport.close()
+        return resp
+
+
+class TestDownload:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.data = os.urandom(300000)
+        self.loop = asyncio.new_event_loop()
+        self.server = StandInFileServer(self.data)
+        self.loop.run_until_complete(self.server.start())
+        self.pb = AsyncPushbullet("secret", verify_on_connect=False)
+        self.push = {"type": "file", "file_name": "photo.jpg", "file_url": BASE_URL + "/files/abc.jpg"}
+
+    def teardown_method(self, method):
+        self.loop.run_until_complete(self.pb.async_close())
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+        shutil.rmtree(self.dir)
+
+    def test_download_to_folder(self):
+        path = self.loop.run_until_complete(self.pb.async_download_file(self.push, self.dir, chunk_size=65536))
+        assert path == os.path.join(self.dir, "photo.jpg")
+        with open(path, "rb") as f:
+            assert f.read() == self.data
+        assert self.server.access_tokens == [None]  # The API key stays with pushbullet.com
+
+    def test_iterate_bytes(self):
+        async def _read():
+            return b"".join([chunk async for chunk in self.pb.download_file_asynciter(self.push["file_url"])])
+
+        assert self.loop.run_until_complete(_read()) == self.data
+
+    def test_concurrent_downloads_capped(self):
+        async def _download_many():
+            await asyncio.gather(*[self.pb.async_download_file(self.push, os.path.join(self.dir, str(i)))
+                                   for i in range(download.MAX_CONCURRENT_DOWNLOADS * 3)])
+
+        self.loop.run_until_complete(_download_many())
+        assert self.server.most_active == download.MAX_CONCURRENT_DOWNLOADS
+
+    def test_short_download_leaves_no_file(self):
+        push = {"file_name": "photo.jpg", "file_url": BASE_URL + "/short/abc.jpg"}
+        with pytest.raises(Exception):
+            self.loop.run_until_complete(self.pb.async_download_file(push, self.dir))
+        assert os.listdir(self.dir) == []
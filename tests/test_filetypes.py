@@ -1,5 +1,7 @@
 from __future__ import print_function
 
+import asyncio
+
 from asyncpushbullet import filetype
 
 
@@ -17,3 +19,40 @@ class TestFiletypes:
         filename = 'tests/test.png'
         output = filetype._guess_file_type(filename)
         assert output == 'image/png'
+
+
+class TestFileTypeDetector:
+
+    def setup_method(self, method):
+        self.calls = []
+        self.original = filetype.get_file_type
+
+        def _counting_get_file_type(path):
+            self.calls.append(path)
+            return filetype._guess_file_type(path)
+
+        filetype.get_file_type = _counting_get_file_type
+        self.detector = filetype.FileTypeDetector(max_entries=1)
+        self.loop = asyncio.new_event_loop()
+
+    def teardown_method(self, method):
+        filetype.get_file_type = self.original
+        self.loop.close()
+
+    def detect(self, path, **kwargs):
+        return self.loop.run_until_complete(self.detector.async_get_file_type(path, **kwargs))
+
+    def test_detects_once(self):
+        assert self.detect('tests/test.png') == 'image/png'
+        assert self.detect('tests/test.png') == 'image/png'
+        assert len(self.calls) == 1
+
+    def test_bounded(self):
+        self.detect('tests/test.png')
+        self.detect('tests/test_filetypes.py')
+        self.detect('tests/test.png')
+        assert len(self.calls) == 3
+
+    def test_fast_needs_no_file(self):
+        assert self.detect('no/such/file.png', fast=True) == 'image/png'
+        assert self.calls == []
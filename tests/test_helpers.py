@@ -0,0 +1,49 @@
+from __future__ import print_function
+
+from asyncpushbullet.helpers import BoundedExpiringSet
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBoundedExpiringSet:
+
+    def setup_method(self, method):
+        self.timer = FakeTimer()
+        self.idens = BoundedExpiringSet(maxlen=3, ttl=10, timer=self.timer)
+
+    def test_membership(self):
+        self.idens.add("a")
+        assert "a" in self.idens
+        assert "b" not in self.idens
+
+    def test_bounded_evicts_oldest(self):
+        for iden in ("a", "b", "c", "d"):
+            self.idens.add(iden)
+        assert len(self.idens) == 3
+        assert "a" not in self.idens
+        assert "d" in self.idens
+
+    def test_expires(self):
+        self.idens.add("a")
+        self.timer.now = 5
+        self.idens.add("b")
+        self.timer.now = 11
+        assert "a" not in self.idens
+        assert "b" in self.idens
+        assert len(self.idens) == 1
+
+    def test_re_adding_refreshes(self):
+        self.idens.add("a")
+        self.idens.add("b")
+        self.idens.add("c")
+        self.idens.add("a")
+        self.idens.add("d")
+        assert "a" in self.idens
+        assert "b" not in self.idens
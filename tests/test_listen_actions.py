@@ -0,0 +1,466 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import pytest
+
+from asyncpushbullet.command_line_listen import Action, ActionWorkerPool, ExecutableAction, \
+    ExecutableActionPython, ExecutableActionSimplified, ListenApp, ProcessPoolAction
+
+
+class SlowAction(Action):
+
+    def __init__(self):
+        super().__init__()
+        self.running = 0
+        self.max_running = 0
+        self.handled = []
+        self.release = asyncio.Event()
+
+    async def on_push(self, push, pb):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.release.wait()
+            self.handled.append(push["n"])
+        finally:
+            self.running -= 1
+
+
+class TestActionWorkerPool:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def teardown_method(self, method):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_pool(self, overflow, pushes=20, workers=3, queue_size=5):
+        action = SlowAction()
+        pool = ActionWorkerPool(lambda a, p: a.on_push(p, None), workers=workers, queue_size=queue_size,
+                                overflow=overflow)
+        pool.add_action(action)
+
+        async def _run():
+            if overflow == "block":
+                feeder = asyncio.ensure_future(self._feed(pool, pushes))
+                await asyncio.sleep(0.05)
+                assert not feeder.done()  # Stalled on the full queue
+                action.release.set()
+                await feeder
+            else:
+                await self._feed(pool, pushes)
+                await asyncio.sleep(0.05)
+                action.release.set()
+            await pool.join()
+            await pool.close()
+
+        self.loop.run_until_complete(_run())
+        return action, pool.stats()[repr(action)]
+
+    async def _feed(self, pool, count):
+        for n in range(count):
+            await pool.submit({"n": n})
+            await asyncio.sleep(0)  # As if waiting on the websocket
+
+    def test_block(self):
+        action, stats = self.run_pool("block")
+        assert action.max_running == 3
+        assert sorted(action.handled) == list(range(20))
+        assert stats["completed"] == 20
+        assert stats["dropped"] == 0
+        assert stats["max_queue_depth"] == 5
+
+    def test_drop_oldest(self):
+        action, stats = self.run_pool("drop_oldest")
+        assert action.max_running == 3
+        assert stats["dropped"] == 12
+        assert sorted(action.handled) == [0, 1, 2] + list(range(15, 20))  # 0-2 were already with workers
+
+    def test_drop_newest(self):
+        action, stats = self.run_pool("drop_newest")
+        assert stats["dropped"] == 12
+        assert sorted(action.handled) == list(range(8))
+
+
+WORKER_SCRIPT = """
+import json, os, subprocess, sys, time
+for line in sys.stdin:
+    request = json.loads(line)
+    body = request["push"]["body"]
+    if body == "crash":
+        sys.exit(3)
+    if body == "crash leaving stdout open":
+        subprocess.Popen([sys.executable, "-c", "import time; time.sleep(1)"], stdout=sys.stdout)
+        sys.exit(3)
+    if body == "slow":
+        time.sleep(1)
+    if body.startswith("big:"):
+        body = "x" * int(body[4:])
+    print(json.dumps({"id": request["id"], "response": {"title": str(os.getpid()), "body": body}}), flush=True)
+"""
+
+
+class FakePushbullet:
+
+    def __init__(self):
+        self.notes = []
+
+    async def async_push_note(self, title=None, body=None, **kwargs):
+        self.notes.append((title, body))
+
+
+class TestPersistentWorkers:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pb = FakePushbullet()
+        self.action = ExecutableAction(sys.executable, ["-c", WORKER_SCRIPT], loop=self.loop, timeout=10,
+                                       persistent_workers=2)
+
+    def teardown_method(self, method):
+        self.loop.run_until_complete(self.action.close())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def push(self, body):
+        return self.loop.run_until_complete(self.action.on_push({"body": body}, self.pb))
+
+    def test_reuses_processes(self):
+        async def _run():
+            await asyncio.gather(*[self.action.on_push({"body": str(n)}, self.pb) for n in range(20)])
+
+        self.loop.run_until_complete(_run())
+        assert sorted(body for _, body in self.pb.notes) == sorted(str(n) for n in range(20))
+        assert len(set(title for title, _ in self.pb.notes)) == 2  # Two worker processes answered them all
+
+    def test_restarts_crashed_worker(self):
+        self.action.persistent_workers = 1
+        self.push("before")
+        with pytest.raises(ChildProcessError):
+            self.push("crash")
+        self.push("after")
+        assert [body for _, body in self.pb.notes] == ["before", "after"]
+        assert self.action.restarts == 1
+
+    def test_old_process_does_not_fail_new_pushes(self):
+        # The crashed worker's stdout stays open until its own child exits, a second
+        # later, by which time "slow" has been sent to the restarted worker
+        self.action.persistent_workers = 1
+        self.action.timeout = 0.5
+        with pytest.raises(asyncio.TimeoutError):
+            self.push("crash leaving stdout open")
+        self.action.timeout = 10
+        self.push("slow")
+        assert [body for _, body in self.pb.notes] == ["slow"]
+
+    def test_long_responses(self):
+        self.push("big:200000")  # Beyond asyncio's default 64 KiB line limit
+        assert len(self.pb.notes[0][1]) == 200000
+
+    def test_too_long_response_restarts_worker(self):
+        self.action.persistent_workers = 1
+        self.action.response_line_limit = 100000
+        self.push("before")
+        with pytest.raises(ChildProcessError):
+            self.push("big:200000")
+        self.push("after")
+        assert [body for _, body in self.pb.notes] == ["before", "after"]
+        assert self.action.restarts == 1
+
+
+SLEEP_SCRIPT = """
+import os, sys, time
+with open(sys.argv[1], "w") as f:
+    f.write(str(os.getpid()))
+time.sleep(30)
+"""
+
+
+class TestProcessTimeout:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pb = FakePushbullet()
+        self.dir = tempfile.mkdtemp()
+        self.pid_file = os.path.join(self.dir, "pid")
+
+    def teardown_method(self, method):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        shutil.rmtree(self.dir)
+
+    def call_on_push(self, action_timeout, listener_timeout):
+        """Runs the sleeping script through ListenApp and returns its process id."""
+        action = ExecutableAction(sys.executable, ["-c", SLEEP_SCRIPT, self.pid_file], loop=self.loop,
+                                  timeout=action_timeout)
+        app = ListenApp("key", timeout=listener_timeout)
+        app._account = app._wrapped_account = self.pb
+        self.loop.run_until_complete(asyncio.wait_for(app._call_on_push(action, {"body": "sleep"}), 10))
+        with open(self.pid_file) as f:
+            return int(f.read())
+
+    def test_timed_out_process_is_stopped(self):
+        pid = self.call_on_push(action_timeout=1, listener_timeout=1)
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+        assert len(self.pb.notes) == 1
+        assert self.pb.notes[0][1].startswith("Execution timed out")  # The action's own timeout, not the listener's
+
+    def test_cancelled_process_is_stopped(self):
+        pid = self.call_on_push(action_timeout=None, listener_timeout=1)
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+        assert "timed out" in self.pb.notes[0][1]
+
+
+BATCH_SCRIPT = """
+import json, sys
+pushes = json.load(sys.stdin)
+print(json.dumps([{"title": str(len(pushes)), "body": p["body"]} for p in pushes]))
+"""
+
+SIMPLE_BATCH_SCRIPT = """
+import sys
+lines = sys.stdin.read().splitlines()
+for title, body in zip(lines[::2], lines[1::2]):
+    print(title.upper())
+    print(body)
+"""
+
+
+class TestBatches:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pb = FakePushbullet()
+
+    def teardown_method(self, method):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def send(self, action, pushes, spacing=0.0):
+        async def _run():
+            tasks = []
+            for push in pushes:
+                tasks.append(asyncio.ensure_future(action.on_push(push, self.pb)))
+                await asyncio.sleep(spacing)
+            await asyncio.gather(*tasks)
+            await asyncio.sleep(0.1)  # Responses are pushed from the process loop
+
+        self.loop.run_until_complete(_run())
+
+    def test_full_batches(self):
+        action = ExecutableAction(sys.executable, ["-c", BATCH_SCRIPT], loop=self.loop, timeout=10,
+                                  batch_size=4, batch_seconds=10)
+        self.send(action, [{"body": str(n)} for n in range(8)])
+        assert sorted(self.pb.notes) == sorted(("4", str(n)) for n in range(8))
+
+    def test_partial_batch_after_wait(self):
+        action = ExecutableAction(sys.executable, ["-c", BATCH_SCRIPT], loop=self.loop, timeout=10,
+                                  batch_size=100, batch_seconds=0.05)
+        self.send(action, [{"body": str(n)} for n in range(3)])
+        assert sorted(self.pb.notes) == [("3", "0"), ("3", "1"), ("3", "2")]
+
+    def test_simplified_batch(self):
+        action = ExecutableActionSimplified(sys.executable, ["-c", SIMPLE_BATCH_SCRIPT], loop=self.loop,
+                                            timeout=10, batch_size=2, batch_seconds=10)
+        self.send(action, [{"title": "one", "body": "first\nline"}, {"title": "two", "body": "second"}])
+        assert sorted(self.pb.notes) == [("ONE", "first line"), ("TWO", "second")]
+
+
+class TestPythonAction:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pb = FakePushbullet()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "handler.py")
+
+    def teardown_method(self, method):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        shutil.rmtree(self.dir)
+
+    def write_handler(self, title):
+        with open(self.path, "w") as f:
+            f.write("import threading\n"
+                    "def on_push(push):\n"
+                    "    return {{'title': '{}', 'body': threading.current_thread().name}}\n".format(title))
+
+    def push(self, action):
+        self.loop.run_until_complete(action.on_push({"body": "hi"}, self.pb))
+
+    def test_sync_handler_in_thread_and_reload(self):
+        self.write_handler("first")
+        action = ExecutableActionPython(self.path, reload_seconds=0.01)
+        self.push(action)
+        assert self.pb.notes[0][0] == "first"
+        assert self.pb.notes[0][1] != threading.current_thread().name
+
+        self.write_handler("second")
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+        self.loop.run_until_complete(asyncio.sleep(0.1))  # Let the watcher notice
+        self.push(action)
+        assert self.pb.notes[1][0] == "second"
+        self.loop.run_until_complete(action.close())
+
+    def test_sync_handler_in_process(self):
+        self.write_handler("proc")
+        action = ExecutableActionPython(self.path, pool="process", workers=1)
+        self.push(action)
+        assert self.pb.notes == [("proc", "MainThread")]
+        self.loop.run_until_complete(action.close())
+
+    def test_unchanged_file_is_not_reloaded(self):
+        self.write_handler("same")
+        for action in (ExecutableActionPython(self.path, pool="process", workers=1, reload_seconds=0.01),
+                       ProcessPoolAction(self.path, workers=1, reload_seconds=0.01, health_check_seconds=0)):
+            self.push(action)
+            self.loop.run_until_complete(asyncio.sleep(0.1))  # Several watcher checks
+            assert action._mod_version == 0
+            self.loop.run_until_complete(action.close())
+
+    def test_reload_happens_in_executor(self):
+        self.write_handler("first")
+        action = ExecutableActionPython(self.path, reload_seconds=0.01)
+        self.push(action)
+        loaded_on = []
+        load = action._load
+        action._load = lambda: loaded_on.append(threading.current_thread()) or load()
+
+        self.write_handler("second")
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+        self.push(action)
+        assert self.pb.notes[1][0] == "second"
+        assert loaded_on and threading.current_thread() not in loaded_on
+        self.loop.run_until_complete(action.close())
+
+
+PROCESS_HANDLER = """
+import os, time
+def on_push(push):
+    if push["body"] == "crash":
+        os._exit(1)
+    if push["body"] == "hang":
+        time.sleep(60)
+    if push["body"] == "slow":
+        time.sleep(0.5)
+    return {"title": str(os.getpid()), "body": push["body"]}
+"""
+
+
+class TestProcessPoolAction:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pb = FakePushbullet()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "handler.py")
+        with open(self.path, "w") as f:
+            f.write(PROCESS_HANDLER)
+        self.action = ProcessPoolAction(self.path, workers=2, timeout=1, health_check_seconds=0.05,
+                                        health_check_timeout=1)
+
+    def teardown_method(self, method):
+        self.loop.run_until_complete(self.action.close())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        shutil.rmtree(self.dir)
+
+    def push(self, *bodies):
+        async def _run():
+            return await asyncio.gather(*[self.action.on_push({"body": b}, self.pb) for b in bodies],
+                                        return_exceptions=True)
+
+        return self.loop.run_until_complete(asyncio.wait_for(_run(), 10))
+
+    def call_on_push(self, body, timeout):
+        """Calls on_push the way ListenApp does, with its action timeout."""
+        async def _run():
+            try:
+                await asyncio.wait_for(self.action.on_push({"body": body}, self.pb), timeout=timeout)
+            except asyncio.TimeoutError as ex:
+                return ex
+
+        return self.loop.run_until_complete(_run())
+
+    def test_spreads_over_workers(self):
+        self.push(*[str(n) for n in range(10)])
+        assert sorted(body for _, body in self.pb.notes) == sorted(str(n) for n in range(10))
+        assert set(title for title, _ in self.pb.notes) == set(str(w.process.pid) for w in self.action._processes)
+
+    def test_replaces_crashed_and_hung_workers(self):
+        results = self.push("crash", "hang")
+        assert isinstance(results[0], ChildProcessError)
+        assert isinstance(results[1], TimeoutError)
+        assert self.action.restarts == 2
+        self.push("after")
+        assert [body for _, body in self.pb.notes] == ["after"]
+
+    def test_health_check_replaces_dead_worker(self):
+        self.push("start")
+        self.action._processes[0].process.kill()
+        self.loop.run_until_complete(asyncio.sleep(0.5))
+        assert self.action.restarts == 1
+        assert all(w.process.is_alive() for w in self.action._processes)
+
+    def test_cancelled_push_does_not_answer_the_next(self):
+        self.action.workers = 1
+        self.action.timeout = 0.3
+        self.push("start")
+        assert isinstance(self.call_on_push("slow", timeout=0.1), asyncio.TimeoutError)
+        self.push("after")  # The worker is replaced, as the slow push outlasted its timeout
+        assert [body for _, body in self.pb.notes] == ["start", "after"]
+        assert self.action.restarts == 1
+
+    def test_cancelled_push_keeps_its_worker_busy(self):
+        self.action.workers = 1
+        self.action.timeout = 5
+        self.push("start")
+        assert isinstance(self.call_on_push("slow", timeout=0.1), asyncio.TimeoutError)
+        assert self.action._idle.empty()
+        self.push("after")  # Waits for the worker to finish the slow push
+        assert [body for _, body in self.pb.notes] == ["start", "after"]
+        assert self.action.restarts == 0
+
+    def test_late_answers_are_discarded(self):
+        self.push("start")
+        worker = self.action._processes[0]
+        with pytest.raises(TimeoutError):
+            worker.call("push", (0, {"body": "slow"}), 0.1)
+        assert worker.call("push", (0, {"body": "next"}), 5)["body"] == "next"
+
+    def test_startup_cancelled_or_failed(self):
+        assert isinstance(self.call_on_push("first", timeout=0.001), asyncio.TimeoutError)
+        self.push("second")  # Startup finished without the first push
+        assert [body for _, body in self.pb.notes] == ["second"]
+
+        self.loop.run_until_complete(self.action.close())
+        start = self.action._start_processes
+        attempts = []
+
+        def _failing_start():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OSError("no more processes")
+            start()
+
+        self.action._start_processes = _failing_start
+        results = self.push("fails")
+        assert isinstance(results[0], OSError)
+        self.push("retried")
+        assert [body for _, body in self.pb.notes] == ["second", "retried"]
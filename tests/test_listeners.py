@@ -0,0 +1,229 @@
+import asyncio
+
+import pytest
+
+from asyncpushbullet import LiveStreamListener, PushbulletError
+from asyncpushbullet.push_filter import PushFilter
+from standin_pushbullet import StandInPushbullet
+
+PORT = 18733
+
+
+class StandInTest:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = StandInPushbullet(PORT)
+        self.loop.run_until_complete(self.server.start())
+        self.pb = self.server.account()
+
+    def teardown_method(self, method):
+        self.loop.run_until_complete(self.pb.async_close())
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run(self, coro):
+        return self.loop.run_until_complete(asyncio.wait_for(coro, 10))
+
+
+class TestLiveStreamListener(StandInTest):
+
+    def test_push_filter_applies_when_all_types_requested(self):
+        async def _run():
+            async with LiveStreamListener(self.pb, types=(), push_filter=PushFilter(types="clip")) as lsl:
+                await self.server.wait_for_websockets(1)
+                await self.server.send({"type": "push", "push": {"type": "mirror", "body": "filtered"}})
+                await self.server.send({"type": "push", "push": {"type": "clip", "body": "kept"}})
+                msg = await lsl.next_push(timeout=2)
+                assert msg["push"]["body"] == "kept"
+
+        self.run(_run())
+
+
+class TestDirectDispatch(StandInTest):
+
+    def test_delivers_in_order_until_closed(self):
+        async def _run():
+            async with LiveStreamListener(self.pb, types=("ephemeral",), direct_dispatch=True) as lsl:
+                await self.server.wait_for_websockets(1)
+                for n in range(20):
+                    await self.server.send({"type": "push", "push": {"type": "clip", "seq": n}})
+                await self.server.drop_websockets()
+                seqs = [msg["push"]["seq"] async for msg in lsl]
+            assert seqs == list(range(20))
+
+        self.run(_run())
+
+    def test_filters_by_type_and_push_filter(self):
+        async def _run():
+            async with LiveStreamListener(self.pb, types=("ephemeral:clip",), direct_dispatch=True,
+                                          push_filter=lambda p: p.get("body") != "secret") as lsl:
+                await self.server.wait_for_websockets(1)
+                await self.server.send({"type": "push", "push": {"type": "mirror", "body": "other type"}})
+                await self.server.send({"type": "push", "push": {"type": "clip", "body": "secret"}})
+                await self.server.send({"type": "tickle", "subtype": "device"})
+                await self.server.send({"type": "push", "push": {"type": "clip", "body": "kept"}})
+                await self.server.drop_websockets()
+                bodies = [msg["push"]["body"] async for msg in lsl]
+            assert bodies == ["kept"]
+
+        self.run(_run())
+
+    def test_push_tickle_fetches_pushes(self):
+        async def _run():
+            async with LiveStreamListener(self.pb, direct_dispatch=True) as lsl:
+                await self.server.wait_for_websockets(1)
+                push = await self.server.tickle(title="direct")
+                assert (await lsl.next_push(timeout=2))["iden"] == push["iden"]
+
+        self.run(_run())
+
+
+class TestStreamHub(StandInTest):
+
+    def test_subscribers_share_socket_and_fetch(self):
+        async def _run():
+            hub = self.pb.stream_hub
+            listeners = [LiveStreamListener(self.pb, hub=hub) for _ in range(3)]
+            for lsl in listeners:
+                await lsl.__aenter__()
+            clips = LiveStreamListener(self.pb, hub=hub, types=("ephemeral:clip",))
+            await clips.__aenter__()
+            assert len(self.server.connects) == 1
+            assert len(hub.subscribers) == 4
+
+            fetches = self.server.push_requests
+            push = await self.server.tickle(title="shared")
+            await self.server.send({"type": "push", "push": {"type": "clip", "body": "copied"}})
+            for lsl in listeners:
+                assert (await lsl.next_push(timeout=2))["iden"] == push["iden"]
+            assert (await clips.next_push(timeout=2))["push"]["body"] == "copied"
+            assert self.server.push_requests == fetches + 1
+
+            for lsl in listeners + [clips]:
+                await lsl.__aexit__(None, None, None)
+            assert hub.closed
+
+        self.run(_run())
+
+    def test_socket_error_releases_subscribers(self):
+        async def _run():
+            hub = self.pb.stream_hub
+            old = LiveStreamListener(self.pb, hub=hub, types=("ephemeral",))
+            await old.__aenter__()
+            await self.server.drop_websockets()
+            with pytest.raises(StopAsyncIteration):
+                await old.next_push(timeout=2)
+            assert hub.subscribers == []
+            assert old.closed
+
+            new = LiveStreamListener(self.pb, hub=hub, types=("ephemeral",))
+            await new.__aenter__()
+            assert len(self.server.connects) == 2
+            assert hub.subscribers == [new]
+            await self.server.send({"type": "push", "push": {"type": "clip", "body": "after"}})
+            assert (await new.next_push(timeout=2))["push"]["body"] == "after"
+            assert old._queue.empty()
+            await new.__aexit__(None, None, None)
+            await old.__aexit__(None, None, None)
+
+        self.run(_run())
+
+
+class TestHandlers(StandInTest):
+
+    def clip(self, n):
+        return {"type": "push", "push": {"type": "clip", "seq": n}}
+
+    def test_routing_and_error_isolation(self):
+        calls = {"clip": [], "ephemeral": [], "device": [], "all": 0}
+
+        async def _run():
+            async with LiveStreamListener(self.pb, types=("ephemeral", "tickle")) as lsl:
+
+                @lsl.on("ephemeral:clip")
+                async def on_clip(msg):
+                    calls["clip"].append(msg["push"]["seq"])
+                    raise ValueError("broken handler")
+
+                @lsl.on("ephemeral")
+                def on_ephemeral(msg):  # Plain functions work too
+                    calls["ephemeral"].append(msg["push"]["type"])
+
+                @lsl.on("tickle:device")
+                async def on_device(msg):
+                    calls["device"].append(msg["subtype"])
+
+                await self.server.wait_for_websockets(1)
+                await self.server.send(self.clip(1))
+                await self.server.send({"type": "push", "push": {"type": "mirror"}})
+                await self.server.send({"type": "tickle", "subtype": "device"})
+                await self.server.send(self.clip(2))
+                await asyncio.sleep(0.2)
+                await self.server.drop_websockets()
+                await lsl.wait_closed()
+
+            assert calls["clip"] == [1, 2]
+            assert calls["ephemeral"] == ["clip", "mirror", "clip"]
+            assert calls["device"] == ["device"]
+            stats = {s["handler"]: s for s in lsl.handler_stats()}
+            assert stats["on_clip"]["errors"] == 2
+            assert stats["on_ephemeral"]["errors"] == 0
+            assert lsl._queue.qsize() == 1  # Only the end of the stream; handlers alone queue nothing
+
+        self.run(_run())
+
+    def test_concurrency_limit(self):
+        async def _run():
+            running = []
+            most = [0]
+            release = asyncio.Event()
+            async with LiveStreamListener(self.pb, types=("ephemeral",)) as lsl:
+
+                @lsl.on("ephemeral", concurrency=2)
+                async def slow(msg):
+                    running.append(msg)
+                    most[0] = max(most[0], len(running))
+                    await release.wait()
+                    running.remove(msg)
+
+                await self.server.wait_for_websockets(1)
+                for n in range(5):
+                    await self.server.send(self.clip(n))
+                await asyncio.sleep(0.2)
+                assert most[0] == 2
+                release.set()
+                await self.server.drop_websockets()
+                await lsl.wait_closed()
+            assert lsl.handler_stats()[0]["calls"] == 5
+
+        self.run(_run())
+
+    def test_slow_handler_queue_is_bounded(self):
+        async def _run():
+            handled = []
+            release = asyncio.Event()
+            async with LiveStreamListener(self.pb, types=("ephemeral",)) as lsl:
+
+                @lsl.on("ephemeral", queue_size=2)
+                async def slow(msg):
+                    await release.wait()
+                    handled.append(msg["push"]["seq"])
+
+                await self.server.wait_for_websockets(1)
+                for n in range(6):
+                    await self.server.send(self.clip(n))
+                await asyncio.sleep(0.2)
+                release.set()
+                await self.server.drop_websockets()
+                await lsl.wait_closed()
+            assert handled[-2:] == [4, 5]
+            assert lsl.handler_stats()[0]["dropped"] == 6 - len(handled)
+
+        self.run(_run())
+
+    def test_wait_closed_before_connecting(self):
+        with pytest.raises(PushbulletError):
+            self.run(LiveStreamListener(self.pb).wait_closed())
@@ -0,0 +1,53 @@
+import asyncio
+
+from asyncpushbullet import MultiAccountStreamManager
+from standin_pushbullet import StandInPushbullet
+
+PORT = 18734
+
+
+class TestMultiAccountStreamManager:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = StandInPushbullet(PORT)
+        self.loop.run_until_complete(self.server.start())
+
+    def teardown_method(self, method):
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run(self, coro):
+        return self.loop.run_until_complete(asyncio.wait_for(coro, 10))
+
+    def test_more_accounts_than_connection_limit(self):
+        accounts = {"account{}".format(i): "key{}".format(i) for i in range(5)}
+
+        async def _run():
+            async with MultiAccountStreamManager(accounts, stagger=0, connection_limit=1) as mgr:
+                await self.server.wait_for_websockets(len(accounts))
+                push = await self.server.tickle(title="for everyone")
+                received = [await mgr.next(timeout=2) for _ in accounts]
+                assert sorted(tag for tag, _ in received) == sorted(accounts)
+                assert all(p["iden"] == push["iden"] for _, p in received)
+                assert mgr.stats()["connected"] == len(accounts)
+                assert self.server.push_requests == len(accounts)  # Fetched on the tickle, not on connect
+
+        self.run(_run())
+
+    def test_backoff_is_per_account(self):
+        self.server.failing_keys = {"bad_key"}
+
+        async def _run():
+            async with MultiAccountStreamManager({"good": "good_key", "bad": "bad_key"}, stagger=0,
+                                                 backoff_initial=0.02, backoff_max=10) as mgr:
+                while mgr.stats()["per_account"]["bad"]["failures"] < 3:
+                    await asyncio.sleep(0.01)
+                per_account = mgr.stats()["per_account"]
+                assert per_account["good"]["state"] == "connected"
+                assert per_account["good"]["backoff_delay"] == 0.02
+                assert per_account["bad"]["backoff_delay"] >= 0.02 * 2 ** 3
+
+        self.run(_run())
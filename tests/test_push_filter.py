@@ -0,0 +1,48 @@
+from __future__ import print_function
+
+import pytest
+
+from asyncpushbullet.push_filter import PushFilter
+
+
+class TestPushFilter:
+
+    def setup_class(cls):
+        cls.push = {"type": "note", "title": "Alarm: disk full", "body": "sda1 at 99%",
+                    "source_device_iden": "src_iden", "source_device_iden:nickname": "Phone",
+                    "target_device_iden": "tgt_iden", "sender_email": "Someone@Example.com",
+                    "sender_email_normalized": "someone@example.com", "channel_iden": "chan_iden"}
+
+    def test_empty_filter_matches_everything(self):
+        assert PushFilter()(self.push)
+
+    def test_types(self):
+        assert PushFilter(types="note")(self.push)
+        assert PushFilter(types=("link", "note"))(self.push)
+        assert not PushFilter(types="file")(self.push)
+
+    def test_devices_by_iden_or_nickname(self):
+        assert PushFilter(source_device="Phone")(self.push)
+        assert PushFilter(source_device="src_iden")(self.push)
+        assert PushFilter(target_device="tgt_iden")(self.push)
+        assert not PushFilter(source_device="Laptop")(self.push)
+
+    def test_sender_email_case_insensitive(self):
+        assert PushFilter(sender_email="SOMEONE@example.com")(self.push)
+        assert not PushFilter(sender_email="other@example.com")(self.push)
+
+    def test_channel(self):
+        assert PushFilter(channel_tag="chan_iden")(self.push)
+        assert not PushFilter(channel_tag="news")(self.push)
+
+    def test_regex_title_body(self):
+        assert PushFilter(title=r"^Alarm", body=r"\d+%")(self.push)
+        assert not PushFilter(title=r"^Info")(self.push)
+
+    def test_all_criteria_must_match(self):
+        assert not PushFilter(types="note", source_device="Laptop")(self.push)
+
+    def test_from_dict(self):
+        assert PushFilter.from_dict({"types": ["note"], "title": "disk"})(self.push)
+        with pytest.raises(ValueError):
+            PushFilter.from_dict({"colour": "blue"})
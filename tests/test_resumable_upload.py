@@ -0,0 +1,120 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+from aiohttp import web
+
+from asyncpushbullet import AsyncPushbullet, HttpError
+from asyncpushbullet.upload import UploadState
+
+PORT = 18731
+BASE_URL = "http://127.0.0.1:{}".format(PORT)
+
+
+class StandInUploadServer:
+    """Plays pushbullet.com's upload-request endpoint and an upload URL that accepts ranges."""
+
+    def __init__(self):
+        self.upload_requests = 0
+        self.received = bytearray()
+        self.bytes_put = 0
+        self.fail_puts = set()  # Which PUTs (counting from 1) answer 500
+        self.puts = 0
+        self.runner = None
+
+    async def start(self):
+        app = web.Application(client_max_size=1 << 26)
+        app.router.add_post("/upload-request", self.on_upload_request)
+        app.router.add_put("/upload", self.on_put)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", PORT).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def on_upload_request(self, request):
+        self.upload_requests += 1
+        data = await request.post()
+        return web.json_response({"file_name": data["file_name"], "file_type": data["file_type"],
+                                  "file_url": BASE_URL + "/files/" + data["file_name"],
+                                  "upload_url": BASE_URL + "/upload"})
+
+    async def on_put(self, request):
+        body = await request.read()
+        content_range = request.headers["Content-Range"].split()[1]
+        span, total = content_range.split("/")
+        total = int(total)
+        if span != "*":
+            self.puts += 1
+            if self.puts in self.fail_puts:
+                return web.Response(status=500)
+            start = int(span.split("-")[0])
+            assert start == len(self.received)
+            self.received += body
+            self.bytes_put += len(body)
+        if len(self.received) >= total:
+            return web.Response(status=200)
+        headers = {"Range": "bytes=0-{}".format(len(self.received) - 1)} if self.received else {}
+        return web.Response(status=308, headers=headers)
+
+
+class TestResumableUpload:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.data = os.urandom(100000)
+        self.path = os.path.join(self.dir, "video.bin")
+        with open(self.path, "wb") as f:
+            f.write(self.data)
+        self.state_file = os.path.join(self.dir, "state.json")
+        self.loop = asyncio.new_event_loop()
+        self.server = StandInUploadServer()
+        self.loop.run_until_complete(self.server.start())
+        self.pb = AsyncPushbullet("", verify_on_connect=False, retry_backoff=0.01)
+        self.pb.UPLOAD_REQUEST_URL = BASE_URL + "/upload-request"
+
+    def teardown_method(self, method):
+        self.loop.run_until_complete(self.pb.async_close())
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+        shutil.rmtree(self.dir)
+
+    def upload(self, **kwargs):
+        return self.loop.run_until_complete(self.pb.async_upload_file_resumable(
+            self.path, file_type="application/octet-stream", ranged=True, range_size=30000,
+            show_progress=False, **kwargs))
+
+    def test_retries_failed_range(self):
+        self.server.fail_puts = {2}
+        info = self.upload()
+        assert info["file_url"] == BASE_URL + "/files/video.bin"
+        assert bytes(self.server.received) == self.data
+        assert self.server.upload_requests == 1
+        assert self.server.bytes_put == len(self.data)
+
+    def test_resumes_from_state_file(self):
+        self.server.fail_puts = {3}
+        with pytest.raises(HttpError):
+            self.upload(state_file=self.state_file, retries=0)
+        state = UploadState.load(self.state_file)
+        assert state.offset == 60000
+        assert state.upload_url == BASE_URL + "/upload"
+
+        info = self.upload(state_file=self.state_file)
+        assert info["file_url"] == BASE_URL + "/files/video.bin"
+        assert bytes(self.server.received) == self.data
+        assert self.server.upload_requests == 1
+        assert self.server.bytes_put == len(self.data)
+        assert not os.path.exists(self.state_file)
+
+    def test_changed_file_starts_over(self):
+        self.server.fail_puts = {2}
+        with pytest.raises(HttpError):
+            self.upload(state_file=self.state_file, retries=0)
+        with open(self.path, "ab") as f:
+            f.write(b"more")
+        state = UploadState.load(self.state_file)
+        assert not state.matches(self.path)
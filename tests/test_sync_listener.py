@@ -0,0 +1,81 @@
+import asyncio
+import queue
+import threading
+
+import pytest
+
+from asyncpushbullet import SyncLiveStreamListener
+from asyncpushbullet.helpers import BackgroundEventLoop
+from standin_pushbullet import StandInPushbullet
+
+PORT = 18736
+
+
+class TestSyncLiveStreamListener:
+
+    def setup_method(self, method):
+        self.server_loop = BackgroundEventLoop(name="Thread-standin")
+        self.server = StandInPushbullet(PORT)
+        self.server_loop.run(self.server.start())
+        self.client_loop = BackgroundEventLoop(name="Thread-client")
+        self.pb = self.server.account()
+
+    def teardown_method(self, method):
+        self.client_loop.run(self.pb.async_close())
+        self.client_loop.run(asyncio.sleep(0.05))  # Let the stream hub's reader finish
+        self.client_loop.stop()
+        self.server_loop.run(self.server.stop())
+        self.server_loop.stop()
+
+    def listener(self, **kwargs) -> SyncLiveStreamListener:
+        return SyncLiveStreamListener(self.pb, background_loop=self.client_loop, **kwargs)
+
+    def wait_for_websockets(self, count):
+        self.server_loop.run(self.server.wait_for_websockets(count), timeout=10)
+
+    def tickle(self, **fields) -> dict:
+        return self.server_loop.run(self.server.tickle(**fields), timeout=10)
+
+    def test_callback_delivery_and_close(self):
+        received = []
+        arrived = threading.Event()
+
+        def on_push(push):
+            received.append(push)
+            arrived.set()
+
+        listener = self.listener(on_push=on_push)
+        listener.start()
+        self.wait_for_websockets(1)
+        push = self.tickle(title="hello")
+        assert arrived.wait(5)
+        assert received[0]["iden"] == push["iden"]
+        assert threading.current_thread() is not listener._dispatcher
+
+        listener.close(timeout=5)
+        assert listener.closed
+        assert not listener._dispatcher.is_alive()
+        listener.join(timeout=1)  # Returns at once once closed
+
+    def test_iteration_and_stop(self):
+        with self.listener() as listener:
+            self.wait_for_websockets(1)
+            pushes = [self.tickle(title=str(n)) for n in range(3)]
+            received = [listener.next_push(timeout=5)["iden"] for _ in pushes]
+            assert sorted(received) == sorted(p["iden"] for p in pushes)
+            with pytest.raises(queue.Empty):
+                listener.next_push(timeout=0.1)
+        with pytest.raises(StopIteration):
+            listener.next_push(timeout=1)
+        assert list(listener) == []
+
+    def test_reconnects_after_drop(self):
+        errors = []
+        with self.listener(reconnect_interval=0.05, on_error=errors.append) as listener:
+            self.wait_for_websockets(1)
+            self.server_loop.run(self.server.drop_websockets())
+            self.wait_for_websockets(1)
+            assert len(self.server.connects) == 2
+            push = self.tickle(title="after")
+            assert listener.next_push(timeout=5)["iden"] == push["iden"]
+            assert listener.connected
@@ -0,0 +1,129 @@
+import time
+
+import pytest
+from aiohttp import web
+
+from asyncpushbullet import SyncPushbullet, HttpError
+from asyncpushbullet.helpers import BackgroundEventLoop
+
+PORT = 18737
+
+
+class PagedPushes:
+    """Serves GET /pushes a page at a time, with a cursor, and echoes POST /pushes."""
+
+    def __init__(self, port: int, count: int):
+        self.url = "http://127.0.0.1:{}/pushes".format(port)
+        self.port = port
+        self.pushes = [{"iden": "push{}".format(n), "type": "note", "active": True,
+                        "modified": 1000.0 - n} for n in range(count)]
+        self.pages_served = 0
+        self.failures = []  # Status codes to answer the next GET requests with, in order
+        self.posted = []
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/pushes", self.on_get)
+        app.router.add_post("/pushes", self.on_post)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", self.port).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def on_get(self, request):
+        if self.failures:
+            return web.json_response({"error": {"message": "try again"}}, status=self.failures.pop(0))
+        start = int(request.query.get("cursor", 0))
+        end = start + int(request.query.get("limit", 500))
+        self.pages_served += 1
+        msg = {"pushes": self.pushes[start:end]}
+        if end < len(self.pushes):
+            msg["cursor"] = str(end)
+        return web.json_response(msg)
+
+    async def on_post(self, request):
+        data = dict(await request.post())
+        self.posted.append(data)
+        return web.json_response(dict(data, iden="new{}".format(len(self.posted))))
+
+
+class TestSyncPushbullet:
+
+    def setup_method(self, method):
+        self.server_loop = BackgroundEventLoop(name="Thread-standin")
+        self.server = PagedPushes(PORT, count=25)
+        self.server_loop.run(self.server.start())
+        self.pb = None
+
+    def teardown_method(self, method):
+        if self.pb is not None:
+            self.pb.close()
+        self.server_loop.run(self.server.stop())
+        self.server_loop.stop()
+
+    def account(self, **kwargs) -> SyncPushbullet:
+        self.pb = SyncPushbullet("key", verify_on_connect=False, retry_backoff=0.01, timeout=10, **kwargs)
+        self.pb.async_pushbullet.PUSH_URL = self.server.url
+        return self.pb
+
+    def test_proxies_async_functions_and_iterators(self):
+        pb = self.account()
+        push = pb.push_note("title", "body")
+        assert push["iden"] == "new1"
+        assert self.server.posted == [{"type": "note", "title": "title", "body": "body"}]
+        assert pb.push_note.__name__ == "push_note"
+        assert "push_note" in vars(pb)  # Cached after the first lookup
+
+        pushes = pb.get_pushes(modified_after=0.0, page_size=10, dereference_device_iden=False)
+        assert [p["iden"] for p in pushes] == [p["iden"] for p in self.server.pushes]
+
+        with pytest.raises(AttributeError):
+            pb.no_such_thing()
+        with pytest.raises(AttributeError):
+            pb.no_such_thing_iter()
+
+    def test_iterator_prefetch_is_bounded(self):
+        pb = self.account(prefetch=5)
+        pushes = pb.pushes_iter(modified_after=0.0, page_size=5, dereference_device_iden=False)
+        first = next(pushes)
+        time.sleep(0.3)
+        ahead = self.server.pages_served
+        assert ahead >= 2  # Retrieved beyond the page the caller is on...
+        assert ahead < 5  # ...but only as far as prefetch allows
+
+        rest = list(pushes)
+        assert [first["iden"]] + [p["iden"] for p in rest] == [p["iden"] for p in self.server.pushes]
+        assert self.server.pages_served == 5
+
+    def test_iterator_close_stops_retrieving(self):
+        pb = self.account(prefetch=5)
+        pushes = pb.pushes_iter(modified_after=0.0, page_size=5, dereference_device_iden=False)
+        next(pushes)
+        pushes.close()
+        time.sleep(0.2)
+        served = self.server.pages_served
+        time.sleep(0.2)
+        assert self.server.pages_served == served < 5
+        with pytest.raises(StopIteration):
+            next(pushes)
+
+    def test_retries_server_errors_and_rate_limits(self):
+        pb = self.account(retries=3)
+        self.server.failures = [503, 429]
+        pushes = pb.get_pushes(modified_after=0.0, page_size=10, dereference_device_iden=False)
+        assert len(pushes) == 25
+
+        self.server.failures = [500]  # Iterators retry too
+        pushes = pb.pushes_iter(modified_after=0.0, page_size=10, dereference_device_iden=False)
+        assert len(list(pushes)) == 25
+        assert self.server.failures == []
+
+    def test_gives_up_after_retries(self):
+        pb = self.account(retries=1)
+        self.server.failures = [503, 503, 503]
+        with pytest.raises(HttpError):
+            pb.get_pushes(modified_after=0.0, dereference_device_iden=False)
+        assert self.server.failures == [503]
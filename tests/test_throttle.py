@@ -0,0 +1,152 @@
+import asyncio
+import sys
+
+import pytest
+
+from asyncpushbullet.command_line_listen import parse_args
+from asyncpushbullet.throttle import Budget, SlidingWindow, Throttle
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSlidingWindow:
+
+    def test_wait_time(self):
+        window = SlidingWindow(2, 10)
+        assert window.wait_time(0) == 0
+        window.record(0)
+        window.record(1)
+        assert window.wait_time(5) == 5
+        assert window.wait_time(10) == 0  # The first event has left the window
+        assert not window.idle(10)
+        assert window.idle(11)
+
+
+class TestThrottle:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.clock = FakeClock()
+        self.released = []
+
+        async def _release(item):
+            self.released.append(item["n"])
+
+        self.throttle = Throttle(_release, max_pending=3, timer=self.clock)
+        self.throttle.add_budget("sender", 2, 10, key=lambda p: p.get("sender_iden"))
+
+    def teardown_method(self, method):
+        self.loop.run_until_complete(self.throttle.close())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def settle(self):
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+
+    def submit(self, n, sender):
+        self.loop.run_until_complete(self.throttle.submit({"n": n, "sender_iden": sender}))
+
+    def test_other_senders_not_held_up(self):
+        for n in range(4):
+            self.submit(n, "chatty")
+        self.submit(4, "quiet")
+        self.submit(5, None)  # Not under the sender budget at all
+        self.settle()
+        assert self.released == [0, 1, 4, 5]
+
+        self.clock.now += 10
+        self.submit(6, "quiet")  # Wakes the dispatcher
+        self.settle()
+        assert self.released == [0, 1, 4, 5, 2, 3, 6]
+
+        metrics = self.throttle.metrics()
+        assert metrics["submitted"] == 7
+        assert metrics["released"] == 7
+        assert metrics["delayed"] == 2
+        assert metrics["max_delay"] == 10
+        assert metrics["throttled_by"] == {"sender": 2}
+
+    def test_submit_waits_only_when_queue_full(self):
+        throttle = Throttle(self.throttle.release, max_pending=3)  # Real clock
+        throttle.add_budget("all", 2, 0.2)
+
+        async def _run():
+            for n in range(5):
+                await throttle.submit({"n": n})
+            await asyncio.sleep(0.05)
+            assert self.released == [0, 1]
+            assert throttle.metrics()["pending"] == 3
+            await throttle.submit({"n": 5})  # Waits for room
+            assert self.released == [0, 1, 2, 3]
+            await asyncio.sleep(0.3)
+            await throttle.close()
+
+        self.loop.run_until_complete(_run())
+        assert self.released == [0, 1, 2, 3, 4, 5]
+        metrics = throttle.metrics()
+        assert metrics["stalls"] >= 1
+        assert metrics["stall_seconds"] > 0.1
+
+    def test_invalid_budgets_rejected(self):
+        with pytest.raises(ValueError):
+            self.throttle.add_budget("none", 0, 10)
+        with pytest.raises(ValueError):
+            Budget("instant", 5, 0)
+        assert [b.name for b in self.throttle.budgets] == ["sender"]
+
+    def test_bad_item_does_not_stop_dispatcher(self):
+        def _key(p):
+            if p.get("sender_iden") == "broken":
+                raise KeyError("no sender")
+            return p.get("sender_iden")
+
+        self.throttle.add_budget("checked", 5, 10, key=_key)
+        self.submit(0, "bad")
+        self.settle()
+        window = self.throttle.budgets[0]._windows["bad"]
+        window.wait_time = lambda now: [][0]  # As a broken budget would
+
+        self.submit(1, "bad")
+        self.submit(2, "broken")
+        self.submit(3, "good")
+        self.settle()
+        assert self.released == [0, 3]
+        assert self.throttle.metrics()["dropped"] == 2
+        assert self.throttle.metrics()["pending"] == 0
+        assert not self.throttle._dispatcher.done()
+
+        self.submit(4, "good")
+        self.settle()
+        assert self.released == [0, 3, 4]
+
+
+class TestThrottleArgs:
+
+    def parse(self, *argv):
+        saved = sys.argv
+        sys.argv = ["pblisten", "--echo"] + list(argv)
+        try:
+            return parse_args()
+        finally:
+            sys.argv = saved
+
+    def test_valid(self):
+        args = self.parse("--throttle-sender", "3", "10", "--throttle-action", "1", "0.5")
+        assert args.throttle_sender == [3, 10]
+        assert args.throttle_action == [1, 0.5]
+
+    @pytest.mark.parametrize("argv", [("--throttle-sender", "0", "10"),
+                                      ("--throttle-source", "2.5", "10"),
+                                      ("--throttle-action", "3", "0"),
+                                      ("--throttle-count", "-1")])
+    def test_invalid(self, argv):
+        with pytest.raises(SystemExit):
+            self.parse(*argv)
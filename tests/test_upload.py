@@ -0,0 +1,161 @@
+import array
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from asyncpushbullet.upload import AsyncFilePayload, AsyncStreamPayload, BufferPayload, async_file_form_data, \
+    data_form_data, data_payload
+
+PORT = 18738
+
+
+class EchoServer:
+    """Answers POST /echo with what arrived: the body's length and how it was framed."""
+
+    def __init__(self, port: int):
+        self.url = "http://127.0.0.1:{}/echo".format(port)
+        self.port = port
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/echo", self.on_echo)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", self.port).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def on_echo(self, request):
+        body = await request.read()
+        return web.json_response({"content_length": request.headers.get("Content-Length"),
+                                  "chunked": request.headers.get("Transfer-Encoding") == "chunked",
+                                  "received": len(body),
+                                  "body": body.decode("latin-1")})
+
+
+class Unseekable:
+    """A file-like object that can only be read, like a pipe."""
+
+    def __init__(self, data: bytes):
+        self.f = io.BytesIO(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.f.read(size)
+
+
+async def async_chunks(data: bytes, chunk_size: int):
+    for start in range(0, len(data), chunk_size):
+        await asyncio.sleep(0)
+        yield data[start:start + chunk_size]
+
+
+class TestUploadPayloads:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = EchoServer(PORT)
+        self.loop.run_until_complete(self.server.start())
+        self.session = self.loop.run_until_complete(self.new_session())
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, "data.bin")
+        self.content = bytes(range(256)) * 40
+        with open(self.file_path, "wb") as f:
+            f.write(self.content)
+
+    async def new_session(self) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession()
+
+    def teardown_method(self, method):
+        self.loop.run_until_complete(self.session.close())
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        shutil.rmtree(self.temp_dir)
+
+    def post(self, data) -> dict:
+        async def _post():
+            async with self.session.post(self.server.url, data=data) as resp:
+                return await resp.json()
+
+        return self.loop.run_until_complete(asyncio.wait_for(_post(), 10))
+
+    def test_file_payload_streams_with_length(self):
+        calls = []
+        payload = AsyncFilePayload(self.file_path, progress=lambda sent, total: calls.append((sent, total)),
+                                   chunk_size=1000)
+        echo = self.post(payload)
+        assert echo["content_length"] == str(len(self.content))
+        assert not echo["chunked"]
+        assert echo["body"].encode("latin-1") == self.content
+        assert calls[0] == (1000, len(self.content))
+        assert calls[-1] == (len(self.content), len(self.content))
+
+    def test_given_size_skips_stat(self):
+        payload = AsyncFilePayload(os.path.join(self.temp_dir, "not yet written"), size=7)
+        assert payload.size == 7
+
+    def test_async_form_data_has_length(self):
+        form = self.loop.run_until_complete(async_file_form_data(self.file_path, file_type="application/octet-stream"))
+        echo = self.post(form)
+        assert not echo["chunked"]
+        assert int(echo["content_length"]) == echo["received"] > len(self.content)
+
+    def test_buffer_payload_has_length(self):
+        calls = []
+        echo = self.post(BufferPayload(self.content, chunk_size=4096, progress=lambda *a: calls.append(a)))
+        assert echo["content_length"] == str(len(self.content))
+        assert echo["body"].encode("latin-1") == self.content
+        assert calls == [(4096, len(self.content)), (8192, len(self.content)), (len(self.content), len(self.content))]
+
+    def test_buffer_payload_sends_memoryview_bytes(self):
+        numbers = array.array("i", range(1000))
+        echo = self.post(BufferPayload(memoryview(numbers)))
+        assert echo["content_length"] == str(len(numbers.tobytes()))
+        assert echo["body"].encode("latin-1") == numbers.tobytes()
+
+    def test_seekable_stream_has_remaining_length(self):
+        f = io.BytesIO(self.content)
+        f.read(100)  # Only what is left gets sent
+        echo = self.post(AsyncStreamPayload(f, chunk_size=1000))
+        assert echo["content_length"] == str(len(self.content) - 100)
+        assert echo["body"].encode("latin-1") == self.content[100:]
+
+    def test_unseekable_stream_is_chunked(self):
+        echo = self.post(AsyncStreamPayload(Unseekable(self.content), chunk_size=1000))
+        assert echo["content_length"] is None
+        assert echo["chunked"]
+        assert echo["body"].encode("latin-1") == self.content
+
+    def test_async_iterator_is_chunked_unless_sized(self):
+        calls = []
+        echo = self.post(AsyncStreamPayload(async_chunks(self.content, 3000), progress=lambda *a: calls.append(a)))
+        assert echo["chunked"]
+        assert echo["body"].encode("latin-1") == self.content
+        assert calls[-1] == (len(self.content), None)
+
+        echo = self.post(AsyncStreamPayload(async_chunks(self.content, 3000), size=len(self.content)))
+        assert echo["content_length"] == str(len(self.content))
+        assert echo["body"].encode("latin-1") == self.content
+
+    def test_form_data_length_follows_payload(self):
+        echo = self.post(data_form_data(self.content, "data.bin", "application/octet-stream"))
+        assert int(echo["content_length"]) == echo["received"]
+
+        echo = self.post(data_form_data(async_chunks(self.content, 3000), "data.bin", "application/octet-stream"))
+        assert echo["chunked"]
+        assert echo["content_length"] is None
+
+    def test_data_payload_rejects_other_types(self):
+        assert isinstance(data_payload(bytearray(b"abc")), BufferPayload)
+        assert isinstance(data_payload(io.BytesIO(b"abc")), AsyncStreamPayload)
+        with pytest.raises(TypeError):
+            data_payload(12345)
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+from asyncpushbullet.upload import UploadCache
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestUploadCache:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.dir, "cache.json")
+        self.timer = FakeTimer()
+        self.cache = UploadCache(cache_file=self.cache_file, ttl=10, timer=self.timer)
+        self.path = self.write_file("status.png", b"some bytes")
+        self.info = {"file_type": "image/png", "file_url": "https://example.com/status.png",
+                     "file_name": "status.png"}
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.dir)
+
+    def write_file(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def run(self, coro):
+        return asyncio.new_event_loop().run_until_complete(coro)
+
+    def test_hit_and_miss(self):
+        assert self.run(self.cache.async_get(self.path)) is None
+        self.run(self.cache.async_put(self.path, self.info))
+        hit = self.run(self.cache.async_get(self.path))
+        assert hit["file_url"] == self.info["file_url"]
+        assert self.run(self.cache.async_get(self.path, backend="transfer.sh")) is None
+
+    def test_same_content_other_file(self):
+        self.run(self.cache.async_put(self.path, self.info))
+        other = self.write_file("copy.png", b"some bytes")
+        hit = self.run(self.cache.async_get(other))
+        assert hit["file_url"] == self.info["file_url"]
+        assert hit["file_name"] == "copy.png"
+
+    def test_changed_content(self):
+        self.run(self.cache.async_put(self.path, self.info))
+        self.write_file("status.png", b"other bytes!")
+        assert self.run(self.cache.async_get(self.path)) is None
+
+    def test_expires(self):
+        self.run(self.cache.async_put(self.path, self.info))
+        self.timer.now = 11
+        assert self.run(self.cache.async_get(self.path)) is None
+
+    def test_saved_to_disk(self):
+        self.run(self.cache.async_put(self.path, self.info))
+        reloaded = UploadCache(cache_file=self.cache_file, ttl=10, timer=self.timer)
+        hit = self.run(reloaded.async_get(self.path))
+        assert hit["file_url"] == self.info["file_url"]
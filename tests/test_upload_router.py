@@ -0,0 +1,43 @@
+import pytest
+
+from asyncpushbullet import PushbulletError
+from asyncpushbullet.upload_router import HttpPutBackend, PushbulletBackend, TransferShBackend, UploadBackend, \
+    UploadRouter
+
+MB = 1000 * 1000
+
+
+class TestUploadRouter:
+
+    def setup_method(self, method):
+        self.router = UploadRouter([PushbulletBackend(), TransferShBackend()])
+
+    def test_by_size(self):
+        assert self.router.choose(1 * MB).name == "pushbullet"
+        assert self.router.choose(26 * MB).name == "transfer.sh"
+
+    def test_too_large(self):
+        with pytest.raises(PushbulletError):
+            self.router.choose(20000 * MB)
+
+    def test_prefers_faster_when_too_slow(self):
+        self.router.max_seconds = 10
+        self.router.record(self.router.backends[0], 1 * MB, 1)  # 1 MB/s
+        self.router.record(self.router.backends[1], 10 * MB, 1)  # 10 MB/s
+        assert self.router.choose(5 * MB).name == "pushbullet"
+        assert self.router.choose(20 * MB).name == "transfer.sh"
+
+    def test_http_put_urls(self):
+        backend = HttpPutBackend("http://localhost:9000/bucket/{file_name}?x=1")
+        assert backend.url_for(backend.upload_url, "a b.txt") == "http://localhost:9000/bucket/a%20b.txt?x=1"
+        backend = HttpPutBackend("http://localhost:9000/bucket/")
+        assert backend.url_for(backend.upload_url, "a.txt") == "http://localhost:9000/bucket/a.txt"
+
+    def test_backend_must_implement_upload(self):
+        class NoUpload(UploadBackend):
+            name = "no upload"
+
+        with pytest.raises(TypeError):
+            NoUpload()
+        with pytest.raises(TypeError):
+            UploadBackend()
@@ -0,0 +1,120 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from asyncpushbullet import websocket_client
+from asyncpushbullet.websocket_client import WebsocketClient, private_writer
+from asyncpushbullet.websocket_server import WebServer, WebsocketHandler
+
+PORT = 18735
+URL = "ws://127.0.0.1:{}/ws".format(PORT)
+BIG = "All tests passed. " * 1500  # About 27 kB that compress well
+SMALL = "x" * 50
+
+
+class EchoAfterHelloHandler(WebsocketHandler):
+    """Once a client says hello, sends it BIG directly, then broadcasts SMALL."""
+
+    small_wire = None  # Wire bytes sent for SMALL
+    window = None  # Window size the socket compresses with
+
+    async def on_message(self, route: str, ws: web.WebSocketResponse, ws_msg_from_client):
+        writer = private_writer(ws)
+        self.window = writer.compress if writer is not None else None
+        await ws.send_str(BIG)
+        before = self.bytes.wire_sent
+        await self.broadcast_text(SMALL)
+        if before is not None:
+            self.small_wire = self.bytes.wire_sent - before
+
+
+class TestWebsockets:
+
+    def setup_method(self, method):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def teardown_method(self, method):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def exchange(self, handler: WebsocketHandler, **client_kwargs):
+        """Says hello to the handler and returns the client's counter and the two replies."""
+
+        async def _run():
+            server = WebServer(host="127.0.0.1", port=PORT)
+            server.add_route("/ws", handler)
+            await server.start()
+            try:
+                async with WebsocketClient(URL, **client_kwargs) as client:
+                    await client.send_str("hello")
+                    big = await client.next_msg(timeout=2)
+                    small = await client.next_msg(timeout=2)
+                    compressed = client.compressed
+            finally:
+                await server.shutdown()
+            return client.bytes, compressed, big.data, small.data
+
+        return self.loop.run_until_complete(asyncio.wait_for(_run(), 10))
+
+    def test_counts_without_compression(self):
+        handler = EchoAfterHelloHandler()
+        counter, compressed, big, small = self.exchange(handler)
+        assert not compressed
+        assert handler.small_wire == 2 + len(SMALL)
+        assert (big, small) == (BIG, SMALL)
+        assert counter.payload_sent == len("hello")
+        assert counter.payload_received == len(BIG) + len(SMALL)
+        assert counter.wire_received >= counter.payload_received  # Frame headers on top
+        assert handler.bytes.payload_received == len("hello")
+        assert handler.bytes.wire_received >= len("hello")  # Counted from before the handshake reply
+        assert handler.bytes.wire_sent == counter.wire_received
+
+    def test_threshold_applies_per_message(self):
+        handler = EchoAfterHelloHandler(compress_threshold=100)
+        counter, compressed, big, small = self.exchange(handler, compress=15)
+        assert compressed
+        assert (big, small) == (BIG, SMALL)
+        assert counter.wire_received < len(BIG) / 10  # Direct sends are still compressed
+        assert handler.small_wire == 2 + len(SMALL)  # Short broadcast went as a plain frame
+        assert handler.bytes.wire_sent == counter.wire_received
+
+    def test_aiohttp_writer_internals_are_present(self):
+        # The compression threshold and wire counts rely on aiohttp's private websocket
+        # writer.  If this fails after upgrading aiohttp, they have quietly stopped working.
+        assert websocket_client.WRITER_INTERNALS_SUPPORTED, \
+            "aiohttp {} is not a version whose websocket writer is known".format(aiohttp.__version__)
+        handler = EchoAfterHelloHandler()
+        counter, _, _, _ = self.exchange(handler, compress=15)
+        assert handler.window == 15, "aiohttp's websocket no longer has the expected _writer"
+        assert counter.wire_sent is not None and counter.wire_received is not None
+        assert handler.bytes.wire_sent is not None and handler.bytes.wire_received is not None
+
+    def test_server_window_size(self):
+        handler = EchoAfterHelloHandler(compress=9)
+        counter, compressed, big, small = self.exchange(handler, compress=15)
+        assert compressed
+        assert handler.window == 9
+        assert (big, small) == (BIG, SMALL)
+        assert counter.wire_received < len(BIG) / 10
+
+        handler = EchoAfterHelloHandler(compress=0)
+        _, compressed, _, _ = self.exchange(handler, compress=15)
+        assert not compressed
+
+        with pytest.raises(ValueError):
+            WebsocketHandler(compress=8)
+
+    def test_falls_back_without_writer_internals(self):
+        websocket_client.WRITER_INTERNALS_SUPPORTED = False
+        try:
+            handler = EchoAfterHelloHandler(compress_threshold=100)
+            counter, compressed, big, small = self.exchange(handler, compress=15)
+        finally:
+            websocket_client.WRITER_INTERNALS_SUPPORTED = True
+        assert compressed
+        assert (big, small) == (BIG, SMALL)
+        assert counter.payload_received == len(BIG) + len(SMALL)
+        assert counter.wire_received is None and handler.bytes.wire_sent is None